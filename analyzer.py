@@ -1,69 +1,292 @@
 import numpy as np
 import pandas as pd
-import pandas_datareader as dr
+import datasource
+import orderstats
+import rolling
+import stationarity
 
 from scipy.stats import norm
 from scipy import stats
 
+# Annualization of daily bars and the volatility windows, shared by every engine (batch, streaming,
+# range index, compact) so that their numbers cannot drift apart.
+TRADING_DAYS = 252
+VOL_WINDOW = 14
+VOL_SMA_WINDOW = 126
+HISTORIC_VAR_LEVELS = ((95, 5), (99, 1), (99.7, .3))
+ROLLING_VAR_WINDOWS = (250, 500)
+
+
+def rolling_historic_var_frame(order_statistics, index, start=0):
+    percentiles = [q for _, q in HISTORIC_VAR_LEVELS]
+    columns, blocks = [], []
+    for window in ROLLING_VAR_WINDOWS:
+        blocks.append(order_statistics.rolling_percentiles(window, percentiles, start) * 100)
+        columns += [(confidence, window) for confidence, _ in HISTORIC_VAR_LEVELS]
+    return pd.DataFrame(np.hstack(blocks), index=index,
+                        columns=pd.MultiIndex.from_tuples(columns, names=['confidence', 'window']))
+
+
+class metric:
+    # Lazily computed, memoized attribute. The first access stores the value in the instance
+    # __dict__, which then shadows this (non-data) descriptor, so every later access is free.
+
+    def __init__(self, *depends_on):
+        self.depends_on = depends_on
+        self.func = None
+        self.name = None
+
+    def __call__(self, func):
+        self.func = func
+        self.name = func.__name__
+        return self
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = self.func(instance)
+        instance.__dict__[self.name] = value
+        return value
+
 
 class TimeSeriesAnalyzer:
 
-    def __init__(self, ticker_symbol, from_date, to_date):
-        df = dr.data.get_data_yahoo(ticker_symbol, start=from_date, end=to_date)
+    def __init__(self, ticker_symbol, from_date, to_date, data_source=None):
+        data_source = data_source or datasource.default_source()
+        df = data_source.get_prices(ticker_symbol, from_date, to_date)
         df = df[~df.index.duplicated()]
+        # Bars per year: daily sources leave it at TRADING_DAYS, intraday sources follow their bar size.
+        self.periods_per_year = getattr(data_source, 'periods_per_year', TRADING_DAYS)
         df["Daily Return"] = df["Adj Close"].pct_change()
-        df = df.iloc[1:]
+        self.data = df.iloc[1:]
+
+    @classmethod
+    def metrics(cls):
+        return {name: value for klass in reversed(cls.__mro__) for name, value in vars(klass).items()
+                if isinstance(value, metric)}
+
+    @classmethod
+    def requirements(cls, *names):
+        # Requested metrics plus everything they depend on, dependencies first.
+        graph = cls.metrics()
+        ordered = []
+
+        def visit(name):
+            if name not in ordered:
+                for dependency in graph[name].depends_on:
+                    visit(dependency)
+                ordered.append(name)
+
+        for name in names:
+            visit(name)
+        return ordered
+
+    def compute(self, *names):
+        for name in self.requirements(*names):
+            getattr(self, name)
+        return {name: getattr(self, name) for name in names}
+
+    def is_computed(self, name):
+        return name in self.__dict__
+
+    @metric()
+    def returns(self):
+        return self.data["Daily Return"]
+
+    @metric()
+    def prices(self):
+        return self.data["Adj Close"]
+
+    @metric('returns')
+    def trading_days(self):
+        return self.returns.count()
+
+    @metric('prices', 'trading_days')
+    def cagr(self):
+        years = self.trading_days / self.periods_per_year
+        return ((self.prices.iloc[-1] / self.prices.iloc[0]) ** (1 / years) - 1) * 100
+
+    @metric('prices')
+    def buy_and_hold_return(self):
+        return ((self.prices.iloc[-1] - self.prices.iloc[0]) / self.prices.iloc[0]) * 100
+
+    @metric('prices')
+    def previous_peak(self):
+        return self.prices.cummax()
+
+    @metric('prices', 'previous_peak')
+    def max_dd(self):
+        return np.min(((self.prices - self.previous_peak) / self.previous_peak) * 100)
+
+    @metric('returns')
+    def mean_daily_return(self):
+        return self.returns.mean() * 100
+
+    @metric('returns')
+    def std_daily_return(self):
+        return self.returns.std(ddof=1) * 100
 
-        years = df["Daily Return"].count() / 252
-        self.cagr = ((df['Adj Close'].iloc[-1] / df['Adj Close'].iloc[0]) ** (1 / years) - 1) * 100
-        self.buy_and_hold_return = ((df['Adj Close'].iloc[-1] - df['Adj Close'].iloc[0]) / df['Adj Close'].iloc[0]) * 100
+    @metric('returns')
+    def min_return(self):
+        return self.returns.min() * 100
 
-        previous_maximum = df["Adj Close"].cummax()
-        drawdowns = ((df["Adj Close"] - previous_maximum) / previous_maximum) * 100
-        dd = pd.DataFrame({"Adj Close": df["Adj Close"], "Previous Peak": previous_maximum, "Drawdown": drawdowns})
-        self.max_dd = np.min(dd['Drawdown'])
+    @metric('returns')
+    def max_return(self):
+        return self.returns.max() * 100
 
-        self.mean_daily_return = df["Daily Return"].mean() * 100
-        self.std_daily_return = df["Daily Return"].std(ddof=1) * 100
-        self.min_return = df["Daily Return"].min() * 100
-        self.max_return = df["Daily Return"].max() * 100
-        self.trading_days = df["Daily Return"].count()
+    @metric('returns')
+    def skewness(self):
+        return self.returns.skew()
 
-        self.skewness = df["Daily Return"].skew()
-        self.kurtosis = df["Daily Return"].kurt()
+    @metric('returns')
+    def kurtosis(self):
+        return self.returns.kurt()
 
-        (mu, sigma) = stats.norm.fit(df['Daily Return'])
-        self.mu = mu
-        self.sigma = sigma
-        self.var_gauss_95 = norm.ppf(0.05, mu, sigma) * 100
-        self.var_gauss_99 = norm.ppf(0.01, mu, sigma) * 100
-        self.var_gauss_99_7 = norm.ppf(0.003, mu, sigma) * 100
+    @metric('returns')
+    def normal_fit(self):
+        return stats.norm.fit(self.returns)
 
-        self.var_historic_95 = np.percentile(df["Daily Return"], 5) * 100
-        self.var_historic_99 = np.percentile(df["Daily Return"], 1) * 100
-        self.var_historic_99_7 = np.percentile(df["Daily Return"], .3) * 100
+    @metric('normal_fit')
+    def mu(self):
+        return self.normal_fit[0]
 
-        df['Volatilidad_Historica_14_Dias'] = df["Daily Return"].rolling(14).std() * 100
-        df['Volatilidad_14_Dias_Anualizada'] = df['Volatilidad_Historica_14_Dias'] * (252 ** 0.5)
-        df['SMA_126_Volatilidad_Anualizada'] = df['Volatilidad_14_Dias_Anualizada'].rolling(126).mean()
+    @metric('normal_fit')
+    def sigma(self):
+        return self.normal_fit[1]
 
-        self.vam = df["Daily Return"].std() * 100 * (252 ** 0.5)
+    @metric('mu', 'sigma')
+    def var_gauss_95(self):
+        return norm.ppf(0.05, self.mu, self.sigma) * 100
 
-        df['DiasNegativos'] = np.where(df['Daily Return'] < 0, 100 * (df['High'] - df['Low']) / df['Low'], 0)
-        df_dias_negativos = df.loc[df['DiasNegativos'] != 0]
-        self.dn = df_dias_negativos['DiasNegativos'].mean()
+    @metric('mu', 'sigma')
+    def var_gauss_99(self):
+        return norm.ppf(0.01, self.mu, self.sigma) * 100
 
-        df['DiasPositivos'] = np.where(df['Daily Return'] > 0, 100 * (df['High'] - df['Low']) / df['Low'], 0)
-        df_dias_positivos = df.loc[df['DiasPositivos'] != 0]
-        self.dp = df_dias_positivos['DiasPositivos'].mean()
+    @metric('mu', 'sigma')
+    def var_gauss_99_7(self):
+        return norm.ppf(0.003, self.mu, self.sigma) * 100
 
-        self.data = df
+    @metric('returns')
+    def historic_percentiles(self):
+        # A single partition of the returns serves all three confidence levels.
+        return np.percentile(self.returns, [5, 1, .3]) * 100
+
+    @metric('historic_percentiles')
+    def var_historic_95(self):
+        return self.historic_percentiles[0]
+
+    @metric('historic_percentiles')
+    def var_historic_99(self):
+        return self.historic_percentiles[1]
+
+    @metric('historic_percentiles')
+    def var_historic_99_7(self):
+        return self.historic_percentiles[2]
+
+    @metric('returns')
+    def return_order_statistics(self):
+        return orderstats.OrderStatistics(self.returns)
+
+    @metric('return_order_statistics')
+    def rolling_var_historic(self):
+        return rolling_historic_var_frame(self.return_order_statistics, self.data.index)
+
+    @metric('returns')
+    def vol_14(self):
+        return self.returns.rolling(VOL_WINDOW).std() * 100
+
+    @metric('vol_14')
+    def vol_14_annualized(self):
+        return self.vol_14 * (self.periods_per_year ** 0.5)
+
+    @metric('vol_14_annualized')
+    def vol_sma_126(self):
+        return self.vol_14_annualized.rolling(VOL_SMA_WINDOW).mean()
+
+    @metric('vol_14_annualized')
+    def vol_extremes(self):
+        # Ranges too short for one volatility window have no extremes, as in RangeQueryIndex.
+        values = self.vol_14_annualized.to_numpy()
+        if np.isnan(values).all():
+            return np.nan, None, np.nan, None
+        low, high = np.nanargmin(values), np.nanargmax(values)
+        return values[low], self.data.index[low], values[high], self.data.index[high]
+
+    @metric('std_daily_return')
+    def vam(self):
+        return self.std_daily_return * (self.periods_per_year ** 0.5)
+
+    @metric()
+    def day_range(self):
+        return 100 * (self.data['High'] - self.data['Low']) / self.data['Low']
+
+    @metric('returns', 'day_range')
+    def dn(self):
+        ranges = self.day_range[(self.returns < 0) & (self.day_range != 0)]
+        return ranges.mean()
+
+    @metric('returns', 'day_range')
+    def dp(self):
+        ranges = self.day_range[(self.returns > 0) & (self.day_range != 0)]
+        return ranges.mean()
+
+    @metric('prices', 'returns', 'day_range')
+    def rolling_windows(self):
+        return rolling.rolling_metrics_frame(self.prices, self.returns, self.day_range, self.data.index,
+                                             periods_per_year=self.periods_per_year)
+
+    @metric('prices')
+    def log_prices(self):
+        return np.log(self.prices.to_numpy(dtype='f8'))
+
+    @metric('log_prices')
+    def hurst(self):
+        return float(stationarity.hurst_exponent(self.log_prices))
+
+    @metric('log_prices')
+    def adf(self):
+        return stationarity.adf(self.log_prices)
+
+    @metric('log_prices')
+    def variance_ratios(self):
+        return stationarity.variance_ratios(self.log_prices)
+
+    def summary(self):
+        min_vol, _, max_vol, _ = self.vol_extremes
+        return {
+            'cagr': self.cagr,
+            'buy_and_hold_return': self.buy_and_hold_return,
+            'max_dd': self.max_dd,
+            'mean_daily_return': self.mean_daily_return,
+            'std_daily_return': self.std_daily_return,
+            'min_return': self.min_return,
+            'max_return': self.max_return,
+            'trading_days': int(self.trading_days),
+            'skewness': self.skewness,
+            'kurtosis': self.kurtosis,
+            'mu': self.mu,
+            'sigma': self.sigma,
+            'var_gauss_95': self.var_gauss_95,
+            'var_gauss_99': self.var_gauss_99,
+            'var_gauss_99_7': self.var_gauss_99_7,
+            'var_historic_95': self.var_historic_95,
+            'var_historic_99': self.var_historic_99,
+            'var_historic_99_7': self.var_historic_99_7,
+            'vam': self.vam,
+            'min_vol': min_vol,
+            'min_vol_date': self.min_vol_date(),
+            'max_vol': max_vol,
+            'max_vol_date': self.max_vol_date(),
+            'dn': self.dn,
+            'dp': self.dp,
+            'pos_neg_days_ratio': self.pos_neg_days_ratio()
+        }
 
     def pos_neg_days_ratio(self):
         return self.dn / self.dp
 
     def daily_return(self):
-        return self.data['Daily Return']
+        return self.returns
 
     def count(self):
         return len(self.data)
@@ -72,19 +295,29 @@ class TimeSeriesAnalyzer:
         return self.data.index
 
     def adj_close(self):
-        return self.data['Adj Close']
+        return self.prices
 
     def historic_vol_14_days(self):
-        return self.data['Volatilidad_Historica_14_Dias']
+        return self.vol_14
 
     def historic_vol_14_days_annualized(self):
-        return self.data['Volatilidad_14_Dias_Anualizada']
+        return self.vol_14_annualized
 
     def historic_vol_sma_126(self):
-        return self.data['SMA_126_Volatilidad_Anualizada']
+        return self.vol_sma_126
+
+    def rolling_historic_var(self):
+        return self.rolling_var_historic
+
+    def rolling_metrics(self):
+        return self.rolling_windows
 
     def min_vol_date(self):
-        return self.data.Volatilidad_14_Dias_Anualizada[self.data.Volatilidad_14_Dias_Anualizada == self.data['Volatilidad_14_Dias_Anualizada'].min()].index.strftime('%Y-%m-%d').tolist()[0]
+        return self.format_date(self.vol_extremes[1])
 
     def max_vol_date(self):
-        return self.data.Volatilidad_14_Dias_Anualizada[self.data.Volatilidad_14_Dias_Anualizada == self.data['Volatilidad_14_Dias_Anualizada'].max()].index.strftime('%Y-%m-%d').tolist()[0]
+        return self.format_date(self.vol_extremes[3])
+
+    @staticmethod
+    def format_date(date):
+        return None if date is None else date.strftime('%Y-%m-%d')
@@ -1,146 +1,359 @@
-import seaborn as sns
-import pandas as pd
-import numpy as np
-import pandas_datareader as dr
-import matplotlib.pyplot as plt
-
-from pandas.plotting import register_matplotlib_converters
-from scipy.stats import norm
-from scipy import stats
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import date
 
-plt.style.use('seaborn-darkgrid')
-
-ticker_symbol = 'SPY'
-from_date = '2000-01-01'
-to_date = date.today()
-df = dr.data.get_data_yahoo(ticker_symbol, start=from_date, end=to_date)
-
-df = df[~df.index.duplicated()]
-print("Últimos valores del DataFrame sin duplicados:", df.tail(), sep='\n')
-
-df['Daily Return'] = df['Adj Close'].pct_change()
-df['Daily Return (%)'] = df['Daily Return'] * 100
-print("Últimos valores del DataFrame incluyendo la tasa de cambio (aritmética y porcentual):", df.tail(), sep='\n')
-
-df = df.iloc[1:]
-
-plt.figure(figsize=(15, 8))
-sns.set(color_codes=True)
-ax = sns.displot(df['Daily Return'], bins=100, kde=False, hue_norm=stats.norm, color='green')
-
-(mu, sigma) = stats.norm.fit(df['Daily Return'])
-
-plt.title("Distribución Histórica de los Retornos Diarios", fontsize=16)
-plt.ylabel("Frecuencia")
-plt.legend(["Distr. normal. fit ($\\mu=${0:.2g}, $\\sigma=${1:.2f})".format(mu, sigma), "Distr. R. Aritméticos"])
-
-# Calculamos la Tasa de Crecimiento Anual Compuesto (conocido como CAGR, del inglés).
-
-years = len(df) / 252
-cagr = (df['Adj Close'].iloc[-1] / df['Adj Close'].iloc[0]) ** (1 / years) - 1
-print("> Tasa de Crecimiento Anual Compuesto (CAGR):", '%.6s' % (100 * cagr), "%")
-
-# Calculamos el resultado de comprar y mantener.
-
-buy_and_hold_return = ((df['Adj Close'].iloc[-1] - df['Adj Close'].iloc[0]) / df['Adj Close'].iloc[0]) * 100
-print("> Buy & Hold:", '%.6s' % buy_and_hold_return, "%")
-
-# Calculamos el Máximo Drawdown.
-
-previous_max = df['Adj Close'].cummax()
-drawdowns = ((df['Adj Close'] - previous_max) / previous_max) * 100
-DD = pd.DataFrame({'Adj Close': df['Adj Close'], 'Previous Peak': previous_max, 'Drawdown': drawdowns})
-print("> Máximo Drawdown Histórico:", '%.6s' % np.min(DD['Drawdown']), "%")
-
-# Obtenemos el promedio, desviación típica, máximo y mínimo valor y número de datos analizados:
-
-print("> Media Diaria:", '%.6s' % (df['Daily Return'].mean() * 100), "%")
-print("> Desviación Típica Diaria:", '%.6s' % (df['Daily Return'].std(ddof=1) * 100), "%")
-print("> Máxima Pérdida Diaria:", '%.6s' % (df['Daily Return'].min() * 100), "%")
-print("> Máximo Beneficio Diario:", '%.6s' % (df['Daily Return'].max() * 100), "%")
-print("> Días Analizados:", '%.6s' % df['Daily Return'].count())
-print(">--------------------------------------------------")
-
-# Coeficiente de asimetría y curtosis de la distribución.
-
-print("> Coeficiente de Asimetría:", '%.6s' % df['Daily Return'].skew())
-print("> Curtosis:", '%.6s' % df['Daily Return'].kurt())
-print(">--------------------------------------------------")
-
-# VaR Teórico obtenido a través de la distribución normal al 95% y 99% de confianza.
-
-print("> VaR Modelo Gaussiano NC-95% :", '%.6s' % (norm.ppf(0.05, mu, sigma) * 100), "%")
-print("> VaR Modelo Gaussiano NC-99% :", '%.6s' % (norm.ppf(0.01, mu, sigma) * 100), "%")
-print("> VaR Modelo Gaussiano NC-99.7% :", '%.6s' % (norm.ppf(0.003, mu, sigma) * 100), "%")
-
-# VaR histórico al 95% y 99% de confianza.
-
-print("> VaR Modelo Histórico NC-95% :", '%.6s' % (100 * np.percentile(df['Daily Return'], 5)), "%")
-print("> VaR Modelo Histórico NC-99% :", '%.6s' % (100 * np.percentile(df['Daily Return'], 1)), "%")
-print("> VaR Modelo Histórico NC-99.7% :", '%.6s' % (100 * np.percentile(df['Daily Return'], .3)), "%")
-print(">--------------------------------------------------")
-
-# Registramos Matplotlib converters para adatpar la fecha -DateTime- al método de dibujo de Matplotlib
-
-register_matplotlib_converters()
-
-# Calculamos la volatilidad histórica de 14 días, la volatilidad anualizada y su SMA de 252 días.
-
-df['Vol. Historica 14 Dias'] = df['Daily Return'].rolling(14).std() * 100
-df['Vol. Anualizada'] = df['Vol. Historica 14 Dias'] * (252 ** 0.5)
-df['SMA 126 Vol. Anualizada'] = df['Vol. Anualizada'].rolling(126).mean()
-
-# Creamos un gráfico en el que mostramos el precio de cierre, la volatilidad anualizada y su SMA.
-
-fig, ax1 = plt.subplots(figsize=(15, 8))
-ax2 = ax1.twinx()
-ax1.plot(df['Vol. Anualizada'], 'orange', linestyle='--')
-ax1.plot(df['SMA 126 Vol. Anualizada'], 'green', linestyle='-')
-ax2.plot(df['Adj Close'], 'black')
-
-# Asignamos un nombre para el gráfico y para los ejes X e Y.
-
-plt.title("Evolución Histórica del Precio y la Volatilidad", fontsize=16)
-ax1.set_xlabel("Fecha")
-ax1.set_ylabel("Volatilidad Anualizada", color='black')
-ax2.set_ylabel("Precio de Cierre", color='black')
-
-# Configuramos la leyenda, las líneas de cuadrícula y mostramos el gráfico.
-
-ax1.legend(loc='upper left', frameon=True, borderpad=1)
-ax1.grid(True)
-ax2.grid(False)
-plt.show()
-
-# Volatilidad anualizada.
-
-VAM = df['Daily Return'].std() * 100 * (252 ** 0.5)
-print("> Volatilidad Anualizada:", '%.6s' % VAM, "%")
-
-# Obtenemos el valor mínimo y máximo de la volatilidad anualizada
-# así como las fechas en las que ambos valores son producidos.
-
-min_vol_date = df['Vol. Anualizada'].idxmin().strftime('%Y-%m-%d')
-max_vol_date = df['Vol. Anualizada'].idxmax().strftime('%Y-%m-%d')
-
-print("> La Mínima Vol. Anualizada fue de", '%.6s' % (df['Vol. Anualizada'].min()), "%", "registrada el", min_vol_date)
-print("> La Máxima Vol. Anualizada fue de", '%.6s' % (df['Vol. Anualizada'].max()), "%", "registrada el", max_vol_date)
-
-# Obtenemos el promedio sobre el rango porcentual de los días negativos.
-
-df['Negative Days'] = np.where(df['Daily Return'] < 0, 100 * (df['High'] - df['Low']) / df['Low'], 0)
-df_negative_days = df.loc[df['Negative Days'] != 0]
-ND = df_negative_days['Negative Days'].mean()
-print("> Rango Medio en los días negativos:", '%.4s' % ND, "%")
-
-# Obtenemos el promedio del rango porcentual de los días positivos.
-
-df['Positive Days'] = np.where(df['Daily Return'] > 0, 100 * (df['High'] - df['Low']) / df['Low'], 0)
-df_positive_days = df.loc[df['Positive Days'] != 0]
-PD = df_positive_days['Positive Days'].mean()
-print("> Rango Medio en los días positivos:", '%.4s' % PD, "%")
-
-# Calculamos el ratio del rango entre días negativos (RDN) y positivos (RDP).
-
-print("> Ratio RDN/RDP", '%.4s' % (ND / PD), "%")
+# Batch runs only import the analyzer (in the workers); matplotlib and seaborn are imported by
+# plot_report() when a single-ticker run asks for --plot.
+
+SUMMARY_COLUMNS = [
+    'cagr', 'buy_and_hold_return', 'max_dd', 'mean_daily_return', 'std_daily_return', 'min_return', 'max_return',
+    'trading_days', 'skewness', 'kurtosis', 'mu', 'sigma', 'var_gauss_95', 'var_gauss_99', 'var_gauss_99_7',
+    'var_historic_95', 'var_historic_99', 'var_historic_99_7', 'vam', 'min_vol', 'min_vol_date', 'max_vol',
+    'max_vol_date', 'dn', 'dp', 'pos_neg_days_ratio'
+]
+COLUMNS = ['ticker'] + SUMMARY_COLUMNS + ['error']
+FORMATS = ('csv', 'jsonl', 'parquet')
+PARQUET_PART_ROWS = 500
+
+REPORT_LINES = [
+    ('Tasa de Crecimiento Anual Compuesto (CAGR)', 'cagr', ' %'),
+    ('Buy & Hold', 'buy_and_hold_return', ' %'),
+    ('Máximo Drawdown Histórico', 'max_dd', ' %'),
+    ('Media Diaria', 'mean_daily_return', ' %'),
+    ('Desviación Típica Diaria', 'std_daily_return', ' %'),
+    ('Máxima Pérdida Diaria', 'min_return', ' %'),
+    ('Máximo Beneficio Diario', 'max_return', ' %'),
+    ('Días Analizados', 'trading_days', ''),
+    ('Coeficiente de Asimetría', 'skewness', ''),
+    ('Curtosis', 'kurtosis', ''),
+    ('VaR Modelo Gaussiano NC-95%', 'var_gauss_95', ' %'),
+    ('VaR Modelo Gaussiano NC-99%', 'var_gauss_99', ' %'),
+    ('VaR Modelo Gaussiano NC-99.7%', 'var_gauss_99_7', ' %'),
+    ('VaR Modelo Histórico NC-95%', 'var_historic_95', ' %'),
+    ('VaR Modelo Histórico NC-99%', 'var_historic_99', ' %'),
+    ('VaR Modelo Histórico NC-99.7%', 'var_historic_99_7', ' %'),
+    ('Volatilidad Anualizada', 'vam', ' %'),
+    ('Mínima Vol. Anualizada', 'min_vol', ' %'),
+    ('Fecha de la Mínima Vol. Anualizada', 'min_vol_date', ''),
+    ('Máxima Vol. Anualizada', 'max_vol', ' %'),
+    ('Fecha de la Máxima Vol. Anualizada', 'max_vol_date', ''),
+    ('Rango Medio en los días negativos', 'dn', ' %'),
+    ('Rango Medio en los días positivos', 'dp', ' %'),
+    ('Ratio RDN/RDP', 'pos_neg_days_ratio', ' %')
+]
+
+
+def to_plain(value):
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def error_row(ticker_symbol, error=None):
+    return dict(dict.fromkeys(COLUMNS), ticker=ticker_symbol, error=error)
+
+
+def analyze(ticker_symbol, from_date, to_date):
+    # Runs in a worker process. Any failure becomes an error row so one bad ticker never stops
+    # the run; the result is plain Python values, cheap to pickle back.
+    row = error_row(ticker_symbol)
+    try:
+        from analyzer import TimeSeriesAnalyzer
+        summary = TimeSeriesAnalyzer(ticker_symbol, from_date, to_date).summary()
+        row.update((column, to_plain(summary[column])) for column in SUMMARY_COLUMNS)
+    except Exception as e:
+        row['error'] = f'{type(e).__name__}: {e}'
+    return row
+
+
+def read_tickers(path):
+    with (sys.stdin if path == '-' else open(path)) as f:
+        tickers = (line.split('#', 1)[0].strip().upper() for line in f)
+        return list(OrderedDict.fromkeys(ticker for ticker in tickers if ticker))
+
+
+def open_for_append(path):
+    # A run killed mid-write can leave a partial last line; start the next row on a fresh one.
+    ends_cleanly = True
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            ends_cleanly = f.read(1) == b'\n'
+    f = open(path, 'a', newline='')
+    if not ends_cleanly:
+        f.write('\n')
+    return f
+
+
+def output_format(path, requested=None):
+    if requested:
+        return requested
+    extension = os.path.splitext(path.rstrip('/'))[1].lstrip('.').lower()
+    return extension if extension in FORMATS else 'csv'
+
+
+class CsvWriter:
+
+    def __init__(self, path):
+        import csv
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open_for_append(path)
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS)
+        if not exists:
+            self.writer.writeheader()
+
+    @staticmethod
+    def keep_finished(path):
+        import csv
+        if not os.path.exists(path):
+            return set()
+        tickers = set()
+        with open(path, newline='') as f, open(path + '.tmp', 'w', newline='') as out:
+            writer = csv.DictWriter(out, fieldnames=COLUMNS)
+            writer.writeheader()
+            for row in csv.DictReader(f):
+                # Rows cut short by a killed run have missing fields, which DictReader fills with None.
+                if None not in row.values() and not row['error']:
+                    writer.writerow(row)
+                    tickers.add(row['ticker'])
+        os.replace(path + '.tmp', path)
+        return tickers
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlWriter:
+
+    def __init__(self, path):
+        self.file = open_for_append(path)
+
+    @staticmethod
+    def keep_finished(path):
+        if not os.path.exists(path):
+            return set()
+        tickers = set()
+        with open(path) as f, open(path + '.tmp', 'w') as out:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a killed run
+                if not row.get('error'):
+                    out.write(line if line.endswith('\n') else line + '\n')
+                    tickers.add(row['ticker'])
+        os.replace(path + '.tmp', path)
+        return tickers
+
+    def write(self, row):
+        self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    # Parquet files cannot be appended to, so the output is a directory of part files, each
+    # written whole once PARQUET_PART_ROWS rows are buffered; a killed run loses only its buffer.
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.rows = []
+        parts = self.parts(path)
+        self.part = int(parts[-1][len('part-'):-len('.parquet')]) + 1 if parts else 0
+
+    @staticmethod
+    def parts(path):
+        return sorted(name for name in os.listdir(path) if name.startswith('part-') and name.endswith('.parquet'))
+
+    @staticmethod
+    def keep_finished(path):
+        if not os.path.isdir(path):
+            return set()
+        import pandas as pd
+        tickers = set()
+        for name in ParquetWriter.parts(path):
+            part_path = os.path.join(path, name)
+            df = pd.read_parquet(part_path)
+            finished = df[df['error'].isna()]
+            if not len(finished):
+                os.remove(part_path)
+            elif len(finished) < len(df):
+                finished.to_parquet(part_path + '.tmp', index=False)
+                os.replace(part_path + '.tmp', part_path)
+            tickers.update(finished['ticker'])
+        return tickers
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= PARQUET_PART_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        import pandas as pd
+        df = pd.DataFrame(self.rows, columns=COLUMNS)
+        name = f'part-{self.part:05d}.parquet'
+        df.to_parquet(os.path.join(self.path, name + '.tmp'), index=False)
+        os.replace(os.path.join(self.path, name + '.tmp'), os.path.join(self.path, name))
+        self.part += 1
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonlWriter, 'parquet': ParquetWriter}
+
+
+def run_batch(tickers, output, from_date, to_date, workers=None, output_format_name=None, resume=True,
+              log=None):
+    # At most 2 * workers tickers are queued at a time, so memory stays flat for any universe
+    # size, and every row is written as soon as its ticker completes. Resuming first drops the
+    # failed rows of the previous run, so every ticker ends up with a single row.
+    writer_class = WRITERS[output_format(output, output_format_name)]
+    done = writer_class.keep_finished(output) if resume else set()
+    pending_tickers = [ticker for ticker in tickers if ticker not in done]
+    if not resume and os.path.isdir(output):
+        for name in ParquetWriter.parts(output):
+            os.remove(os.path.join(output, name))
+    elif not resume and os.path.exists(output):
+        os.remove(output)
+    workers = workers or os.cpu_count() or 1
+    writer = writer_class(output)
+    failures = 0
+
+    def record(row):
+        nonlocal failures
+        writer.write(row)
+        if row['error']:
+            failures += 1
+        if log:
+            log(f"{row['ticker']}: {row['error'] or 'ok'}")
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        queue = iter(pending_tickers)
+        running = {}
+        while True:
+            broken = False
+            for ticker in queue:
+                try:
+                    future = pool.submit(analyze, ticker, from_date, to_date)
+                except BrokenProcessPool:
+                    # The pool died since the last wait; this ticker was never sent and goes to the next pool.
+                    queue, broken = itertools.chain([ticker], queue), True
+                    break
+                running[future] = ticker
+                if len(running) >= 2 * workers:
+                    break
+            if not running and not broken:
+                break
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            if broken or any(isinstance(future.exception(), BrokenProcessPool) for future in completed):
+                # A worker died (segfault, out-of-memory kill) and took the pool with it: whatever
+                # was in flight fails at once, to be retried on resume, and a fresh pool goes on.
+                completed, _ = wait(running)
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=workers)
+            for future in completed:
+                ticker = running.pop(future)
+                error = future.exception()
+                record(error_row(ticker, f'{type(error).__name__}: {error}') if error else future.result())
+    finally:
+        pool.shutdown()
+        writer.close()
+    return {'skipped': len(tickers) - len(pending_tickers), 'processed': len(pending_tickers), 'failed': failures}
+
+
+def print_report(ticker_symbol, summary):
+    print(f'> {ticker_symbol}')
+    for label, key, unit in REPORT_LINES:
+        value = summary[key]
+        print(f'> {label}:', value if isinstance(value, str) else '%.6s' % value, unit.strip())
+
+
+def plot_report(ticker_analysis):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # matplotlib 3.6 renamed the seaborn styles.
+    plt.style.use('seaborn-v0_8-darkgrid' if 'seaborn-v0_8-darkgrid' in plt.style.available else 'seaborn-darkgrid')
+    sns.set(color_codes=True)
+    sns.displot(ticker_analysis.daily_return(), bins=100, kde=False, color='green')
+    plt.title("Distribución Histórica de los Retornos Diarios", fontsize=16)
+    plt.ylabel("Frecuencia")
+    plt.legend(["Distr. normal. fit ($\\mu=${0:.2g}, $\\sigma=${1:.2f})".format(ticker_analysis.mu, ticker_analysis.sigma),
+                "Distr. R. Aritméticos"])
+
+    index = ticker_analysis.index()
+    fig, ax1 = plt.subplots(figsize=(15, 8))
+    ax2 = ax1.twinx()
+    ax1.plot(index, ticker_analysis.historic_vol_14_days_annualized(), 'orange', linestyle='--',
+             label='Vol. Anualizada')
+    ax1.plot(index, ticker_analysis.historic_vol_sma_126(), 'green', linestyle='-', label='SMA 126 Vol. Anualizada')
+    ax2.plot(index, ticker_analysis.adj_close(), 'black')
+    plt.title("Evolución Histórica del Precio y la Volatilidad", fontsize=16)
+    ax1.set_xlabel("Fecha")
+    ax1.set_ylabel("Volatilidad Anualizada", color='black')
+    ax2.set_ylabel("Precio de Cierre", color='black')
+    ax1.legend(loc='upper left', frameon=True, borderpad=1)
+    ax1.grid(True)
+    ax2.grid(False)
+    plt.show()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analiza un símbolo o, en modo batch, una lista de símbolos.')
+    parser.add_argument('ticker', nargs='?', default='SPY', help='símbolo a analizar (modo interactivo)')
+    parser.add_argument('--from-date', default='2000-01-01')
+    parser.add_argument('--to-date', default=str(date.today()))
+    parser.add_argument('--plot', action='store_true', help='dibuja la distribución y la volatilidad')
+    parser.add_argument('--memory', action='store_true', help='muestra la memoria que ocupa el análisis')
+    parser.add_argument('--tickers', help="fichero con un símbolo por línea ('-' para stdin): activa el modo batch")
+    parser.add_argument('--output', help='CSV, JSONL o directorio Parquet con una fila por símbolo')
+    parser.add_argument('--format', choices=FORMATS, help='por defecto, según la extensión de --output')
+    parser.add_argument('--workers', type=int, help='procesos en paralelo (por defecto, uno por CPU)')
+    parser.add_argument('--no-resume', action='store_true', help='recalcula los símbolos ya escritos')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.tickers:
+        if not args.output:
+            parser.error('--tickers requiere --output')
+        counts = run_batch(read_tickers(args.tickers), args.output, args.from_date, args.to_date, args.workers,
+                           args.format, not args.no_resume, log=None if args.quiet else print)
+        print(f"{counts['processed']} procesados, {counts['failed']} con error, {counts['skipped']} ya calculados")
+        return 0
+
+    from compact import CompactAnalyzer
+    ticker_analysis = CompactAnalyzer(args.ticker.upper(), args.from_date, args.to_date, chart_dtype='f4')
+    print_report(args.ticker.upper(), ticker_analysis.summary())
+    if args.memory:
+        for name, size in ticker_analysis.memory_footprint().items():
+            print(f'> {name}: {size / 1024:.1f} KiB')
+    if args.plot:
+        plot_report(ticker_analysis)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
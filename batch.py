@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import datasource
+
+from scipy.stats import norm
+from analyzer import TRADING_DAYS, VOL_SMA_WINDOW, VOL_WINDOW
+
+VAR_LEVELS = (('95', 5), ('99', 1), ('99_7', .3))
+
+
+def take_rows(values, rows):
+    return np.take_along_axis(values, np.asarray(rows).reshape(1, -1), axis=0)[0]
+
+
+def rolling_sum(values, window):
+    # values must be zero (not NaN) outside the mask; row i holds the sum of rows i-window+1..i.
+    cumulative = np.cumsum(values, axis=0)
+    sums = cumulative.copy()
+    sums[window:] -= cumulative[:-window]
+    sums[:window - 1] = np.nan
+    return sums
+
+
+class BatchAnalyzer:
+    # Computes the TimeSeriesAnalyzer statistics for every column of a (dates x tickers) matrix at
+    # once. Each column is packed so that its own bars come first and in date order; ragged
+    # histories then become a per-column row count and every metric is a column-wise NumPy pass.
+
+    def __init__(self, adj_close, high=None, low=None, periods_per_year=TRADING_DAYS):
+        self.periods_per_year = periods_per_year
+        self.tickers = list(adj_close.columns)
+        self.dates = adj_close.index
+        prices = adj_close.to_numpy(dtype='f8')
+        valid = np.isfinite(prices)
+        self.order = np.argsort(~valid, axis=0, kind='stable')
+        packed = np.take_along_axis(prices, self.order, axis=0)
+        self.prices = packed[1:]
+        self.returns = packed[1:] / packed[:-1] - 1
+        self.count = np.maximum(valid.sum(axis=0) - 1, 0)
+        self.mask = np.arange(len(self.prices)).reshape(-1, 1) < self.count
+        self.returns[~self.mask] = np.nan
+        self.prices = np.where(self.mask, self.prices, np.nan)
+        if high is not None and low is not None:
+            high = np.take_along_axis(high.reindex_like(adj_close).to_numpy(dtype='f8'), self.order, axis=0)[1:]
+            low = np.take_along_axis(low.reindex_like(adj_close).to_numpy(dtype='f8'), self.order, axis=0)[1:]
+            self.day_range = 100 * (high - low) / low
+        else:
+            self.day_range = None
+        self.vol_14_annualized, self.vol_sma_126 = self.rolling_vol()
+
+    @classmethod
+    def from_source(cls, ticker_symbols, from_date, to_date, data_source=None):
+        data_source = data_source or datasource.default_source()
+        frames = {}
+        for ticker_symbol in ticker_symbols:
+            df = data_source.get_prices(ticker_symbol, from_date, to_date)
+            frames[ticker_symbol] = df[~df.index.duplicated()]
+        columns = {name: pd.DataFrame({t: df[name] for t, df in frames.items()}) for name in ('Adj Close', 'High', 'Low')}
+        return cls(columns['Adj Close'], columns['High'], columns['Low'],
+                   getattr(data_source, 'periods_per_year', TRADING_DAYS))
+
+    def rolling_vol(self):
+        centered = np.where(self.mask, self.returns - np.nanmean(self.returns, axis=0), 0)
+        s1 = rolling_sum(centered, VOL_WINDOW)
+        s2 = rolling_sum(centered ** 2, VOL_WINDOW)
+        std = np.sqrt(np.maximum(s2 - s1 ** 2 / VOL_WINDOW, 0) / (VOL_WINDOW - 1))
+        vol = std * 100 * (self.periods_per_year ** 0.5)
+        vol[~self.mask] = np.nan
+        sma = rolling_sum(np.where(np.isfinite(vol), vol, 0), VOL_SMA_WINDOW) / VOL_SMA_WINDOW
+        rows = np.arange(len(vol)).reshape(-1, 1)
+        sma[(rows < VOL_WINDOW + VOL_SMA_WINDOW - 2) | ~self.mask] = np.nan
+        return vol, sma
+
+    def unpack(self, values):
+        # Scatter a packed (analysis rows x tickers) array back onto the original date index.
+        out = np.full((len(self.dates), len(self.tickers)), np.nan)
+        rows = self.order[1:]
+        # Masked rows all land on date row 0, which is never an analysis row (it is at best the
+        # dropped first bar of a column), so writing NaN there is harmless.
+        np.put_along_axis(out, np.where(self.mask, rows, 0), np.where(self.mask, values, np.nan), axis=0)
+        return pd.DataFrame(out, index=self.dates, columns=self.tickers)
+
+    def historic_vol_14_days_annualized(self):
+        return self.unpack(self.vol_14_annualized)
+
+    def historic_vol_sma_126(self):
+        return self.unpack(self.vol_sma_126)
+
+    def vol_extreme(self, reducer, fill):
+        vol = self.vol_14_annualized
+        has_vol = np.isfinite(vol).any(axis=0)
+        rows = reducer(np.where(np.isfinite(vol), vol, fill), axis=0)
+        dates = self.dates[take_rows(self.order[1:], rows)].strftime('%Y-%m-%d')
+        return np.where(has_vol, take_rows(vol, rows), np.nan), np.where(has_vol, dates, None)
+
+    def results(self):
+        n = self.count.astype('f8')
+        n[n == 0] = np.nan
+        last_row = np.maximum(self.count - 1, 0)
+        first, last = self.prices[0], take_rows(self.prices, last_row)
+
+        peak = np.fmax.accumulate(self.prices, axis=0)
+        drawdowns = ((self.prices - peak) / peak) * 100
+
+        returns = self.returns
+        mean = np.nansum(returns, axis=0) / n
+        centered = returns - mean
+        m2 = np.nansum(centered ** 2, axis=0)
+        m3 = np.nansum(centered ** 3, axis=0)
+        m4 = np.nansum(centered ** 4, axis=0)
+        std = np.sqrt(m2 / (n - 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            skewness = (n * (n - 1)) ** 0.5 / (n - 2) * (m3 / n) / (m2 / n) ** 1.5
+            kurtosis = (n * (n + 1) * (n - 1) * m4) / ((n - 2) * (n - 3) * m2 ** 2) - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+        sigma = np.sqrt(m2 / n)
+
+        # One column-wise sort serves every historic VaR level (NaNs sort to the end of each column).
+        ordered = np.sort(returns, axis=0)
+        historic = {}
+        for name, q in VAR_LEVELS:
+            position = (n - 1) * q / 100
+            below = np.floor(np.nan_to_num(position)).astype(int)
+            above = np.minimum(below + 1, last_row)
+            low, high = take_rows(ordered, below), take_rows(ordered, above)
+            historic[name] = (low + (high - low) * (position - below)) * 100
+
+        min_vol, min_vol_date = self.vol_extreme(np.argmin, np.inf)
+        max_vol, max_vol_date = self.vol_extreme(np.argmax, -np.inf)
+
+        if self.day_range is not None:
+            negative = self.mask & (returns < 0) & (self.day_range != 0) & np.isfinite(self.day_range)
+            positive = self.mask & (returns > 0) & (self.day_range != 0) & np.isfinite(self.day_range)
+            with np.errstate(invalid='ignore'):
+                dn = np.where(negative, self.day_range, 0).sum(axis=0) / negative.sum(axis=0)
+                dp = np.where(positive, self.day_range, 0).sum(axis=0) / positive.sum(axis=0)
+        else:
+            dn = dp = np.full(len(self.tickers), np.nan)
+
+        results = {
+            'cagr': ((last / first) ** (self.periods_per_year / n) - 1) * 100,
+            'buy_and_hold_return': ((last - first) / first) * 100,
+            'max_dd': np.nanmin(np.where(self.mask, drawdowns, np.inf), axis=0),
+            'mean_daily_return': mean * 100,
+            'std_daily_return': std * 100,
+            'min_return': np.nanmin(np.where(self.mask, returns, np.inf), axis=0) * 100,
+            'max_return': np.nanmax(np.where(self.mask, returns, -np.inf), axis=0) * 100,
+            'trading_days': self.count,
+            'skewness': skewness,
+            'kurtosis': kurtosis,
+            'mu': mean,
+            'sigma': sigma
+        }
+        for name, q in VAR_LEVELS:
+            results['var_gauss_' + name] = (mean + sigma * norm.ppf(q / 100)) * 100
+        for name, q in VAR_LEVELS:
+            results['var_historic_' + name] = historic[name]
+        results.update({
+            'vam': std * 100 * (self.periods_per_year ** 0.5),
+            'min_vol': min_vol,
+            'min_vol_date': min_vol_date,
+            'max_vol': max_vol,
+            'max_vol_date': max_vol_date,
+            'dn': dn,
+            'dp': dp,
+            'pos_neg_days_ratio': dn / dp
+        })
+        return pd.DataFrame(results, index=pd.Index(self.tickers, name='Ticker'))
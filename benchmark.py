@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import analyzer
+import datasource
+import rangequery
+import synthetic
+
+DEFAULT_SIZES = '1k,10k,100k,1m'
+STAGES = ('ingest', 'returns', 'moments_var', 'rolling_vol', 'rolling_windows', 'range_index', 'figures',
+          'serialize_json', 'serialize_f8')
+MOMENT_METRICS = ('cagr', 'max_dd', 'mean_daily_return', 'std_daily_return', 'min_return', 'max_return',
+                  'skewness', 'kurtosis', 'var_gauss_95', 'var_gauss_99', 'var_gauss_99_7',
+                  'var_historic_95', 'var_historic_99', 'var_historic_99_7', 'dn', 'dp')
+ROLLING_METRICS = ('vol_14_annualized', 'vol_sma_126', 'vol_extremes', 'rolling_var_historic')
+TICKER = 'SYN'
+# Cold-start import times: `main` must stay Dash-only, `figures` is the deferred numerical stack.
+STARTUP_MODULES = ('main', 'figures')
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+def best_time(fn, setup, repeat):
+    # Minimum over repeats; setup runs untimed so lazy state never leaks between runs.
+    best = None
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        fn(state)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def ingest(source, from_date, to_date):
+    directory = tempfile.mkdtemp(prefix='tsa-bench-')
+    try:
+        df = datasource.ColumnarStore(directory, source).get_prices(TICKER, from_date, to_date)
+        return df[~df.index.duplicated()]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def build_figures(ticker_analysis):
+    import figures
+    return [figures.get_historic_prices_graph(ticker_analysis, TICKER),
+            figures.get_distplot_daily_returns(ticker_analysis),
+            figures.get_vol_price_evolution(ticker_analysis)]
+
+
+def serialize(built_figures, encoding):
+    import payload
+    from plotly.utils import PlotlyJSONEncoder
+    return [json.dumps(payload.encode_figure(figure, encoding), cls=PlotlyJSONEncoder) for figure in built_figures]
+
+
+def import_time(module, repeat):
+    code = f'import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)'
+    env = dict(os.environ, TSA_WARM_UP='0')
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        times.append(float(result.stdout.decode().split()[-1]))
+    return min(times)
+
+
+def run_size(bars, repeat, stages):
+    # Past 50k bars the history is minute bars, generated with minute-sized steps so that the walk
+    # stays within float range at 10m bars.
+    if bars <= 50000:
+        source = synthetic.SyntheticDataSource(bars)
+    else:
+        source = synthetic.SyntheticDataSource(bars, freq='min', periods_per_year=252 * 390)
+    raw = source.frame(TICKER)
+    from_date, to_date = raw.index[0], raw.index[-1]
+
+    def fresh_analysis():
+        return analyzer.TimeSeriesAnalyzer(TICKER, from_date, to_date, data_source=source)
+
+    timings = {}
+    for stage in stages:
+        if stage == 'ingest':
+            timings[stage] = best_time(lambda _: ingest(source, from_date, to_date), lambda: None, repeat)
+        elif stage == 'returns':
+            timings[stage] = best_time(lambda _: fresh_analysis().returns, lambda: None, repeat)
+        elif stage == 'moments_var':
+            timings[stage] = best_time(lambda a: a.compute(*MOMENT_METRICS), fresh_analysis, repeat)
+        elif stage == 'rolling_vol':
+            timings[stage] = best_time(lambda a: a.compute(*ROLLING_METRICS), fresh_analysis, repeat)
+        elif stage == 'rolling_windows':
+            timings[stage] = best_time(lambda a: a.rolling_windows, fresh_analysis, repeat)
+        elif stage == 'range_index':
+            timings[stage] = best_time(lambda df: rangequery.RangeQueryIndex(df), lambda: raw, repeat)
+        elif stage == 'figures':
+            timings[stage] = best_time(build_figures, fresh_analysis, repeat)
+        elif stage.startswith('serialize_'):
+            encoding = stage.split('_', 1)[1]
+            timings[stage] = best_time(lambda built: serialize(built, encoding),
+                                       lambda: build_figures(fresh_analysis()), repeat)
+    return timings
+
+
+def cpu_name():
+    # platform.processor() is empty on most Linux builds; /proc/cpuinfo names the model there.
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def run(sizes, repeat=3, stages=STAGES, startup=True, log=None):
+    results = {}
+    if startup:
+        results['startup'] = {'import_' + module: import_time(module, repeat) for module in STARTUP_MODULES}
+        if log:
+            log(f'{"startup":>15}  ' + '  '.join(f'{s}={t * 1000:.1f}ms' for s, t in results['startup'].items()))
+    for bars in sizes:
+        results[str(bars)] = run_size(bars, repeat, stages)
+        if log:
+            log(f'{bars:>10} bars  ' + '  '.join(f'{s}={t * 1000:.1f}ms' for s, t in results[str(bars)].items()))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'processor': cpu_name(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+
+def compare(current, baseline, threshold, min_seconds=0.001):
+    # Stages slower than the baseline by more than `threshold` (0.2 = 20 %). Stages under
+    # `min_seconds` in both runs are timer noise and are skipped.
+    regressions = []
+    for size, stages in current['results'].items():
+        for stage, seconds in stages.items():
+            base = baseline['results'].get(size, {}).get(stage)
+            if base is None or max(base, seconds) < min_seconds:
+                continue
+            if seconds > base * (1 + threshold):
+                regressions.append((size, stage, base, seconds, seconds / base))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time each analyzer and UI stage on synthetic OHLCV data.')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated bar counts, e.g. 1k,10k,10m')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='write results as JSON to this path')
+    parser.add_argument('--compare', help='baseline JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--skip-startup', action='store_true', help='do not time cold-start imports')
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    results = run(sizes, args.repeat, args.stages.split(','), not args.skip_startup, log=print)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for size, stage, base, seconds, ratio in regressions:
+            print(f'REGRESSION {stage} @ {size} bars: {base * 1000:.1f}ms -> {seconds * 1000:.1f}ms ({ratio:.2f}x)')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
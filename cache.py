@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from dateutil import tz
+
+MARKET_TIMEZONE = tz.gettz('America/New_York')
+MARKET_CLOSE_HOUR = 16
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 24 * 60 * 60
+
+
+def next_market_close(now=None):
+    now = now or datetime.now(MARKET_TIMEZONE)
+    close = now.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0, microsecond=0)
+    if now >= close:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return close.timestamp()
+
+
+def make_key(*parts):
+    return json.dumps([str(part) for part in parts])
+
+
+class MemoryBackend:
+    # Per-process LRU bounded by the total size of the stored values.
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.lock = threading.Lock()
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] <= now:
+                self.remove(key)
+                entry = None
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value, expires):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (value, expires)
+            self.size += len(value)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                self.remove(next(iter(self.entries)))
+                self.counters['evictions'] += 1
+
+    def remove(self, key):
+        value, _ = self.entries.pop(key)
+        self.size -= len(value)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries), bytes=self.size, max_bytes=self.max_bytes)
+
+
+class SqliteBackend:
+    # Shared by every worker process on the instance: entries and counters live in one SQLite file.
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        with self.connection() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS entries '
+                       '(key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, accessed REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+            db.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)')
+
+    def connection(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+
+    def incr(self, db, name, amount=1):
+        db.execute('INSERT OR IGNORE INTO counters VALUES (?, 0)', (name,))
+        db.execute('UPDATE counters SET value = value + ? WHERE name = ?', (amount, name))
+
+    def get(self, key, now):
+        with self.connection() as db:
+            row = db.execute('SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[1] <= now:
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                row = None
+            if row is None:
+                self.incr(db, 'misses')
+                return None
+            db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            self.incr(db, 'hits')
+            return row[0]
+
+    def set(self, key, value, expires):
+        now = time.time()
+        with self.connection() as db:
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                       (key, sqlite3.Binary(value), len(value), expires, now))
+            db.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+            total = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                for old_key, size in db.execute('SELECT key, size FROM entries WHERE key != ? ORDER BY accessed',
+                                                (key,)).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    db.execute('DELETE FROM entries WHERE key = ?', (old_key,))
+                    total -= size
+                    evicted += 1
+                self.incr(db, 'evictions', evicted)
+
+    def stats(self):
+        db = self.connection()
+        counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        counters.update(db.execute('SELECT name, value FROM counters').fetchall())
+        entries, size = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return dict(counters, entries=entries, bytes=size, max_bytes=self.max_bytes)
+
+
+class ResultCache:
+    # Values are JSON documents (analyzer summaries and plotly figures), stored zlib-compressed.
+    # Entries expire at the next market close, when a new bar can change every adjusted price.
+
+    def __init__(self, backend, ttl=DEFAULT_TTL, encoder=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.encoder = encoder
+
+    def get(self, key):
+        value = self.backend.get(key, time.time())
+        if value is None:
+            return None
+        return json.loads(zlib.decompress(value).decode('utf-8'))
+
+    def set(self, key, value):
+        expires = min(time.time() + self.ttl, next_market_close())
+        encoded = json.dumps(value, cls=self.encoder).encode('utf-8')
+        self.backend.set(key, zlib.compress(encoded), expires)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        return self.backend.stats()
+
+
+def result_encoder():
+    # PlotlyJSONEncoder for numpy and pandas values, minus its final pass that turns NaN and
+    # infinities into null: a NaN statistic (min_vol over fewer than 14 bars) must come back out
+    # of the cache as a float, not None.
+    from plotly.utils import PlotlyJSONEncoder
+
+    class ResultEncoder(PlotlyJSONEncoder):
+
+        def encode(self, o):
+            return json.JSONEncoder.encode(self, o)
+
+    return ResultEncoder
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        max_bytes = int(os.environ.get('TSA_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        if os.environ.get('TSA_CACHE_BACKEND', 'sqlite') == 'memory':
+            backend = MemoryBackend(max_bytes)
+        else:
+            cache_dir = os.environ.get('TSA_CACHE_DIR', tempfile.gettempdir())
+            backend = SqliteBackend(os.path.join(cache_dir, 'tsa-results.sqlite3'), max_bytes)
+        _default_cache = ResultCache(backend, encoder=result_encoder())
+    return _default_cache
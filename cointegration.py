@@ -0,0 +1,90 @@
+import numpy as np
+import stationarity
+
+# Cointegration tests batched over many candidate pairs: arrays are (dates x pairs), or
+# (dates x pairs x variables) for Johansen, and every statistic comes out per pair.
+
+JOHANSEN_LEVELS = ('90%', '95%', '99%')
+# Johansen critical values with a constant (det_order 0), by the number of variables n - r left
+# under the null, as tabulated by MacKinnon, Haug and Michelis (1999).
+JOHANSEN_TRACE_CRITICAL_VALUES = {1: (2.7055, 3.8415, 6.6349), 2: (13.4294, 15.4943, 19.9349)}
+JOHANSEN_EIGEN_CRITICAL_VALUES = {1: (2.7055, 3.8415, 6.6349), 2: (12.2971, 14.2639, 18.52)}
+
+
+def hedge_regressions(y, x):
+    # OLS of each column of y on a constant and the same column of x.
+    x_centered = x - x.mean(axis=0)
+    slope = (x_centered * (y - y.mean(axis=0))).sum(axis=0) / (x_centered ** 2).sum(axis=0)
+    intercept = y.mean(axis=0) - slope * x.mean(axis=0)
+    return intercept, slope, y - intercept - slope * x
+
+
+def half_lives(spreads):
+    # Ornstein-Uhlenbeck half-life in bars from dS[t] = a + b S[t-1]: -ln 2 / b, infinite when the
+    # spread does not mean-revert (b >= 0).
+    lagged = spreads[:-1] - spreads[:-1].mean(axis=0)
+    changes = np.diff(spreads, axis=0)
+    slope = (lagged * (changes - changes.mean(axis=0))).sum(axis=0) / (lagged ** 2).sum(axis=0)
+    with np.errstate(divide='ignore'):
+        return np.where(slope < 0, -np.log(2) / slope, np.inf)
+
+
+def cadf(y, x, max_lag=None, autolag=True):
+    # Engle-Granger two-step test, as statsmodels' coint: hedge regression with constant, then ADF
+    # without constant on its residuals, with MacKinnon's two-variable p-values and critical values.
+    intercept, hedge_ratio, spreads = hedge_regressions(y, x)
+    result = stationarity.adf(spreads, max_lag, autolag, constant=False)
+    return {
+        'statistic': result['statistic'],
+        'p_value': stationarity.p_values(result['statistic'], variables=2),
+        'lags': result['lags'],
+        'critical_values': stationarity.critical_values(len(y) - 1, variables=2),
+        'hedge_ratio': hedge_ratio,
+        'intercept': intercept,
+        'half_life': half_lives(spreads)
+    }
+
+
+def residualize(a, z):
+    # Residuals of a (rows x batch x k) regressed on z (rows x batch x m), batch by batch.
+    a, z = a.transpose(1, 0, 2), z.transpose(1, 0, 2)
+    coefficients = np.linalg.solve(z.transpose(0, 2, 1) @ z, z.transpose(0, 2, 1) @ a)
+    return (a - z @ coefficients).transpose(1, 0, 2)
+
+
+def johansen(series, lags=1):
+    # Johansen trace and maximum eigenvalue statistics with a constant (det_order 0) and `lags`
+    # lagged differences, as statsmodels' coint_johansen but for a whole batch of systems.
+    # series is (dates x batch x variables); eigenvalues come out in decreasing order.
+    levels = series - series.mean(axis=0)
+    differences = np.diff(levels, axis=0)
+    dx = differences[lags:] - differences[lags:].mean(axis=0)
+    lx = levels[1:len(levels) - lags]
+    lx = lx - lx.mean(axis=0)
+    if lags:
+        lagged = np.concatenate([differences[lags - lag:len(differences) - lag] for lag in range(1, lags + 1)],
+                                axis=2)
+        lagged = lagged - lagged.mean(axis=0)
+        r0, rk = residualize(dx, lagged), residualize(lx, lagged)
+    else:
+        r0, rk = dx, lx
+    rows = len(rk)
+    skk = np.einsum('tbi,tbj->bij', rk, rk) / rows
+    sk0 = np.einsum('tbi,tbj->bij', rk, r0) / rows
+    s00 = np.einsum('tbi,tbj->bij', r0, r0) / rows
+    sig = sk0 @ np.linalg.solve(s00, sk0.transpose(0, 2, 1))
+    eigenvalues, eigenvectors = np.linalg.eig(np.linalg.solve(skk, sig))
+    order = np.argsort(-eigenvalues.real, axis=1)
+    eigenvalues = np.take_along_axis(eigenvalues.real, order, axis=1)
+    leading = np.take_along_axis(eigenvectors.real, order[:, None, :], axis=2)[:, :, 0]
+    logs = np.log(1 - eigenvalues)
+    variables = series.shape[2]
+    return {
+        'eigenvalues': eigenvalues,
+        'trace': -rows * np.cumsum(logs[:, ::-1], axis=1)[:, ::-1],
+        'max_eigen': -rows * logs,
+        'trace_critical_values': np.array([JOHANSEN_TRACE_CRITICAL_VALUES[variables - r] for r in range(variables)]),
+        'eigen_critical_values': np.array([JOHANSEN_EIGEN_CRITICAL_VALUES[variables - r] for r in range(variables)]),
+        # Cointegrating vector of the largest eigenvalue normalized on the first variable.
+        'vector': leading / leading[:, :1]
+    }
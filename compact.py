@@ -0,0 +1,94 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import datasource
+import orderstats
+import rangequery
+import rolling
+
+from analyzer import TRADING_DAYS, rolling_historic_var_frame
+from batch import BatchAnalyzer
+
+
+class CompactAnalyzer:
+    # Memory-lean stand-in for TimeSeriesAnalyzer with the accessors ui.py reads. Only what the
+    # report draws is kept: prices, returns and volatility as contiguous arrays (optionally float32
+    # via chart_dtype) next to the summary. The price frame and every intermediate are dropped once
+    # the constructor returns; the rolling frames are computed from the kept arrays when asked for.
+
+    __slots__ = ('ticker_symbol', 'dates', 'prices', 'returns', 'vol_14_annualized', 'vol_sma_126', 'stats', 'mu',
+                 'sigma', 'periods_per_year')
+
+    def __init__(self, ticker_symbol, from_date, to_date, data_source=None, chart_dtype='f8'):
+        data_source = data_source or datasource.default_source()
+        df = data_source.get_prices(ticker_symbol, from_date, to_date)
+        df = df[~df.index.duplicated()]
+        df = df[np.isfinite(df['Adj Close'].to_numpy(dtype='f8'))]
+        columns = {name: df[[name]].set_axis([ticker_symbol], axis=1) for name in ('Adj Close', 'High', 'Low')}
+        dates = df.index.values.astype('datetime64[ns]')
+        del df
+
+        # With no gaps the batch engine's packed rows are the analysis rows (every bar but the first).
+        batch = BatchAnalyzer(columns['Adj Close'], columns['High'], columns['Low'],
+                              getattr(data_source, 'periods_per_year', TRADING_DAYS))
+        del columns
+        stats = batch.results().iloc[0].to_dict()
+        self.stats = {key: value.item() if hasattr(value, 'item') else value for key, value in stats.items()}
+        self.stats['trading_days'] = int(self.stats['trading_days'])
+        # pandas reads a missing date back as NaN; the analyzers report None.
+        for key in ('min_vol_date', 'max_vol_date'):
+            if not isinstance(self.stats[key], str):
+                self.stats[key] = None
+        self.mu, self.sigma = self.stats['mu'], self.stats['sigma']
+
+        self.ticker_symbol = ticker_symbol
+        self.periods_per_year = batch.periods_per_year
+        self.dates = np.ascontiguousarray(dates[1:])
+        self.prices = np.ascontiguousarray(batch.prices[:, 0], dtype=chart_dtype)
+        self.returns = np.ascontiguousarray(batch.returns[:, 0], dtype=chart_dtype)
+        self.vol_14_annualized = np.ascontiguousarray(batch.vol_14_annualized[:, 0], dtype=chart_dtype)
+        self.vol_sma_126 = np.ascontiguousarray(batch.vol_sma_126[:, 0], dtype=chart_dtype)
+        del batch
+
+    def memory_footprint(self):
+        # Bytes held per attribute and in total, walked deeply like RangeQueryIndex's.
+        seen = set()
+        footprint = {name: rangequery.held_bytes(getattr(self, name), seen) for name in self.__slots__}
+        footprint['total'] = sys.getsizeof(self) + sum(footprint.values())
+        return footprint
+
+    def summary(self):
+        return self.stats
+
+    def series(self, values):
+        return pd.Series(values, index=self.index(), copy=False)
+
+    def pos_neg_days_ratio(self):
+        return self.stats['pos_neg_days_ratio']
+
+    def count(self):
+        return len(self.dates)
+
+    def index(self):
+        return pd.DatetimeIndex(self.dates)
+
+    def adj_close(self):
+        return self.series(self.prices)
+
+    def daily_return(self):
+        return self.series(self.returns)
+
+    def historic_vol_14_days_annualized(self):
+        return self.series(self.vol_14_annualized)
+
+    def historic_vol_sma_126(self):
+        return self.series(self.vol_sma_126)
+
+    def rolling_historic_var(self):
+        return rolling_historic_var_frame(orderstats.OrderStatistics(self.returns), self.index())
+
+    def rolling_metrics(self):
+        # The bar ranges are not kept, so only the charted metrics, which do not need them.
+        return rolling.rolling_metrics_frame(self.prices, self.returns, None, self.index(),
+                                             periods_per_year=self.periods_per_year, metrics=rolling.CHART_METRICS)
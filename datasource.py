@@ -0,0 +1,254 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from locking import FileLock
+
+PRICE_COLUMNS = ['High', 'Low', 'Open', 'Close', 'Volume', 'Adj Close']
+
+
+def normalize_day(value):
+    return pd.Timestamp(value).normalize().tz_localize(None)
+
+
+def to_epoch_ns(index):
+    return np.asarray(index.values.astype('datetime64[ns]').view('i8'))
+
+
+def between_days(df, from_day, to_day):
+    # Bars from the start of from_day to the end of to_day, intraday timestamps included.
+    return df[(df.index >= from_day) & (df.index < to_day + pd.Timedelta(days=1))]
+
+
+def business_days_between(start, end):
+    return np.busday_count(start.date(), (end + pd.Timedelta(days=1)).date())
+
+
+def source_key(data_source):
+    # Tells apart what different sources, directories and bar sizes serve for the same ticker.
+    parts = (type(data_source).__name__, getattr(data_source, 'directory', None), getattr(data_source, 'bar', None))
+    return ':'.join(str(part) for part in parts if part is not None)
+
+
+class YahooDataSource:
+
+    def get_prices(self, ticker_symbol, from_date, to_date):
+        import pandas_datareader as dr
+        return dr.data.get_data_yahoo(ticker_symbol, start=from_date, end=to_date)
+
+
+class LocalFileDataSource:
+    # Reads <directory>/<TICKER>.parquet or <directory>/<TICKER>.csv in the Yahoo export layout.
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, ticker_symbol):
+        for extension in ('.parquet', '.csv'):
+            path = os.path.join(self.directory, ticker_symbol.upper() + extension)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f'No local price file for {ticker_symbol} in {self.directory}')
+
+    def get_prices(self, ticker_symbol, from_date, to_date):
+        path = self.path(ticker_symbol)
+        if path.endswith('.parquet'):
+            df = pd.read_parquet(path)
+            if 'Date' in df.columns:
+                df = df.set_index('Date')
+        else:
+            df = pd.read_csv(path, index_col='Date', parse_dates=True)
+        df.index = pd.DatetimeIndex(df.index, name='Date')
+        return between_days(df.sort_index(), normalize_day(from_date), normalize_day(to_date))
+
+
+class ColumnarStore:
+    # Per-ticker directory of raw little-endian column files (Date as int64 epoch ns, prices as
+    # float64) that are memory-mapped on read and appended to in place. Only bars strictly before
+    # today are persisted; today's bar is fetched live so a partial session never gets cached.
+
+    def __init__(self, directory, source=None):
+        self.directory = directory
+        self.source = source
+        os.makedirs(directory, exist_ok=True)
+
+    def ticker_dir(self, ticker_symbol):
+        return os.path.join(self.directory, ticker_symbol.upper())
+
+    def column_path(self, ticker_symbol, column):
+        return os.path.join(self.ticker_dir(ticker_symbol), column.replace(' ', '_') + '.bin')
+
+    def meta_path(self, ticker_symbol):
+        return os.path.join(self.ticker_dir(ticker_symbol), 'meta.json')
+
+    def read_meta(self, ticker_symbol):
+        try:
+            with open(self.meta_path(ticker_symbol)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write_meta(self, ticker_symbol, meta):
+        path = self.meta_path(ticker_symbol)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def lock(self, ticker_symbol):
+        return FileLock(os.path.join(self.directory, ticker_symbol.upper() + '.lock'))
+
+    def column(self, ticker_symbol, column, rows):
+        dtype = '<i8' if column == 'Date' else '<f8'
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.column_path(ticker_symbol, column), dtype=dtype, mode='r', shape=(rows,))
+
+    def get_prices(self, ticker_symbol, from_date, to_date):
+        from_day, to_day = normalize_day(from_date), normalize_day(to_date)
+        today = normalize_day(pd.Timestamp.today())
+        with self.lock(ticker_symbol):
+            if self.source is not None:
+                self.update(ticker_symbol, from_day, min(to_day, today - pd.Timedelta(days=1)))
+            df = self.read(ticker_symbol, from_day, to_day)
+        if self.source is not None and to_day >= today:
+            live = self.fetch(ticker_symbol, max(from_day, today), to_day)
+            if live is not None:
+                df = pd.concat([df, live.reindex(columns=df.columns)]) if len(df) else live
+        return df
+
+    def update(self, ticker_symbol, from_day, to_day):
+        if from_day > to_day:
+            return
+        meta = self.read_meta(ticker_symbol)
+        if meta is None:
+            df = self.fetch(ticker_symbol, from_day, to_day)
+            self.rewrite(ticker_symbol, df, from_day, to_day)
+            return
+        covered_from, covered_to = pd.Timestamp(meta['covered_from']), pd.Timestamp(meta['covered_to'])
+        # Each fetch also re-reads the stored bar next to it. A split or dividend since the last
+        # update rescales the whole Adj Close history, so if that bar changed the stored columns are
+        # stale and the ticker is fetched again in full rather than extended.
+        if from_day < covered_from:
+            first = self.stored_day(ticker_symbol, meta, 0)
+            head = self.fetch(ticker_symbol, from_day, covered_from - pd.Timedelta(days=1) if first is None else first)
+            if not self.matches(ticker_symbol, meta, head, 0):
+                self.rewrite(ticker_symbol, self.fetch(ticker_symbol, from_day, max(to_day, covered_to)),
+                             from_day, max(to_day, covered_to))
+                return
+            stored = self.read(ticker_symbol, covered_from, covered_to)
+            if head is not None:
+                head = head[head.index < covered_from]
+            df = stored if head is None else pd.concat([head.reindex(columns=stored.columns), stored])
+            self.rewrite(ticker_symbol, df, from_day, covered_to)
+            meta = self.read_meta(ticker_symbol)
+            covered_from = from_day
+        if to_day > covered_to:
+            last = self.stored_day(ticker_symbol, meta, meta['rows'] - 1)
+            tail = self.fetch(ticker_symbol, covered_to + pd.Timedelta(days=1) if last is None else last, to_day)
+            if not self.matches(ticker_symbol, meta, tail, meta['rows'] - 1):
+                self.rewrite(ticker_symbol, self.fetch(ticker_symbol, covered_from, to_day), covered_from, to_day)
+                return
+            self.append(ticker_symbol, meta, tail, to_day)
+
+    def stored_day(self, ticker_symbol, meta, row):
+        if not meta['rows']:
+            return None
+        return normalize_day(pd.Timestamp(int(self.column(ticker_symbol, 'Date', meta['rows'])[row])))
+
+    def matches(self, ticker_symbol, meta, df, row):
+        # Whether the fetched frame agrees with stored row `row` on Adj Close; True when it does not
+        # include that bar (nothing to compare).
+        if df is None or not meta['rows'] or 'Adj Close' not in meta['columns'] or 'Adj Close' not in df:
+            return True
+        stored_date = self.column(ticker_symbol, 'Date', meta['rows'])[row]
+        fetched = df['Adj Close'].to_numpy(dtype='f8')[to_epoch_ns(df.index) == stored_date]
+        if not len(fetched):
+            return True
+        stored = self.column(ticker_symbol, 'Adj Close', meta['rows'])[row]
+        return bool(np.isclose(fetched[0], stored, rtol=1e-9, atol=0, equal_nan=True))
+
+    def fetch(self, ticker_symbol, from_day, to_day):
+        if business_days_between(from_day, to_day) == 0:
+            return None
+        df = self.source.get_prices(ticker_symbol, from_day, to_day)
+        df = df[~df.index.duplicated()].sort_index()
+        return between_days(df, from_day, to_day)
+
+    def rewrite(self, ticker_symbol, df, covered_from, covered_to):
+        os.makedirs(self.ticker_dir(ticker_symbol), exist_ok=True)
+        columns = list(df.columns) if df is not None else list(PRICE_COLUMNS)
+        if df is None:
+            df = pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='Date'))
+        for column in ['Date'] + columns:
+            path = self.column_path(ticker_symbol, column)
+            values = to_epoch_ns(df.index) if column == 'Date' else df[column].to_numpy(dtype='<f8')
+            with open(path + '.tmp', 'wb') as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+            os.replace(path + '.tmp', path)
+        self.write_meta(ticker_symbol, {
+            'columns': columns,
+            'rows': len(df),
+            'covered_from': str(covered_from.date()),
+            'covered_to': str(covered_to.date())
+        })
+
+    def append(self, ticker_symbol, meta, df, covered_to):
+        rows = meta['rows']
+        if df is not None and rows:
+            last = self.column(ticker_symbol, 'Date', rows)[-1]
+            df = df[to_epoch_ns(df.index) > last]
+        if df is not None and len(df):
+            for column in ['Date'] + meta['columns']:
+                path = self.column_path(ticker_symbol, column)
+                values = to_epoch_ns(df.index) if column == 'Date' else df.reindex(columns=meta['columns'])[column].to_numpy(dtype='<f8')
+                with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                    # Drop any bytes left behind by an append that died before its meta update.
+                    f.truncate(rows * 8)
+                    f.seek(0, os.SEEK_END)
+                    f.write(np.ascontiguousarray(values).tobytes())
+            rows += len(df)
+        self.write_meta(ticker_symbol, dict(meta, rows=rows, covered_to=str(covered_to.date())))
+
+    def read(self, ticker_symbol, from_day, to_day):
+        meta = self.read_meta(ticker_symbol)
+        if meta is None:
+            if self.source is None:
+                raise KeyError(f'{ticker_symbol} is not in the price store at {self.directory}')
+            return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+        rows = meta['rows']
+        dates = self.column(ticker_symbol, 'Date', rows)
+        start = np.searchsorted(dates, from_day.value, side='left')
+        end = np.searchsorted(dates, (to_day + pd.Timedelta(days=1)).value, side='left')
+        index = pd.DatetimeIndex(np.array(dates[start:end]).view('datetime64[ns]'), name='Date')
+        return pd.DataFrame(
+            {column: np.array(self.column(ticker_symbol, column, rows)[start:end]) for column in meta['columns']},
+            index=index
+        )
+
+
+_default_source = None
+
+
+def default_source():
+    # TSA_INTRADAY_DATA_DIR serves tick or minute files resampled to TSA_BAR_SIZE bars;
+    # TSA_LOCAL_DATA_DIR serves prices from local files only (tests, air-gapped jobs);
+    # otherwise Yahoo is fronted by the columnar store under TSA_DATA_DIR.
+    global _default_source
+    if _default_source is None:
+        store_dir = os.environ.get('TSA_DATA_DIR', os.path.join(tempfile.gettempdir(), 'tsa-prices'))
+        local_dir = os.environ.get('TSA_LOCAL_DATA_DIR')
+        intraday_dir = os.environ.get('TSA_INTRADAY_DATA_DIR')
+        if intraday_dir:
+            import intraday
+            _default_source = intraday.IntradayDataSource(
+                intraday_dir, os.environ.get('TSA_BAR_SIZE', intraday.DEFAULT_BAR),
+                os.environ.get('TSA_SESSION_LENGTH', intraday.DEFAULT_SESSION))
+        elif local_dir:
+            _default_source = LocalFileDataSource(local_dir)
+        else:
+            _default_source = ColumnarStore(store_dir, YahooDataSource())
+    return _default_source
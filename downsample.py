@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 1500
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, from each bucket in
+    # between, the point forming the largest triangle with the previously kept point and the
+    # average of the next bucket. Returns the indices of the kept points.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='f8')
+    y = np.asarray(y, dtype='f8')
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    # Bucket averages do not depend on the points picked, so they come from one cumulative sum.
+    x_sums = np.concatenate([[0.0], np.cumsum(x)])
+    y_sums = np.concatenate([[0.0], np.cumsum(y)])
+    next_edges = np.append(edges[2:], n)
+    next_counts = next_edges - edges[1:]
+    x_means = (x_sums[next_edges] - x_sums[edges[1:]]) / next_counts
+    y_means = (y_sums[next_edges] - y_sums[edges[1:]]) / next_counts
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        areas = np.abs((x[a] - x_means[bucket]) * (bucket_y - y[a]) - (x[a] - bucket_x) * (y_means[bucket] - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[bucket + 1] = a
+    return selected
+
+
+def downsample_series(index, values, max_points=MAX_POINTS, window=None):
+    # Drops NaNs (rolling warm-up), restricts to the visible [start, end] window if given, keeping
+    # one point past each edge so lines run to the border, and caps the result with LTTB.
+    index = pd.DatetimeIndex(index)
+    values = np.asarray(values, dtype='f8')
+    keep = np.isfinite(values)
+    if window is not None:
+        positions = np.arange(len(index))
+        first = max(index.searchsorted(pd.Timestamp(window[0]), side='left') - 1, 0)
+        last = index.searchsorted(pd.Timestamp(window[1]), side='right') + 1
+        keep &= (positions >= first) & (positions < last)
+    index, values = index[keep], values[keep]
+    selected = lttb(index.values.astype('datetime64[ns]').view('i8'), values, max_points)
+    return index[selected], values[selected]
@@ -0,0 +1,196 @@
+import os
+import numpy as np
+import downsample
+import payload
+import rangequery
+import rolling
+import plotly.graph_objects as go
+
+from style import colors
+from plotly.subplots import make_subplots
+from scipy.stats import norm
+
+payload_encoding = os.environ.get('TSA_PAYLOAD_ENCODING', 'json')
+
+
+def trace_points(ticker_analysis, values, window=None):
+    x, y = downsample.downsample_series(ticker_analysis.index(), values, window=window)
+    return {'x': x, 'y': y}
+
+
+def get_historic_prices_graph(ticker_analysis, ticker_symbol, window=None):
+    figure = {
+        'data': [
+            {
+                **trace_points(ticker_analysis, ticker_analysis.adj_close(), window),
+                'type': 'line',
+                'name': ticker_symbol.upper()
+            }
+        ],
+        'layout': {
+            'title': f'Histórico del {ticker_symbol.upper()} (precio de cierre ajustado)',
+            'plot_bgcolor': colors['background'],
+            'paper_bgcolor': colors['background'],
+            'font': {'color': colors['blueText']}
+        }
+    }
+    if window is not None:
+        figure['layout']['xaxis'] = {'range': window}
+    return figure
+
+
+MAX_HISTOGRAM_BINS = 200
+DENSITY_POINTS = 400
+
+
+def histogram_density(returns):
+    # Freedman-Diaconis bins over the observed range of returns, normalized to a density.
+    returns = np.asarray(returns, dtype='f8')
+    returns = returns[np.isfinite(returns)]
+    edges = np.histogram_bin_edges(returns, bins='fd')
+    if len(edges) > MAX_HISTOGRAM_BINS + 1:
+        edges = np.linspace(edges[0], edges[-1], MAX_HISTOGRAM_BINS + 1)
+    density, edges = np.histogram(returns, bins=edges, density=True)
+    return edges, density
+
+
+def normal_density(ticker_analysis, x):
+    (mu, sigma) = ticker_analysis.mu, ticker_analysis.sigma
+    name = "Distribución normal (\u03BC={0:.2g}, \u03C3={1:.2f})".format(mu, sigma)
+    return name, norm.pdf(x, mu, sigma)
+
+
+# Fitted distributions drawn over the histogram: each takes the analysis and the x grid and
+# returns the trace name and the density on that grid.
+density_overlays = [normal_density]
+
+
+def get_distplot_daily_returns(ticker_analysis):
+    edges, density = histogram_density(ticker_analysis.daily_return())
+    x = np.linspace(edges[0], edges[-1], DENSITY_POINTS)
+    distplot_daily_returns = go.Figure()
+    distplot_daily_returns.add_trace(
+        go.Bar(x=(edges[:-1] + edges[1:]) / 2,
+               y=density,
+               width=np.diff(edges),
+               name="Retornos diarios"
+               )
+    )
+    for overlay in density_overlays:
+        name, pdf = overlay(ticker_analysis, x)
+        distplot_daily_returns.add_trace(
+            go.Scatter(x=x, y=pdf, name=name, mode='lines')
+        )
+
+    distplot_daily_returns.update_xaxes(
+        title_text="Retorno diario", showgrid=False)
+    distplot_daily_returns.update_yaxes(
+        title_text="Frecuencia", showgrid=False)
+    distplot_daily_returns.update_layout(
+        {
+            'title': 'Distribución de los retornos diarios',
+            'plot_bgcolor': colors['background'],
+            'paper_bgcolor': colors['background'],
+            'font': {'color': colors['blueText']},
+            'bargap': 0.02
+        }
+    )
+
+    return distplot_daily_returns
+
+
+# Rolling metrics drawn under the VaR for a single window, rolling.CHART_WINDOW unless another is
+# asked for; only the first metric starts visible. The available windows travel in layout.meta for
+# the window picker.
+ROLLING_CHART_METRICS = rolling.CHART_METRICS
+ROLLING_LABELS = {
+    'mean': 'Retorno medio', 'std': 'Desviación típica', 'sharpe': 'Sharpe', 'skewness': 'Asimetría',
+    'kurtosis': 'Curtosis', 'max_dd': 'Máx. drawdown', 'cagr': 'CAGR', 'range_ratio': 'Ratio RDN/RDP'
+}
+
+
+def get_vol_price_evolution(ticker_analysis, window=None, rolling_window=rolling.CHART_WINDOW):
+    vol_price_evolution = make_subplots(
+        rows=3, cols=1, shared_xaxes=True, row_heights=[0.5, 0.25, 0.25], vertical_spacing=0.05,
+        specs=[[{"secondary_y": True}], [{"secondary_y": False}], [{"secondary_y": False}]])
+
+    vol_price_evolution.add_trace(
+        go.Scatter(
+            **trace_points(ticker_analysis, ticker_analysis.historic_vol_14_days_annualized(), window),
+            name="Volatilidad anualizada",
+            mode='lines'),
+        row=1, col=1, secondary_y=False
+    )
+
+    vol_price_evolution.add_trace(
+        go.Scatter(
+            **trace_points(ticker_analysis, ticker_analysis.historic_vol_sma_126(), window),
+            name="Volatilidad anualizada SMA[126]",
+            mode='lines'),
+        row=1, col=1, secondary_y=False
+    )
+
+    vol_price_evolution.add_trace(
+        go.Scatter(
+            **trace_points(ticker_analysis, ticker_analysis.adj_close(), window),
+            name="Precio de cierre ajustado",
+            mode='lines'),
+        row=1, col=1, secondary_y=True
+    )
+
+    rolling_var = ticker_analysis.rolling_historic_var()
+    shortest_window = min(rolling_var.columns.get_level_values('window'))
+    for (confidence, var_window), values in rolling_var.items():
+        vol_price_evolution.add_trace(
+            go.Scatter(
+                **trace_points(ticker_analysis, values, window),
+                name=f"VaR histórico NC-{confidence:g}% [{var_window}]",
+                mode='lines',
+                visible=True if var_window == shortest_window else 'legendonly'),
+            row=2, col=1
+        )
+
+    rolling_metrics = ticker_analysis.rolling_metrics()
+    for name in ROLLING_CHART_METRICS:
+        vol_price_evolution.add_trace(
+            go.Scatter(
+                **trace_points(ticker_analysis, rolling_metrics[name, rolling_window], window),
+                name=f"{ROLLING_LABELS[name]} [{rolling_window}]",
+                mode='lines',
+                visible=True if name == ROLLING_CHART_METRICS[0] else 'legendonly'),
+            row=3, col=1
+        )
+
+    vol_price_evolution.update_xaxes(showgrid=False)
+    vol_price_evolution.update_xaxes(title_text="Fecha", row=3, col=1)
+    if window is not None:
+        vol_price_evolution.update_xaxes(range=window)
+    vol_price_evolution.update_yaxes(
+        title_text="Volatilidad anualizada", showgrid=False, row=1, col=1, secondary_y=False)
+    vol_price_evolution.update_yaxes(
+        title_text="Precio de cierre", showgrid=False, row=1, col=1, secondary_y=True)
+    vol_price_evolution.update_yaxes(
+        title_text="VaR histórico", showgrid=False, row=2, col=1)
+    vol_price_evolution.update_yaxes(
+        title_text="Métricas móviles", showgrid=False, row=3, col=1)
+    vol_price_evolution.update_layout({
+        'title': 'Evolución histórica del precio, la volatilidad, el VaR y las métricas móviles',
+        'plot_bgcolor': colors['background'],
+        'paper_bgcolor': colors['background'],
+        'font': {'color': colors['blueText']},
+        'height': 950,
+        'meta': {
+            'rolling_window': rolling_window,
+            'rolling_windows': sorted(set(rolling_metrics.columns.get_level_values('window').tolist()))
+        }
+    })
+
+    return vol_price_evolution
+
+
+def encode_figure(figure):
+    return payload.encode_figure(figure, payload_encoding)
+
+
+def load_analysis(ticker_symbol, from_date, to_date):
+    return rangequery.index_for(ticker_symbol, to_date=to_date).analysis(from_date, to_date)
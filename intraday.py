@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from analyzer import TRADING_DAYS
+from datasource import PRICE_COLUMNS, LocalFileDataSource, normalize_day
+
+CHUNK_ROWS = 1000000
+DEFAULT_BAR = '5min'
+DEFAULT_SESSION = '6.5h'
+TIME_COLUMNS = ('Date', 'Datetime', 'Timestamp', 'Time')
+AGGREGATIONS = {'First': 'first', 'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+
+def periods_per_year(bar, session=DEFAULT_SESSION):
+    # Bars per year for annualizing: TRADING_DAYS sessions of `session` each for intraday bars,
+    # TRADING_DAYS over the bar length in days for daily and longer bars.
+    span, day = pd.Timedelta(bar), pd.Timedelta(days=1)
+    if span >= day:
+        return TRADING_DAYS / (span / day)
+    return TRADING_DAYS * (pd.Timedelta(session) / span)
+
+
+def read_chunks(path, chunk_rows):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+def as_ticks(chunk):
+    # Chunk of a tick (Price[, Size]) or bar (Open, High, Low, Close[, Volume]) file as bar rows
+    # indexed by naive timestamps.
+    if isinstance(chunk.index, pd.DatetimeIndex):
+        times = chunk.index
+    else:
+        column = next((name for name in TIME_COLUMNS if name in chunk.columns), None)
+        if column is None:
+            raise ValueError(f'Intraday file needs one of the columns {", ".join(TIME_COLUMNS)}')
+        times = pd.DatetimeIndex(pd.to_datetime(chunk[column]))
+    if times.tz is not None:
+        times = times.tz_localize(None)
+    if 'Price' in chunk.columns:
+        price = chunk['Price'].to_numpy(dtype='f8')
+        columns = {'Open': price, 'High': price, 'Low': price, 'Close': price}
+        volume = chunk['Size'] if 'Size' in chunk.columns else chunk.get('Volume')
+    else:
+        columns = {name: chunk[name].to_numpy(dtype='f8') for name in ('Open', 'High', 'Low', 'Close')}
+        volume = chunk.get('Volume')
+    columns['Volume'] = np.zeros(len(chunk)) if volume is None else volume.to_numpy(dtype='f8')
+    return pd.DataFrame(columns, index=times)
+
+
+def iter_bars(path, bar, from_date, to_date, chunk_rows=CHUNK_ROWS):
+    # Streams the file in chunks of chunk_rows and yields finished `bar` bars, chunk by chunk, for
+    # the days from_date..to_date. Memory holds one chunk plus the bar still being filled, which
+    # crosses into the next chunk as a single aggregated row indexed by its first timestamp. Rows
+    # must be in time order; repeated timestamps keep their first row, as df.index.duplicated()
+    # does, including across chunk boundaries. Only buckets with trades become bars.
+    span = pd.Timedelta(bar)
+    start, end = normalize_day(from_date), normalize_day(to_date) + pd.Timedelta(days=1)
+    pending, last_time = None, None
+    for chunk in read_chunks(path, chunk_rows):
+        ticks = as_ticks(chunk)
+        if ticks.empty:
+            continue
+        times = ticks.index
+        if not times.is_monotonic_increasing or (last_time is not None and times[0] < last_time):
+            raise ValueError(f'{path} is not in time order around {times[0]}')
+        keep = ~times.duplicated()
+        if last_time is not None:
+            keep &= times != last_time
+        last_time = times[-1]
+        ticks = ticks[keep & (times >= start) & (times < end)]
+        if not ticks.empty:
+            ticks.insert(0, 'First', ticks.index)
+            if pending is not None:
+                ticks = pd.concat([pending, ticks])
+            bars = ticks.groupby(ticks.index.floor(span), sort=False).agg(AGGREGATIONS)
+            pending = bars.iloc[-1:].set_index('First', drop=False)
+            if len(bars) > 1:
+                yield bars.iloc[:-1].drop(columns='First')
+        if last_time >= end:
+            break
+    if pending is not None:
+        yield pending.set_axis(pending.index.floor(span)).drop(columns='First')
+
+
+class IntradayDataSource(LocalFileDataSource):
+    # Serves <directory>/<TICKER>.csv or .parquet tick or minute files as `bar` bars in the Yahoo
+    # layout (Adj Close = Close), resampled out of core by iter_bars. periods_per_year tells the
+    # analyzers how to annualize bars of this size.
+
+    def __init__(self, directory, bar=DEFAULT_BAR, session=DEFAULT_SESSION, chunk_rows=CHUNK_ROWS):
+        super().__init__(directory)
+        self.bar = bar
+        self.chunk_rows = chunk_rows
+        self.periods_per_year = periods_per_year(bar, session)
+
+    def get_prices(self, ticker_symbol, from_date, to_date):
+        frames = list(iter_bars(self.path(ticker_symbol), self.bar, from_date, to_date, self.chunk_rows))
+        df = pd.concat(frames) if frames else pd.DataFrame(columns=PRICE_COLUMNS[:-1], dtype='f8')
+        df['Adj Close'] = df['Close']
+        df.index = pd.DatetimeIndex(df.index, name='Date')
+        return df[PRICE_COLUMNS]
@@ -0,0 +1,376 @@
+import importlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import cache
+import singleflight
+import telemetry
+
+from collections import OrderedDict
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+ACTIVE = (QUEUED, RUNNING)
+FINISHED = (DONE, FAILED, CANCELLED)
+DEFAULT_WORKERS = 2
+POLL_SECONDS = 0.5
+# A running job that has not reported for this long belongs to a dead worker and is run again.
+STALE_SECONDS = 10 * 60
+JOB_TTL = 60 * 60
+FIELDS = ('id', 'kind', 'key', 'channel', 'params', 'state', 'progress', 'message', 'revision', 'result', 'error',
+          'created', 'updated')
+
+# Job functions by kind, as 'module:function' so that any worker can run any kind without
+# importing it up front. Each takes the params dict, a report(progress, message=None, **parts)
+# callable and a checkpoint() callable, and returns the JSON-serializable result. report publishes
+# the named partial results that pollers see while the job runs; checkpoint raises Cancelled once
+# a newer submission on the job's channel has cancelled it.
+KINDS = {
+    'analysis': 'ui:analysis_job',
+    'pairs': 'pairs:pairs_job'
+}
+
+
+class Cancelled(singleflight.Superseded):
+    # A Superseded, so single-flight followers of a cancelled job run their own computation.
+    pass
+
+
+def job_function(kind):
+    module, name = KINDS[kind].split(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def make_key(kind, params, channel=None):
+    return json.dumps([kind, params, channel], sort_keys=True)
+
+
+class MemoryJobStore:
+    # Per process: only the gunicorn worker that queued a job can report on it.
+
+    def __init__(self):
+        self.jobs = OrderedDict()
+        self.parts = {}
+        self.lock = threading.Lock()
+
+    def create(self, job):
+        with self.lock:
+            self.jobs[job['id']] = job
+            self.parts[job['id']] = []
+
+    def active(self, key):
+        with self.lock:
+            for job in self.jobs.values():
+                if job['key'] == key and job['state'] in ACTIVE:
+                    return job['id']
+        return None
+
+    def cancel(self, channel, keep, now):
+        with self.lock:
+            for job in self.jobs.values():
+                if job['channel'] == channel and job['state'] in ACTIVE and job['id'] != keep:
+                    job.update(state=CANCELLED, updated=now)
+                    self.parts[job['id']] = []
+
+    def claim(self, now):
+        with self.lock:
+            for job in self.jobs.values():
+                if job['state'] == QUEUED or (job['state'] == RUNNING and job['updated'] < now - STALE_SECONDS):
+                    job.update(state=RUNNING, updated=now)
+                    return dict(job)
+        return None
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def publish(self, job_id, revision, parts, **fields):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None and job['state'] == RUNNING:
+                self.parts[job_id].extend((revision, name, value) for name, value in parts.items())
+                job.update(fields, revision=revision)
+
+    def finish(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None and job['state'] == RUNNING:
+                job.update(fields)
+                self.parts[job_id] = []
+
+    def state(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else job['state']
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def published(self, job_id, after):
+        with self.lock:
+            return [(name, value) for revision, name, value in self.parts.get(job_id, ()) if revision > after]
+
+    def purge(self, before):
+        with self.lock:
+            for job_id in [job['id'] for job in self.jobs.values()
+                           if job['state'] in FINISHED and job['updated'] < before]:
+                del self.jobs[job_id]
+                del self.parts[job_id]
+
+    def counts(self):
+        with self.lock:
+            counts = {QUEUED: 0, RUNNING: 0}
+            for job in self.jobs.values():
+                if job['state'] in counts:
+                    counts[job['state']] += 1
+            return counts
+
+
+class SqliteJobStore:
+    # Shared by every worker process on the instance, like the result cache: any worker can queue,
+    # run or report on any job. Partial results are rows of `parts`, one per published piece, kept
+    # only while the job runs.
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT, key TEXT, channel TEXT, '
+                       'params TEXT, state TEXT, progress REAL, message TEXT, revision INTEGER, result TEXT, '
+                       'error TEXT, created REAL, updated REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created)')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key)')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_channel ON jobs (channel)')
+            db.execute('CREATE TABLE IF NOT EXISTS parts (job_id TEXT, revision INTEGER, name TEXT, value TEXT)')
+            db.execute('CREATE INDEX IF NOT EXISTS parts_job ON parts (job_id, revision)')
+
+    def connection(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+
+    def transaction(self, statements):
+        # BEGIN IMMEDIATE takes the write lock before reading, so two workers never claim one job and
+        # a cancelled job publishes nothing after its cancellation.
+        db = self.connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(db)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return result
+
+    def create(self, job):
+        self.connection().execute(f'INSERT INTO jobs VALUES ({", ".join("?" * len(FIELDS))})',
+                                  [job[field] for field in FIELDS])
+
+    def active(self, key):
+        row = self.connection().execute('SELECT id FROM jobs WHERE key = ? AND state IN (?, ?) LIMIT 1',
+                                        (key,) + ACTIVE).fetchone()
+        return None if row is None else row[0]
+
+    def cancel(self, channel, keep, now):
+        def statements(db):
+            ids = [row[0] for row in db.execute('SELECT id FROM jobs WHERE channel = ? AND state IN (?, ?) AND id != ?',
+                                                (channel,) + ACTIVE + (keep,))]
+            for job_id in ids:
+                db.execute('UPDATE jobs SET state = ?, updated = ? WHERE id = ?', (CANCELLED, now, job_id))
+                db.execute('DELETE FROM parts WHERE job_id = ?', (job_id,))
+
+        self.transaction(statements)
+
+    def claim(self, now):
+        def statements(db):
+            row = db.execute(f'SELECT {", ".join(FIELDS)} FROM jobs WHERE state = ? OR (state = ? AND updated < ?) '
+                             'ORDER BY created LIMIT 1', (QUEUED, RUNNING, now - STALE_SECONDS)).fetchone()
+            if row is not None:
+                db.execute('UPDATE jobs SET state = ?, updated = ? WHERE id = ?', (RUNNING, now, row[0]))
+            return row
+
+        row = self.transaction(statements)
+        return None if row is None else dict(zip(FIELDS, row), state=RUNNING, updated=now)
+
+    def update(self, job_id, **fields):
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        self.connection().execute(f'UPDATE jobs SET {columns} WHERE id = ?', list(fields.values()) + [job_id])
+
+    def publish(self, job_id, revision, parts, **fields):
+        fields['revision'] = revision
+        columns = ', '.join(f'{name} = ?' for name in fields)
+
+        def statements(db):
+            updated = db.execute(f'UPDATE jobs SET {columns} WHERE id = ? AND state = ?',
+                                 list(fields.values()) + [job_id, RUNNING]).rowcount
+            if updated:
+                db.executemany('INSERT INTO parts VALUES (?, ?, ?, ?)',
+                               [(job_id, revision, name, value) for name, value in parts.items()])
+
+        self.transaction(statements)
+
+    def finish(self, job_id, **fields):
+        columns = ', '.join(f'{name} = ?' for name in fields)
+
+        def statements(db):
+            db.execute(f'UPDATE jobs SET {columns} WHERE id = ? AND state = ?',
+                       list(fields.values()) + [job_id, RUNNING])
+            db.execute('DELETE FROM parts WHERE job_id = ?', (job_id,))
+
+        self.transaction(statements)
+
+    def state(self, job_id):
+        row = self.connection().execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def get(self, job_id):
+        row = self.connection().execute(f'SELECT {", ".join(FIELDS)} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return None if row is None else dict(zip(FIELDS, row))
+
+    def published(self, job_id, after):
+        return self.connection().execute('SELECT name, value FROM parts WHERE job_id = ? AND revision > ? '
+                                         'ORDER BY revision', (job_id, after)).fetchall()
+
+    def purge(self, before):
+        def statements(db):
+            db.execute('DELETE FROM parts WHERE job_id IN '
+                       '(SELECT id FROM jobs WHERE state IN (?, ?, ?) AND updated < ?)', FINISHED + (before,))
+            db.execute('DELETE FROM jobs WHERE state IN (?, ?, ?) AND updated < ?', FINISHED + (before,))
+
+        self.transaction(statements)
+
+    def counts(self):
+        counts = {QUEUED: 0, RUNNING: 0}
+        counts.update(self.connection().execute(
+            'SELECT state, COUNT(*) FROM jobs WHERE state IN (?, ?) GROUP BY state', ACTIVE).fetchall())
+        return counts
+
+
+class JobQueue:
+    # Runs registered job kinds on a pool of daemon threads, started on the first submission.
+    # Params, published parts and results are stored as JSON, so the SQLite store lets any worker
+    # process poll a job that another one runs. Identical submissions on a channel share the job in
+    # flight; a different one cancels the channel's earlier jobs.
+
+    def __init__(self, store, workers=DEFAULT_WORKERS, encoder=None):
+        self.store = store
+        self.workers = workers
+        self.encoder = encoder
+        self.threads = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def encode(self, value):
+        return json.dumps(value, cls=self.encoder)
+
+    def submit(self, kind, params, channel=None):
+        if kind not in KINDS:
+            raise ValueError(f'Unknown job kind {kind}')
+        now = time.time()
+        self.store.purge(now - JOB_TTL)
+        key = make_key(kind, params, channel)
+        job_id = self.store.active(key)
+        if job_id is None:
+            job_id = uuid.uuid4().hex
+            self.store.create({
+                'id': job_id, 'kind': kind, 'key': key, 'channel': channel, 'params': self.encode(params),
+                'state': QUEUED, 'progress': 0.0, 'message': None, 'revision': 0, 'result': None, 'error': None,
+                'created': now, 'updated': now
+            })
+        if channel is not None:
+            self.store.cancel(channel, job_id, now)
+        self.start()
+        self.wakeup.set()
+        return job_id
+
+    def status(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        for field in ('params', 'result'):
+            job[field] = None if job[field] is None else json.loads(job[field])
+        return job
+
+    def published(self, job_id, after=0):
+        # Parts published after revision `after`, the latest value per name; empty once finished.
+        return {name: json.loads(value) for name, value in self.store.published(job_id, after)}
+
+    def counts(self):
+        return self.store.counts()
+
+    def start(self):
+        with self.lock:
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.work, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def work(self):
+        while True:
+            job = self.store.claim(time.time())
+            if job is None:
+                self.wakeup.wait(POLL_SECONDS)
+                self.wakeup.clear()
+                continue
+            self.run(job)
+
+    def run(self, job):
+        revision = job['revision'] or 0
+
+        def report(progress, message=None, **parts):
+            nonlocal revision
+            fields = {'progress': progress, 'message': message, 'updated': time.time()}
+            if parts:
+                # Only the new parts are written; pollers read what they have not seen yet.
+                revision += 1
+                self.store.publish(job['id'], revision, {name: self.encode(value) for name, value in parts.items()},
+                                   **fields)
+            else:
+                self.store.update(job['id'], **fields)
+
+        def checkpoint():
+            if self.store.state(job['id']) == CANCELLED:
+                raise Cancelled(job['id'])
+
+        try:
+            with telemetry.span('job_' + job['kind']):
+                result = job_function(job['kind'])(json.loads(job['params']), report, checkpoint)
+            self.store.finish(job['id'], state=DONE, progress=1.0, message=None, revision=revision + 1,
+                              result=self.encode(result), updated=time.time())
+        except Cancelled:
+            pass
+        except Exception as error:
+            self.store.finish(job['id'], state=FAILED, error=f'{type(error).__name__}: {error}',
+                              updated=time.time())
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def default_queue():
+    # TSA_JOB_BACKEND=sqlite (default) shares jobs between workers through a file next to the
+    # result cache; memory keeps them in this process.
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            workers = int(os.environ.get('TSA_JOB_WORKERS', DEFAULT_WORKERS))
+            if os.environ.get('TSA_JOB_BACKEND', 'sqlite') == 'memory':
+                store = MemoryJobStore()
+            else:
+                cache_dir = os.environ.get('TSA_CACHE_DIR', tempfile.gettempdir())
+                store = SqliteJobStore(os.path.join(cache_dir, 'tsa-jobs.sqlite3'))
+            _default_queue = JobQueue(store, workers, encoder=cache.result_encoder())
+        return _default_queue
@@ -1,14 +1,37 @@
+import os
 import dash
 import ui
+import cache
+import jobs
+import singleflight
+import telemetry
 import dash_bootstrap_components as dbc
 
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+
 
 external_stylesheets = [dbc.themes.SLATE]
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+app = dash.Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
 server = app.server
 app.title = 'TS Analyzer - elQuant.com'
-app.layout = ui.page_layout()
+# A function, so every page load (one browser tab) gets its own tab-id.
+app.layout = ui.page_layout
+superseder = singleflight.Superseder(quiet_period=float(os.environ.get('TSA_DEBOUNCE_SECONDS', 0.3)))
+# Analyses missing from the result cache run as background jobs unless TSA_JOB_BACKEND=sync.
+run_in_background = os.environ.get('TSA_JOB_BACKEND', 'sqlite') != 'sync'
+profile_threshold = os.environ.get('TSA_PROFILE_THRESHOLD_SECONDS')
+telemetry.instrument(
+    server,
+    profile_threshold=float(profile_threshold) if profile_threshold else None,
+    profile_dir=os.environ.get('TSA_PROFILE_DIR', 'profiles')
+)
+telemetry.register_cache(cache.default_cache)
+telemetry.register_range_indexes()
+if run_in_background:
+    telemetry.register_jobs(jobs.default_queue)
+if os.environ.get('TSA_WARM_UP', '1') == '1':
+    ui.warm_up()
 
 
 @app.callback(
@@ -17,12 +40,88 @@ app.layout = ui.page_layout()
         Input(component_id='ticker-input', component_property='value'),
         Input(component_id='from-date-picker', component_property='date'),
         Input(component_id='to-date-picker', component_property='date')
-    ]
+    ],
+    [State(component_id='tab-id', component_property='data')]
 )
-def update_analysis_results(ticker_symbol, from_date, to_date):
+def update_analysis_results(ticker_symbol, from_date, to_date, tab):
+    # Requests supersede each other, and cancel each other's jobs, per browser tab.
     if len(ticker_symbol) < 3:
         return
-    return ui.build_results_page(ticker_symbol, from_date, to_date)
+    if run_in_background:
+        results = ui.cached_results(ticker_symbol, from_date, to_date)
+        if results is not None:
+            return ui.results_page(results['summary'], results['figures'])
+        if tab is not None:
+            try:
+                superseder.begin(tab).checkpoint()
+            except singleflight.Superseded:
+                raise PreventUpdate
+        return ui.job_page(ui.submit_analysis(ticker_symbol, from_date, to_date, channel=tab))
+    if tab is None:
+        return ui.build_results_page(ticker_symbol, from_date, to_date)
+    token = superseder.begin(tab)
+    try:
+        return ui.build_results_page(ticker_symbol, from_date, to_date, checkpoint=token.checkpoint)
+    except singleflight.Superseded:
+        raise PreventUpdate
+
+
+@app.callback(
+    [Output(component_id='job-alert', component_property='children')] +
+    [Output(component_id='slot-' + name, component_property='children') for name in ui.RESULT_SLOTS] +
+    [
+        Output(component_id='job-progress', component_property='value'),
+        Output(component_id='job-message', component_property='children'),
+        Output(component_id='job-poll', component_property='disabled'),
+        Output(component_id='analysis-job', component_property='data')
+    ],
+    [Input(component_id='job-poll', component_property='n_intervals')],
+    [State(component_id='analysis-job', component_property='data')]
+)
+def poll_analysis_job(n_intervals, job):
+    if not job:
+        raise PreventUpdate
+    return ui.poll_job(job)
+
+
+analysis_inputs = [
+    State(component_id='ticker-input', component_property='value'),
+    State(component_id='from-date-picker', component_property='date'),
+    State(component_id='to-date-picker', component_property='date')
+]
+
+
+@app.callback(
+    Output(component_id='historical_prices', component_property='figure'),
+    [Input(component_id='historical_prices', component_property='relayoutData')],
+    analysis_inputs
+)
+def zoom_historical_prices(relayout_data, ticker_symbol, from_date, to_date):
+    changed, window = ui.zoom_window(relayout_data)
+    if not changed:
+        raise PreventUpdate
+    import figures
+    ticker_analysis = figures.load_analysis(ticker_symbol, from_date, to_date)
+    return figures.encode_figure(figures.get_historic_prices_graph(ticker_analysis, ticker_symbol, window))
+
+
+@app.callback(
+    Output(component_id='vol_price_evolution', component_property='figure'),
+    [
+        Input(component_id='vol_price_evolution', component_property='relayoutData'),
+        Input(component_id='rolling-window', component_property='value')
+    ],
+    analysis_inputs
+)
+def zoom_vol_price_evolution(relayout_data, rolling_window, ticker_symbol, from_date, to_date):
+    # A new rolling window keeps the current zoom, which relayoutData still holds.
+    changed, window = ui.zoom_window(relayout_data)
+    picked = any(trigger['prop_id'] == 'rolling-window.value' for trigger in dash.callback_context.triggered)
+    if not changed and not picked:
+        raise PreventUpdate
+    import figures
+    ticker_analysis = figures.load_analysis(ticker_symbol, from_date, to_date)
+    return figures.encode_figure(figures.get_vol_price_evolution(ticker_analysis, window, rolling_window))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class WaveletMatrix:
+    # k-th smallest value of any contiguous range in O(log n), over non-negative integer values.
+    # Queries take Python ints or equally shaped integer arrays; arrays answer many ranges at once
+    # with one vectorized step per bit level. Ranks are stored as int32, so series are capped at
+    # 2**31 values.
+
+    def __init__(self, values):
+        self.bits = max(int(values.max()).bit_length(), 1) if len(values) else 1
+        self.zero_ranks = []
+        self.zero_counts = []
+        current = values
+        for level in range(self.bits - 1, -1, -1):
+            is_zero = ((current >> level) & 1) == 0
+            zero_rank = np.concatenate([np.zeros(1, np.int32), np.cumsum(is_zero, dtype=np.int32)])
+            self.zero_ranks.append(zero_rank)
+            self.zero_counts.append(int(zero_rank[-1]))
+            current = np.concatenate([current[is_zero], current[~is_zero]])
+
+    def kth_smallest(self, lo, hi, k):
+        # Half-open [lo, hi), k counted from 0.
+        value = 0
+        for depth, level in enumerate(range(self.bits - 1, -1, -1)):
+            zero_rank = self.zero_ranks[depth]
+            zeros_lo, zeros_hi = int(zero_rank[lo]), int(zero_rank[hi])
+            if k < zeros_hi - zeros_lo:
+                lo, hi = zeros_lo, zeros_hi
+            else:
+                k -= zeros_hi - zeros_lo
+                value |= 1 << level
+                lo = self.zero_counts[depth] + lo - zeros_lo
+                hi = self.zero_counts[depth] + hi - zeros_hi
+        return value
+
+    def kth_smallest_many(self, lo, hi, k):
+        lo, hi, k = (np.array(a, dtype=np.int64) for a in np.broadcast_arrays(lo, hi, k))
+        value = np.zeros_like(lo)
+        for depth, level in enumerate(range(self.bits - 1, -1, -1)):
+            zero_rank = self.zero_ranks[depth]
+            zeros_lo, zeros_hi = zero_rank[lo], zero_rank[hi]
+            zeros = zeros_hi - zeros_lo
+            go_left = k < zeros
+            k = np.where(go_left, k, k - zeros)
+            value |= np.where(go_left, 0, 1 << level)
+            lo = np.where(go_left, zeros_lo, self.zero_counts[depth] + lo - zeros_lo)
+            hi = np.where(go_left, zeros_hi, self.zero_counts[depth] + hi - zeros_hi)
+        return value
+
+
+class OrderStatistics:
+    # Percentiles (numpy's default linear interpolation) of arbitrary ranges or of every sliding
+    # window of a series, from one wavelet matrix over the ranks of its values. NaNs rank last and
+    # must be kept out of the queried ranges.
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype='f8')
+        order = np.argsort(values, kind='stable')
+        ranks = np.empty(len(order), dtype=np.int32)
+        ranks[order] = np.arange(len(order))
+        self.size = len(values)
+        self.sorted_values = values[order]
+        self.ranks = WaveletMatrix(ranks)
+
+    def kth_smallest(self, lo, hi, k):
+        return self.sorted_values[self.ranks.kth_smallest(lo, hi, k)]
+
+    def percentile(self, lo, hi, q):
+        position = (hi - lo - 1) * q / 100
+        below = int(np.floor(position))
+        above = min(below + 1, hi - lo - 1)
+        low = self.sorted_values[self.ranks.kth_smallest(lo, hi, below)]
+        high = self.sorted_values[self.ranks.kth_smallest(lo, hi, above)]
+        return low + (high - low) * (position - below)
+
+    def rolling_percentiles(self, window, percentiles, start=0):
+        # Row i of the result holds the percentiles of values[i - window + 1:i + 1]; rows whose
+        # window reaches before `start` are NaN. All windows and levels are answered together.
+        result = np.full((self.size, len(percentiles)), np.nan)
+        ends = np.arange(start + window, self.size + 1)
+        if not len(ends):
+            return result
+        for column, q in enumerate(percentiles):
+            position = (window - 1) * q / 100
+            below = int(np.floor(position))
+            above = min(below + 1, window - 1)
+            low = self.sorted_values[self.ranks.kth_smallest_many(ends - window, ends, below)]
+            high = self.sorted_values[self.ranks.kth_smallest_many(ends - window, ends, above)]
+            result[ends - 1, column] = low + (high - low) * (position - below)
+        return result
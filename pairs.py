@@ -0,0 +1,169 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import cointegration
+import datasource
+
+from concurrent.futures import ProcessPoolExecutor
+
+MIN_CORRELATION = 0.7
+MIN_OBSERVATIONS = 252
+# Share of the longest history a ticker needs to stay in the screen.
+MIN_COVERAGE = 0.9
+PAIR_CHUNK = 256
+JOHANSEN_LAGS = 1
+COLUMNS = ['first', 'second', 'correlation', 'hedge_ratio', 'intercept', 'cadf_statistic', 'cadf_p_value',
+           'cadf_lags', 'half_life', 'johansen_trace', 'johansen_trace_95', 'johansen_max_eigen',
+           'johansen_max_eigen_95', 'johansen_hedge_ratio']
+
+# Log prices (tickers x dates) of the screen being run, memory-mapped by each worker process so
+# the matrix is shared through the page cache instead of being pickled with every task.
+_shared_prices = None
+
+
+def attach_prices(path):
+    global _shared_prices
+    _shared_prices = np.load(path, mmap_mode='r') if path else None
+
+
+def test_pairs(first, second, lags=JOHANSEN_LAGS):
+    # CADF in both directions, keeping the one with the more negative statistic, and the Johansen
+    # test of each pair. `first` and `second` are ticker positions; runs in a worker.
+    a, b = _shared_prices[first].T, _shared_prices[second].T
+    forward, backward = cointegration.cadf(a, b), cointegration.cadf(b, a)
+    swap = backward['statistic'] < forward['statistic']
+    cadf = {key: np.where(swap, backward[key], forward[key]) for key in
+            ('statistic', 'p_value', 'lags', 'hedge_ratio', 'intercept', 'half_life')}
+    johansen = cointegration.johansen(np.stack([a, b], axis=2), lags)
+    vector = johansen['vector'][:, 1]
+    level = cointegration.JOHANSEN_LEVELS.index('95%')
+    return {
+        'first': np.where(swap, second, first),
+        'second': np.where(swap, first, second),
+        'hedge_ratio': cadf['hedge_ratio'],
+        'intercept': cadf['intercept'],
+        'cadf_statistic': cadf['statistic'],
+        'cadf_p_value': cadf['p_value'],
+        'cadf_lags': cadf['lags'],
+        'half_life': cadf['half_life'],
+        'johansen_trace': johansen['trace'][:, 0],
+        'johansen_trace_95': np.full(len(first), johansen['trace_critical_values'][0, level]),
+        'johansen_max_eigen': johansen['max_eigen'][:, 0],
+        'johansen_max_eigen_95': np.full(len(first), johansen['eigen_critical_values'][0, level]),
+        # The Johansen vector is normalized on the original first ticker: a + v b is stationary.
+        'johansen_hedge_ratio': np.where(swap, -1 / vector, -vector)
+    }
+
+
+class PairsScreener:
+    # Screens a universe for cointegrated pairs. Prices are aligned once into a (dates x tickers)
+    # matrix of log prices over the dates every ticker trades; candidate pairs are pruned by the
+    # correlation of their returns, optionally only within correlation clusters, and the survivors
+    # run through batched CADF and Johansen tests over a process pool. A ticker with fewer than
+    # min_coverage of the longest history's bars (a recent listing, a delisting) would cut every
+    # pair down to its own window, so it is left out instead and named in `dropped` and to `log`.
+
+    def __init__(self, adj_close, min_observations=MIN_OBSERVATIONS, min_coverage=MIN_COVERAGE, log=None):
+        counts = adj_close.notna().sum()
+        longest = int(counts.max()) if len(counts) else 0
+        keep = (counts >= min_observations) & (counts >= min_coverage * longest)
+        self.dropped = list(counts.index[~keep])
+        if log:
+            for ticker_symbol in self.dropped:
+                log(f'{ticker_symbol}: {counts[ticker_symbol]} of {longest} bars, left out of the screen')
+        aligned = adj_close.loc[:, keep].dropna(axis=0)
+        self.tickers = list(aligned.columns)
+        self.dates = aligned.index
+        self.log_prices = np.log(aligned.to_numpy(dtype='f8'))
+
+    @classmethod
+    def from_source(cls, ticker_symbols, from_date, to_date, data_source=None, min_observations=MIN_OBSERVATIONS,
+                    min_coverage=MIN_COVERAGE, log=None):
+        data_source = data_source or datasource.default_source()
+        columns = {}
+        for ticker_symbol in ticker_symbols:
+            df = data_source.get_prices(ticker_symbol, from_date, to_date)
+            columns[ticker_symbol] = df[~df.index.duplicated()]['Adj Close']
+        return cls(pd.DataFrame(columns), min_observations, min_coverage, log)
+
+    def correlations(self):
+        return np.corrcoef(np.diff(self.log_prices, axis=0), rowvar=False)
+
+    def candidates(self, min_correlation=MIN_CORRELATION, clusters=None, max_pairs=None):
+        # Ticker positions (first, second) and return correlation of the pairs worth testing, most
+        # correlated first. With `clusters`, pairs must also fall in the same group of an
+        # average-linkage clustering on 1 - correlation cut into that many groups.
+        correlation = self.correlations()
+        first, second = np.triu_indices(len(self.tickers), k=1)
+        keep = correlation[first, second] >= min_correlation
+        if clusters:
+            from scipy.cluster.hierarchy import fcluster, linkage
+            from scipy.spatial.distance import squareform
+            distance = np.clip(1 - correlation, 0, None)
+            np.fill_diagonal(distance, 0)
+            labels = fcluster(linkage(squareform(distance, checks=False), 'average'), clusters, 'maxclust')
+            keep &= labels[first] == labels[second]
+        first, second = first[keep], second[keep]
+        order = np.argsort(-correlation[first, second], kind='stable')[:max_pairs]
+        return first[order], second[order], correlation[first[order], second[order]]
+
+    def screen(self, min_correlation=MIN_CORRELATION, clusters=None, max_pairs=None, workers=None,
+               max_p_value=None, progress=None):
+        # Ranked table of tested pairs, most significant CADF first. `first` = intercept +
+        # hedge_ratio * `second` + spread; half-lives are in bars. `progress` is called with the
+        # fraction of candidate pairs tested after every chunk.
+        first, second, correlation = self.candidates(min_correlation, clusters, max_pairs)
+        chunks = [slice(start, start + PAIR_CHUNK) for start in range(0, len(first), PAIR_CHUNK)]
+        workers = min(workers or os.cpu_count() or 1, max(len(chunks), 1))
+        with tempfile.TemporaryDirectory(prefix='tsa-pairs-') as directory:
+            path = os.path.join(directory, 'log_prices.npy')
+            np.save(path, np.ascontiguousarray(self.log_prices.T))
+            results = []
+            if workers == 1:
+                attach_prices(path)
+                try:
+                    for chunk in chunks:
+                        results.append(test_pairs(first[chunk], second[chunk]))
+                        if progress:
+                            progress(len(results) / len(chunks))
+                finally:
+                    attach_prices(None)
+            else:
+                with ProcessPoolExecutor(workers, initializer=attach_prices, initargs=(path,)) as pool:
+                    for result in pool.map(test_pairs, [first[chunk] for chunk in chunks],
+                                           [second[chunk] for chunk in chunks]):
+                        results.append(result)
+                        if progress:
+                            progress(len(results) / len(chunks))
+
+        if not results:
+            return pd.DataFrame(columns=COLUMNS).rename_axis('rank')
+        table = pd.DataFrame({key: np.concatenate([result[key] for result in results]) for key in results[0]})
+        tickers = np.array(self.tickers, dtype=object)
+        table['first'], table['second'] = tickers[table['first']], tickers[table['second']]
+        table['correlation'] = correlation
+        table = table[COLUMNS]
+        if max_p_value is not None:
+            table = table[table['cadf_p_value'] <= max_p_value]
+        table = table.sort_values(['cadf_p_value', 'cadf_statistic'], kind='stable').reset_index(drop=True)
+        table.index = pd.RangeIndex(1, len(table) + 1, name='rank')
+        return table
+
+
+def pairs_job(params, report, checkpoint):
+    # Background job (jobs.KINDS['pairs']): params are the from_source arguments plus any of the
+    # screen() keywords; the ranked table comes back as records.
+    report(0.0, 'Alineando precios')
+    screener = PairsScreener.from_source(params['tickers'], params['from_date'], params['to_date'],
+                                         log=lambda message: report(0.0, message))
+    options = {name: params[name] for name in ('min_correlation', 'clusters', 'max_pairs', 'workers', 'max_p_value')
+               if params.get(name) is not None}
+
+    def progress(done):
+        checkpoint()
+        report(0.1 + 0.9 * done, 'Contrastando pares')
+
+    table = screener.screen(progress=progress, **options)
+    return table.reset_index().to_dict('records')
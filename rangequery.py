@@ -0,0 +1,380 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import datasource
+import orderstats
+import rolling
+import telemetry
+
+from collections import OrderedDict
+from scipy.stats import norm
+from analyzer import TRADING_DAYS, VOL_SMA_WINDOW, VOL_WINDOW, rolling_historic_var_frame
+
+HISTORY_START = '1970-01-01'
+# Total memory_footprint() of the cached indexes; the most recently built one always stays.
+MAX_INDEX_BYTES = int(os.environ.get('TSA_INDEX_MAX_BYTES', 128 * 1024 * 1024))
+# Ranges that reach today rebuild an index whose live bar is older than this.
+LIVE_REFRESH_SECONDS = 5 * 60
+
+
+def held_bytes(value, seen=None):
+    # Bytes reachable from value: array buffers, pandas data and indexes, containers and plain
+    # objects walked through, each object counted once per `seen`.
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        data = value.memory_usage(index=False, deep=True)
+        return int(np.sum(data)) + held_bytes(value.index, seen) + held_bytes(getattr(value, 'columns', None), seen)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(held_bytes(item, seen) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(held_bytes(item, seen) for item in value)
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + sum(held_bytes(item, seen) for item in vars(value).values())
+    return sys.getsizeof(value)
+
+
+class SparseTable:
+    # O(1) range arg-min/arg-max. Ties keep the earliest position, like the analyzer's date lookups.
+    # Positions are int32, which halves the n log n levels against numpy's default int64.
+
+    def __init__(self, values, better):
+        self.values = values
+        self.better = better
+        n = len(values)
+        self.levels = [np.arange(n, dtype=np.int32)]
+        width = 2
+        while width <= n:
+            previous = self.levels[-1]
+            left = previous[:n - width + 1]
+            right = previous[width // 2:width // 2 + len(left)]
+            self.levels.append(np.where(better(values[right], values[left]), right, left))
+            width *= 2
+
+    def query(self, lo, hi):
+        level = (hi - lo + 1).bit_length() - 1
+        left = self.levels[level][lo]
+        right = self.levels[level][hi - (1 << level) + 1]
+        return right if self.better(self.values[right], self.values[left]) else left
+
+
+class DrawdownTree:
+    # Segment tree whose nodes hold (max price, min price, max drawdown ratio). Merging a left and
+    # right node adds the drawdown from the left peak to the right trough, so any contiguous range
+    # is answered in O(log n).
+
+    def __init__(self, prices):
+        n = len(prices)
+        self.size = size = 1 << max(n - 1, 0).bit_length()
+        self.high = np.full(2 * size, -np.inf)
+        self.low = np.full(2 * size, np.inf)
+        self.drawdown = np.zeros(2 * size)
+        self.high[size:size + n] = prices
+        self.low[size:size + n] = prices
+        width = size // 2
+        with np.errstate(invalid='ignore'):
+            while width >= 1:
+                nodes = np.arange(width, 2 * width)
+                left, right = 2 * nodes, 2 * nodes + 1
+                self.high[nodes] = np.maximum(self.high[left], self.high[right])
+                self.low[nodes] = np.minimum(self.low[left], self.low[right])
+                cross = self.low[right] / self.high[left] - 1
+                self.drawdown[nodes] = np.fmin(np.fmin(self.drawdown[left], self.drawdown[right]), cross)
+                width //= 2
+
+    def node(self, i):
+        return float(self.high[i]), float(self.low[i]), float(self.drawdown[i])
+
+    @staticmethod
+    def merge(left, right):
+        if left is None:
+            return right
+        if right is None:
+            return left
+        return (max(left[0], right[0]), min(left[1], right[1]),
+                min(left[2], right[2], right[1] / left[0] - 1))
+
+    def query(self, lo, hi):
+        left_part = right_part = None
+        lo, hi = lo + self.size, hi + self.size + 1
+        while lo < hi:
+            if lo & 1:
+                left_part = self.merge(left_part, self.node(lo))
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                right_part = self.merge(self.node(hi), right_part)
+            lo >>= 1
+            hi >>= 1
+        return self.merge(left_part, right_part)[2]
+
+
+class RangeQueryIndex:
+    # Built once over a ticker's full history; answers the TimeSeriesAnalyzer statistics for any
+    # [from, to] sub-range from prefix sums and range structures, without rescanning the series.
+    # Row 0 of the history has no return, so a range whose first bar is row a analyzes the returns
+    # of rows a+1..b, exactly like a fresh analyzer on that slice.
+
+    def __init__(self, df, periods_per_year=TRADING_DAYS):
+        df = df[~df.index.duplicated()]
+        self.periods_per_year = periods_per_year
+        self.dates = df.index
+        self.prices = df['Adj Close'].to_numpy(dtype='f8')
+        returns = df['Adj Close'].pct_change()
+        self.returns = returns.to_numpy(dtype='f8')
+
+        self.mean = np.nanmean(self.returns[1:]) if len(self.returns) > 1 else 0.0
+        centered = np.nan_to_num(self.returns - self.mean)
+        centered[0] = 0.0
+        self.power_sums = [np.concatenate([[0.0], np.cumsum(centered ** power)]) for power in (1, 2, 3, 4)]
+
+        self.drawdowns = DrawdownTree(self.prices)
+
+        self.order_statistics = orderstats.OrderStatistics(self.returns)
+
+        vol = returns.rolling(VOL_WINDOW).std() * 100 * (periods_per_year ** 0.5)
+        self.vol_14_annualized = vol.to_numpy(dtype='f8')
+        self.vol_sma_126 = vol.rolling(VOL_SMA_WINDOW).mean().to_numpy(dtype='f8')
+        self.rolling_var_frame = None
+        self.rolling_metrics_frame = None
+        self.min_vol = SparseTable(self.vol_14_annualized, np.less)
+        self.max_vol = SparseTable(self.vol_14_annualized, np.greater)
+
+        # The bar ranges themselves are not kept: the charted rolling metrics do not use them.
+        day_range = (100 * (df['High'] - df['Low']) / df['Low']).to_numpy(dtype='f8')
+        counted = (day_range != 0) & np.isfinite(day_range)
+        negative = counted & (self.returns < 0)
+        positive = counted & (self.returns > 0)
+        self.negative_range = self.prefix(np.where(negative, day_range, 0)), self.prefix(negative, np.int32)
+        self.positive_range = self.prefix(np.where(positive, day_range, 0)), self.prefix(positive, np.int32)
+
+    @staticmethod
+    def prefix(values, dtype='f8'):
+        return np.concatenate([np.zeros(1, dtype), np.cumsum(values, dtype=dtype)])
+
+    def locate(self, from_date, to_date):
+        first = int(self.dates.searchsorted(datasource.normalize_day(from_date), side='left'))
+        last = int(self.dates.searchsorted(datasource.normalize_day(to_date) + pd.Timedelta(days=1), side='left')) - 1
+        if last - first < 1:
+            raise ValueError(f'Not enough bars between {from_date} and {to_date}')
+        return first, last
+
+    def range_sum(self, prefix, first, last):
+        return prefix[last + 1] - prefix[first + 1]
+
+    def historic_percentile(self, first, last, q):
+        return self.order_statistics.percentile(first + 1, last + 1, q) * 100
+
+    def rolling_historic_var(self):
+        # Computed over the whole history once; a window never crosses the start of a range
+        # slice that is long enough to fill it, so slices of this frame stay exact.
+        if self.rolling_var_frame is None:
+            self.rolling_var_frame = rolling_historic_var_frame(self.order_statistics, self.dates, start=1)
+        return self.rolling_var_frame
+
+    def rolling_metrics(self):
+        # Same reasoning as rolling_historic_var: whole history once, exact on long enough slices.
+        # Only the charted metrics, as the frame stays pinned with the cached index.
+        if self.rolling_metrics_frame is None:
+            self.rolling_metrics_frame = rolling.rolling_metrics_frame(
+                self.prices, self.returns, None, self.dates, periods_per_year=self.periods_per_year,
+                start=1, metrics=rolling.CHART_METRICS)
+        return self.rolling_metrics_frame
+
+    def vol_extreme(self, table, first, last):
+        if last < first + VOL_WINDOW:
+            return np.nan, None
+        row = table.query(first + VOL_WINDOW, last)
+        return self.vol_14_annualized[row], self.dates[row].strftime('%Y-%m-%d')
+
+    def summary(self, from_date, to_date):
+        first, last = self.locate(from_date, to_date)
+        n = last - first
+        s1, s2, s3, s4 = (self.range_sum(prefix, first, last) for prefix in self.power_sums)
+        d = s1 / n
+        m2 = s2 - n * d ** 2
+        m3 = s3 - 3 * d * s2 + 2 * n * d ** 3
+        m4 = s4 - 4 * d * s3 + 6 * d ** 2 * s2 - 3 * n * d ** 4
+        mean = self.mean + d
+        std = (m2 / (n - 1)) ** 0.5 if n > 1 else np.nan
+        sigma = (m2 / n) ** 0.5
+        if n > 3 and m2 > 0:
+            skewness = (n * (n - 1)) ** 0.5 / (n - 2) * (m3 / n) / (m2 / n) ** 1.5
+            kurtosis = ((n * (n + 1) * (n - 1) * m4) / ((n - 2) * (n - 3) * m2 ** 2)
+                        - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+        else:
+            skewness = kurtosis = np.nan
+
+        start_price, end_price = self.prices[first + 1], self.prices[last]
+        min_vol, min_vol_date = self.vol_extreme(self.min_vol, first, last)
+        max_vol, max_vol_date = self.vol_extreme(self.max_vol, first, last)
+        negative_sum, negative_count = (self.range_sum(prefix, first, last) for prefix in self.negative_range)
+        positive_sum, positive_count = (self.range_sum(prefix, first, last) for prefix in self.positive_range)
+        dn = negative_sum / negative_count if negative_count else np.nan
+        dp = positive_sum / positive_count if positive_count else np.nan
+        return {
+            'cagr': ((end_price / start_price) ** (self.periods_per_year / n) - 1) * 100,
+            'buy_and_hold_return': ((end_price - start_price) / start_price) * 100,
+            'max_dd': self.drawdowns.query(first + 1, last) * 100,
+            'mean_daily_return': mean * 100,
+            'std_daily_return': std * 100,
+            'min_return': self.order_statistics.kth_smallest(first + 1, last + 1, 0) * 100,
+            'max_return': self.order_statistics.kth_smallest(first + 1, last + 1, n - 1) * 100,
+            'trading_days': int(n),
+            'skewness': skewness,
+            'kurtosis': kurtosis,
+            'mu': mean,
+            'sigma': sigma,
+            'var_gauss_95': norm.ppf(0.05, mean, sigma) * 100,
+            'var_gauss_99': norm.ppf(0.01, mean, sigma) * 100,
+            'var_gauss_99_7': norm.ppf(0.003, mean, sigma) * 100,
+            'var_historic_95': self.historic_percentile(first, last, 5),
+            'var_historic_99': self.historic_percentile(first, last, 1),
+            'var_historic_99_7': self.historic_percentile(first, last, .3),
+            'vam': std * 100 * (self.periods_per_year ** 0.5),
+            'min_vol': min_vol,
+            'min_vol_date': min_vol_date,
+            'max_vol': max_vol,
+            'max_vol_date': max_vol_date,
+            'dn': dn,
+            'dp': dp,
+            'pos_neg_days_ratio': dn / dp
+        }
+
+    def memory_footprint(self):
+        # Bytes held per attribute and in total, lazily built rolling frames included once built.
+        seen = set()
+        footprint = {name: held_bytes(value, seen) for name, value in vars(self).items()}
+        footprint['total'] = sys.getsizeof(self) + sum(footprint.values())
+        return footprint
+
+    def analysis(self, from_date, to_date):
+        return RangeAnalysis(self, from_date, to_date)
+
+
+class RangeAnalysis:
+    # Exposes the accessors ui.py reads from a TimeSeriesAnalyzer, backed by slices of the index.
+
+    def __init__(self, index, from_date, to_date):
+        self.first, self.last = index.locate(from_date, to_date)
+        self.range_index = index
+        self.stats = index.summary(from_date, to_date)
+        self.mu = self.stats['mu']
+        self.sigma = self.stats['sigma']
+
+    def memory_footprint(self):
+        # The index is shared by every analysis of the ticker; range_index reports its total.
+        footprint = {name: held_bytes(value) for name, value in vars(self).items() if name != 'range_index'}
+        footprint['range_index'] = self.range_index.memory_footprint()['total']
+        footprint['total'] = sys.getsizeof(self) + sum(footprint.values())
+        return footprint
+
+    def summary(self):
+        return self.stats
+
+    def series(self, values, warmup=0):
+        values = values[self.first + 1:self.last + 1].copy()
+        values[:warmup] = np.nan
+        return pd.Series(values, index=self.index())
+
+    def index(self):
+        return self.range_index.dates[self.first + 1:self.last + 1]
+
+    def count(self):
+        return self.last - self.first
+
+    def adj_close(self):
+        return self.series(self.range_index.prices)
+
+    def daily_return(self):
+        return self.series(self.range_index.returns)
+
+    def historic_vol_14_days_annualized(self):
+        return self.series(self.range_index.vol_14_annualized, VOL_WINDOW - 1)
+
+    def historic_vol_sma_126(self):
+        return self.series(self.range_index.vol_sma_126, VOL_WINDOW + VOL_SMA_WINDOW - 2)
+
+    def window_frame(self, frame):
+        # Slice of a whole-history rolling frame, blanking each column until its window fits in range.
+        values = frame.to_numpy()[self.first + 1:self.last + 1].copy()
+        for column, window in enumerate(frame.columns.get_level_values('window')):
+            values[:window - 1, column] = np.nan
+        return pd.DataFrame(values, index=self.index(), columns=frame.columns)
+
+    def rolling_historic_var(self):
+        return self.window_frame(self.range_index.rolling_historic_var())
+
+    def rolling_metrics(self):
+        return self.window_frame(self.range_index.rolling_metrics())
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+_build_locks = {}
+
+
+def cached_bytes():
+    with _indexes_lock:
+        indexes = [entry[2] for entry in _indexes.values()]
+    return sum(index.memory_footprint()['total'] for index in indexes)
+
+
+def evict_indexes():
+    # Oldest first until the cached indexes fit MAX_INDEX_BYTES. Sizes are measured here rather
+    # than at insertion, as the rolling frames are built lazily after it. Call with _indexes_lock held.
+    sizes = {key: entry[2].memory_footprint()['total'] for key, entry in _indexes.items()}
+    total = sum(sizes.values())
+    while total > MAX_INDEX_BYTES and len(_indexes) > 1:
+        evicted, _ = _indexes.popitem(last=False)
+        _build_locks.pop(evicted, None)
+        total -= sizes[evicted]
+
+
+def index_for(ticker_symbol, data_source=None, to_date=None):
+    # Indexes cover the ticker's whole history of one data source and are rebuilt once a day, when
+    # the store has a new bar, and every LIVE_REFRESH_SECONDS for ranges that reach today's bar,
+    # which changes until the close. Recently used indexes stay in memory up to MAX_INDEX_BYTES, and
+    # concurrent requests for a missing one wait for a single build.
+    data_source = data_source or datasource.default_source()
+    key = (datasource.source_key(data_source), ticker_symbol.upper())
+    today = datasource.normalize_day(pd.Timestamp.today())
+    live = to_date is not None and datasource.normalize_day(to_date) >= today
+
+    def cached():
+        entry = _indexes.get(key)
+        if entry is None or entry[0] != today or (live and entry[1] < time.time() - LIVE_REFRESH_SECONDS):
+            return None
+        _indexes.move_to_end(key)
+        return entry[2]
+
+    with _indexes_lock:
+        index = cached()
+        if index is not None:
+            return index
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    with build_lock:
+        with _indexes_lock:
+            index = cached()
+        if index is not None:
+            return index
+        built = time.time()
+        with telemetry.span('fetch'):
+            df = data_source.get_prices(ticker_symbol, HISTORY_START, today)
+        with telemetry.span('index_build'):
+            index = RangeQueryIndex(df, getattr(data_source, 'periods_per_year', TRADING_DAYS))
+        with _indexes_lock:
+            _indexes[key] = (today, built, index)
+            _indexes.move_to_end(key)
+            evict_indexes()
+    return index
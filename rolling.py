@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+ROLLING_WINDOWS = (21, 63, 126, 252)
+METRICS = ('mean', 'std', 'sharpe', 'skewness', 'kurtosis', 'max_dd', 'cagr', 'range_ratio')
+# What the web figures draw: these metrics, one window at a time (CHART_WINDOW until the user picks
+# another), so cached indexes and compact analyzers keep only these columns. They do not keep the
+# bar ranges, so range_ratio cannot be charted.
+CHART_METRICS = ('sharpe', 'max_dd')
+CHART_WINDOW = 63
+
+
+def prefix(values):
+    return np.concatenate([[0.0], np.cumsum(values)])
+
+
+def window_sums(prefix_sums, window):
+    # Row i holds the sum of rows i-window+1..i; NaN until the first full window.
+    sums = np.full(len(prefix_sums) - 1, np.nan)
+    sums[window - 1:] = prefix_sums[window:] - prefix_sums[:-window]
+    return sums
+
+
+def merge_blocks(left, right):
+    # (max, min, max drawdown ratio) of two adjacent blocks, as DrawdownTree merges its nodes.
+    high, low, drawdown = left
+    right_high, right_low, right_drawdown = right
+    return (np.maximum(high, right_high), np.minimum(low, right_low),
+            np.minimum(np.minimum(drawdown, right_drawdown), right_low / high - 1))
+
+
+def rolling_max_drawdowns(prices, windows):
+    # Worst fall (%) from a running peak inside each window. Level k holds every block of 2**k
+    # prices, built by doubling like SparseTable; a window of w prices chains the blocks of the
+    # binary digits of w, so each window costs O(n log w) vectorized work instead of O(n w).
+    n = len(prices)
+    levels = [(prices, prices, np.zeros(n))]
+    while 1 << len(levels) <= min(max(windows), n):
+        width = 1 << (len(levels) - 1)
+        previous = levels[-1]
+        count = n - 2 * width + 1
+        levels.append(merge_blocks([part[:count] for part in previous],
+                                   [part[width:width + count] for part in previous]))
+    drawdowns = {}
+    for window in windows:
+        out = np.full(n, np.nan)
+        count, offset, block = n - window + 1, 0, None
+        for level in reversed(range(window.bit_length())):
+            if count <= 0 or not window >> level & 1:
+                continue
+            part = [values[offset:offset + count] for values in levels[level]]
+            block = part if block is None else merge_blocks(block, part)
+            offset += 1 << level
+        if block is not None:
+            out[window - 1:] = block[2] * 100
+        drawdowns[window] = out
+    return drawdowns
+
+
+def rolling_metrics(prices, returns, day_range=None, windows=ROLLING_WINDOWS, *, periods_per_year):
+    # Every metric for every window from one set of prefix sums: the power sums of the returns
+    # (centered once on their overall mean) and the range sums of down and up bars. Row i of each
+    # window covers the analysis rows i-window+1..i and matches a fresh analyzer on that slice:
+    # mean and std in %, annualized Sharpe (no risk-free rate), sample skewness and excess
+    # kurtosis, max drawdown and CAGR in %, and the down/up mean range ratio. periods_per_year comes
+    # from the caller's analyzer (analyzer.TRADING_DAYS for daily bars).
+    center = np.mean(returns) if len(returns) else 0.0
+    centered = returns - center
+    squared = centered * centered
+    power_sums = [prefix(centered), prefix(squared), prefix(squared * centered), prefix(squared * squared)]
+    if day_range is None:
+        day_range = np.full(len(returns), np.nan)
+    counted = (day_range != 0) & np.isfinite(day_range)
+    negative, positive = counted & (returns < 0), counted & (returns > 0)
+    range_sums = [prefix(np.where(mask, day_range, 0)) for mask in (negative, positive)]
+    range_counts = [prefix(mask) for mask in (negative, positive)]
+
+    drawdowns = rolling_max_drawdowns(prices, windows)
+    results = {}
+    for window in windows:
+        s1, s2, s3, s4 = (window_sums(sums, window) for sums in power_sums)
+        n = float(window)
+        mu = s1 / n
+        mu2 = mu * mu
+        m2 = np.maximum(s2 - n * mu2, 0)
+        m3 = s3 - 3 * mu * s2 + 2 * n * mu2 * mu
+        m4 = s4 - 4 * mu * s3 + 6 * mu2 * s2 - 3 * n * mu2 * mu2
+        mean = (mu + center) * 100
+        std = np.sqrt(m2 / (n - 1)) * 100
+        starts = np.maximum(np.arange(len(prices)) - window + 1, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            results['mean', window] = mean
+            results['std', window] = std
+            results['sharpe', window] = mean / std * periods_per_year ** 0.5
+            # Undefined below 3 and 4 bars, as in pandas.
+            if window < 3:
+                results['skewness', window] = np.full(len(prices), np.nan)
+            else:
+                results['skewness', window] = (n * (n - 1)) ** 0.5 / (n - 2) * (m3 / n) / (m2 / n) ** 1.5
+            if window < 4:
+                results['kurtosis', window] = np.full(len(prices), np.nan)
+            else:
+                results['kurtosis', window] = ((n * (n + 1) * (n - 1) * m4) / ((n - 2) * (n - 3) * m2 ** 2)
+                                               - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+            cagr = ((prices / prices[starts]) ** (periods_per_year / n) - 1) * 100
+            cagr[:window - 1] = np.nan
+            results['cagr', window] = cagr
+            down = window_sums(range_sums[0], window) / window_sums(range_counts[0], window)
+            up = window_sums(range_sums[1], window) / window_sums(range_counts[1], window)
+            results['range_ratio', window] = down / up
+        results['max_dd', window] = drawdowns[window]
+    return results
+
+
+def rolling_metrics_frame(prices, returns, day_range, index, windows=ROLLING_WINDOWS, *, periods_per_year, start=0,
+                          metrics=METRICS):
+    # Rows before `start` have no return (the first bar of a history) and come out NaN. Only the
+    # `metrics` columns are kept.
+    prices, returns = np.asarray(prices, dtype='f8'), np.asarray(returns, dtype='f8')
+    day_range = None if day_range is None else np.asarray(day_range, dtype='f8')[start:]
+    results = rolling_metrics(prices[start:], returns[start:], day_range, windows, periods_per_year=periods_per_year)
+    columns = [(name, window) for name in metrics for window in windows]
+    # Column-major, so every column is written contiguously and pandas takes the block as is.
+    values = np.full((len(prices), len(columns)), np.nan, order='F')
+    for column, key in enumerate(columns):
+        values[start:, column] = results[key]
+    return pd.DataFrame(values, index=index, columns=pd.MultiIndex.from_tuples(columns, names=['metric', 'window']))
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from locking import FileLock
+
+
+class Superseded(Exception):
+    pass
+
+
+def key_digest(key):
+    return hashlib.sha1(str(key).encode('utf-8')).hexdigest()
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution: threads of this process wait on the
+    # leader, and leaders in other worker processes serialize on a per-key file lock.
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir or os.path.join(tempfile.gettempdir(), 'tsa-locks')
+        self.calls = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn):
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self.calls[key] = _Call()
+            if leader:
+                break
+            call.done.wait()
+            if call.error is None:
+                return call.result
+            # A superseded leader says nothing about this caller's request, so run it again.
+            if not isinstance(call.error, Superseded):
+                raise call.error
+        try:
+            with FileLock(os.path.join(self.lock_dir, key_digest(key) + '.lock')):
+                call.result = fn()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+class Superseder:
+    # Tracks the latest request per channel (one browser tab) in a small file so that every
+    # worker sees it. Work started for an older request stops at its next checkpoint. Files of
+    # channels idle for state_ttl seconds are removed, at most once every sweep_interval seconds
+    # per process; state_ttl has to outlast the longest request.
+
+    def __init__(self, state_dir=None, quiet_period=0.0, state_ttl=24 * 3600, sweep_interval=600):
+        self.state_dir = state_dir or os.path.join(tempfile.gettempdir(), 'tsa-requests')
+        self.quiet_period = quiet_period
+        self.state_ttl = state_ttl
+        self.sweep_interval = sweep_interval
+        self.last_sweep = 0.0
+        self.sweep_lock = threading.Lock()
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        with self.sweep_lock:
+            if now - self.last_sweep < self.sweep_interval:
+                return
+            self.last_sweep = now
+        try:
+            names = os.listdir(self.state_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.state_dir, name)
+            # Other workers sweep the same directory, so the file may already be gone.
+            try:
+                if os.stat(path).st_mtime < now - self.state_ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def path(self, channel):
+        return os.path.join(self.state_dir, key_digest(channel))
+
+    def begin(self, channel):
+        self.sweep()
+        request_id = uuid.uuid4().hex
+        path = self.path(channel)
+        tmp_path = f'{path}.{request_id}'
+        with open(tmp_path, 'w') as f:
+            f.write(request_id)
+        os.replace(tmp_path, path)
+        return RequestToken(self, channel, request_id)
+
+    def latest(self, channel):
+        try:
+            with open(self.path(channel)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class RequestToken:
+
+    def __init__(self, superseder, channel, request_id):
+        self.superseder = superseder
+        self.channel = channel
+        self.request_id = request_id
+        self.settled = False
+
+    def is_stale(self):
+        return self.superseder.latest(self.channel) != self.request_id
+
+    def checkpoint(self):
+        # The first checkpoint waits out the debounce window, so only work that actually has to be
+        # computed pays for it and a burst of keystrokes collapses into its last request.
+        if not self.settled:
+            self.settled = True
+            if self.superseder.quiet_period:
+                time.sleep(self.superseder.quiet_period)
+        if self.is_stale():
+            raise Superseded(self.request_id)
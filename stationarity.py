@@ -0,0 +1,206 @@
+import numpy as np
+
+from scipy.stats import norm
+
+# Every kernel takes one series (1-D) or a universe of aligned, gap-free series as the columns of
+# a (dates x series) array, like BatchAnalyzer's matrices, and answers all columns in one call.
+
+HURST_LAGS = np.arange(2, 100)
+VARIANCE_RATIO_HORIZONS = (2, 4, 8, 16)
+ADF_CHUNK = 256
+
+# MacKinnon (2010) response surfaces, regression with constant: the critical value for T
+# observations is b0 + b1 / T + b2 / T**2 + b3 / T**3. Keyed by the number of I(1) variables
+# (1 for ADF, 2 for the cointegrating regression of a pair).
+CRITICAL_VALUE_SURFACES = {
+    1: {'1%': (-3.43035, -6.5393, -16.786, -79.433),
+        '5%': (-2.86154, -2.8903, -4.234, -40.040),
+        '10%': (-2.56677, -1.5384, -2.809, 0.0)},
+    2: {'1%': (-3.89644, -10.9519, -33.527, 0.0),
+        '5%': (-3.33613, -6.1101, -6.823, 0.0),
+        '10%': (-3.04445, -4.2412, -2.720, 0.0)}
+}
+# MacKinnon (1994) approximate p-values, regression with constant: norm.cdf of a polynomial in
+# the statistic, with separate coefficients below and above tau_star and clipping outside
+# [tau_min, tau_max].
+P_VALUE_SURFACES = {
+    1: {'tau_max': 2.74, 'tau_min': -18.83, 'tau_star': -1.61,
+        'small_p': (2.1659, 1.4412, 0.038269), 'large_p': (1.7339, 0.93202, -0.12745, -0.010368)},
+    2: {'tau_max': 0.92, 'tau_min': -18.86, 'tau_star': -2.62,
+        'small_p': (2.92, 1.5012, 0.039796), 'large_p': (2.1945, 0.64695, -0.29198, -0.042377)}
+}
+
+
+def as_columns(values):
+    values = np.asarray(values, dtype='f8')
+    return (values[:, None], True) if values.ndim == 1 else (values, False)
+
+
+def squeeze_columns(values, squeeze):
+    return values[..., 0][()] if squeeze else values
+
+
+def lagged_products(a, b, max_lag):
+    # Row j holds sum_t a[t] * b[t + j] for j = 0..max_lag and every column, from one FFT per
+    # column instead of one pass per lag.
+    n = a.shape[0]
+    size = 1 << (2 * n - 1).bit_length()
+    spectrum = np.conj(np.fft.rfft(a, size, axis=0)) * np.fft.rfft(b, size, axis=0)
+    return np.fft.irfft(spectrum, size, axis=0)[:max_lag + 1]
+
+
+def lagged_differences(x, lags):
+    # Count, sum and sum of squares of x[t + k] - x[t] for every lag k: the linear terms come from
+    # prefix sums, the cross term sum_t x[t] * x[t + k] from lagged_products.
+    n = x.shape[0]
+    x = x - x.mean(axis=0)
+    zeros = np.zeros((1, x.shape[1]))
+    sums = np.concatenate([zeros, np.cumsum(x, axis=0)])
+    squares = np.concatenate([zeros, np.cumsum(x * x, axis=0)])
+    cross = lagged_products(x, x, lags.max())[lags]
+    count = n - lags
+    difference_sums = (sums[n] - sums[lags]) - sums[count]
+    difference_squares = (squares[n] - squares[lags]) + squares[count] - 2 * cross
+    return count[:, None], difference_sums, difference_squares
+
+
+def hurst_exponent(values, lags=HURST_LAGS):
+    # Var(x[t + k] - x[t]) grows like k ** 2H: H is half the slope of log variance on log lag.
+    # values are log prices.
+    x, squeeze = as_columns(values)
+    lags = np.asarray(lags)
+    if lags.max() >= len(x):
+        raise ValueError(f'Hurst exponent needs more than {lags.max()} observations, got {len(x)}')
+    count, sums, squares = lagged_differences(x, lags)
+    variances = squares / count - (sums / count) ** 2
+    log_lags = np.log(lags) - np.log(lags).mean()
+    slopes = log_lags @ np.log(variances) / (log_lags @ log_lags)
+    return squeeze_columns(slopes / 2, squeeze)
+
+
+def variance_ratios(values, horizons=VARIANCE_RATIO_HORIZONS):
+    # Lo-MacKinlay (1988) overlapping variance ratios of log prices for every horizon q, with the
+    # bias-corrected variances, the homoskedastic z statistic and the heteroskedasticity-robust z*.
+    x, squeeze = as_columns(values)
+    horizons = np.asarray(horizons)
+    n = len(x) - 1
+    if horizons.max() >= n:
+        raise ValueError(f'Variance ratio horizon {horizons.max()} needs more than {n} returns')
+    mean = (x[-1] - x[0]) / n
+    deviations = np.diff(x, axis=0) - mean
+    squared_deviations = deviations ** 2
+    total = squared_deviations.sum(axis=0)
+    one_period_variance = total / (n - 1)
+
+    count, sums, squares = lagged_differences(x, horizons)
+    q = horizons[:, None]
+    centered_squares = squares - 2 * q * mean * sums + count * (q * mean) ** 2
+    m = q * (n - q + 1) * (1 - q / n)
+    ratio = centered_squares / m / one_period_variance
+
+    z = (ratio - 1) / np.sqrt(2 * (2 * q - 1) * (q - 1) / (3 * q * n))
+    delta = lagged_products(squared_deviations, squared_deviations, horizons.max() - 1) / total ** 2
+    theta = np.zeros_like(ratio)
+    for row, horizon in enumerate(horizons):
+        j = np.arange(1, horizon)
+        weights = (2 * (horizon - j) / horizon) ** 2
+        theta[row] = weights @ delta[j]
+    z_robust = (ratio - 1) / np.sqrt(theta)
+    return {
+        'horizons': horizons,
+        'ratio': squeeze_columns(ratio, squeeze),
+        'z': squeeze_columns(z, squeeze),
+        'z_robust': squeeze_columns(z_robust, squeeze),
+        'p_value': squeeze_columns(2 * norm.sf(np.abs(z_robust)), squeeze)
+    }
+
+
+def critical_values(nobs, variables=1):
+    return {level: b0 + b1 / nobs + b2 / nobs ** 2 + b3 / nobs ** 3
+            for level, (b0, b1, b2, b3) in CRITICAL_VALUE_SURFACES[variables].items()}
+
+
+def p_values(statistics, variables=1):
+    surface = P_VALUE_SURFACES[variables]
+    statistics = np.asarray(statistics, dtype='f8')
+    small = np.polynomial.polynomial.polyval(statistics, surface['small_p'])
+    large = np.polynomial.polynomial.polyval(statistics, surface['large_p'])
+    p = norm.cdf(np.where(statistics <= surface['tau_star'], small, large))
+    p = np.where(statistics > surface['tau_max'], 1.0, p)
+    return np.where(statistics < surface['tau_min'], 0.0, p)
+
+
+def default_max_lag(nobs):
+    return int(np.ceil(12 * (nobs / 100) ** 0.25))
+
+
+def adf_design(y, max_lag, constant=True):
+    # Rows t = max_lag..T-2 of the regression dy[t] ~ [1 +] y[t] + dy[t-1] + ... + dy[t-max_lag],
+    # one (rows x regressors) matrix per column. Every lag order p uses its first 2 + p columns
+    # (1 + p without the constant).
+    dy = np.diff(y, axis=0)
+    rows = len(dy) - max_lag
+    columns = [np.ones_like(y[max_lag:-1])] if constant else []
+    columns += [y[max_lag:-1]]
+    columns += [dy[max_lag - lag:len(dy) - lag] for lag in range(1, max_lag + 1)]
+    return np.stack(columns, axis=-1).transpose(1, 0, 2), dy[max_lag:].T, rows
+
+
+def project(y, max_lag, constant=True):
+    # One QR of the widest design answers every lag order: the first k columns of Q span the first
+    # k regressors, so model k leaves |target|^2 - sum_{j<k} (Q'target)_j^2 unexplained. Column p
+    # of the residuals belongs to lag order p.
+    design, target, rows = adf_design(y, max_lag, constant)
+    q, r = np.linalg.qr(design)
+    projections = np.einsum('snk,sn->sk', q, target)
+    explained = np.cumsum(projections ** 2, axis=1)[:, 1 if constant else 0:]
+    residuals = (target ** 2).sum(axis=1)[:, None] - explained
+    return r, projections, residuals, rows
+
+
+def select_lags(y, max_lag, constant=True):
+    # AIC over lag orders 0..max_lag, every order fitted on the same rows.
+    _, _, residuals, rows = project(y, max_lag, constant)
+    sizes = np.arange(max_lag + 1) + (2 if constant else 1)
+    aic = rows * np.log(residuals / rows) + 2 * sizes
+    return np.argmin(aic, axis=1)
+
+
+def adf_statistics(y, lag, constant=True):
+    # t statistic of the y[t] coefficient with `lag` lagged differences, on all available rows.
+    r, projections, residuals, rows = project(y, lag, constant)
+    k, level = (lag + 2, 1) if constant else (lag + 1, 0)
+    inverse = np.linalg.inv(r)
+    coefficients = np.einsum('sij,sj->si', inverse, projections)
+    variance = residuals[:, lag] / (rows - k)
+    return coefficients[:, level] / np.sqrt(variance * (inverse[:, level, :] ** 2).sum(axis=1)), rows
+
+
+def adf(values, max_lag=None, autolag=True, constant=True):
+    # Augmented Dickey-Fuller test, as statsmodels' adfuller: with autolag the lag order minimizing
+    # the AIC is picked on common rows and then refitted on all rows it allows. Series are processed
+    # ADF_CHUNK at a time to bound the size of the stacked designs. The p-value and critical values
+    # assume the regression with constant; residual-based tests (CADF) set constant=False and use
+    # their own tables.
+    y, squeeze = as_columns(values)
+    max_lag = default_max_lag(len(y)) if max_lag is None else max_lag
+    max_lag = min(max_lag, len(y) // 2 - 2)
+    if max_lag < 0:
+        raise ValueError(f'ADF needs at least 4 observations, got {len(y)}')
+    lags = np.full(y.shape[1], max_lag)
+    if autolag:
+        for start in range(0, y.shape[1], ADF_CHUNK):
+            lags[start:start + ADF_CHUNK] = select_lags(y[:, start:start + ADF_CHUNK], max_lag, constant)
+    statistics, nobs = np.empty(y.shape[1]), np.empty(y.shape[1], dtype=np.int64)
+    for lag in np.unique(lags):
+        columns = np.flatnonzero(lags == lag)
+        for start in range(0, len(columns), ADF_CHUNK):
+            chunk = columns[start:start + ADF_CHUNK]
+            statistics[chunk], nobs[chunk] = adf_statistics(y[:, chunk], lag, constant)
+    return {
+        'statistic': squeeze_columns(statistics, squeeze),
+        'p_value': squeeze_columns(p_values(statistics), squeeze),
+        'lags': squeeze_columns(lags, squeeze),
+        'nobs': squeeze_columns(nobs, squeeze),
+        'critical_values': {level: squeeze_columns(value, squeeze) for level, value in critical_values(nobs).items()}
+    }
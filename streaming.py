@@ -0,0 +1,184 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from collections import deque
+from scipy.stats import norm
+from analyzer import TRADING_DAYS, VOL_SMA_WINDOW, VOL_WINDOW
+
+
+class StreamingAnalyzer:
+    # Incremental counterpart of TimeSeriesAnalyzer: every appended bar updates running state in
+    # constant time (Welford/Pébay moments, running peak, sliding-window vol and its SMA, range
+    # sums). Historic VaR needs order statistics, so returns are kept in an amortized-append
+    # buffer and only partitioned when a summary is taken.
+
+    def __init__(self, periods_per_year=TRADING_DAYS):
+        self.periods_per_year = periods_per_year
+        self.last_date = None
+        self.last_price = None
+        self.first_price = None
+        self.peak = -math.inf
+        self.max_dd = math.inf
+
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+        self.min_return = math.inf
+        self.max_return = -math.inf
+        self.returns = np.empty(1024)
+
+        self.window = deque()
+        self.window_mean = 0.0
+        self.window_m2 = 0.0
+        self.vols = deque()
+        self.vols_sum = 0.0
+        self.vol_14_annualized = math.nan
+        self.vol_sma_126 = math.nan
+        self.min_vol = (math.inf, None)
+        self.max_vol = (-math.inf, None)
+
+        self.negative_range_sum = 0.0
+        self.negative_range_count = 0
+        self.positive_range_sum = 0.0
+        self.positive_range_count = 0
+
+    @classmethod
+    def from_frame(cls, df, periods_per_year=TRADING_DAYS):
+        streaming = cls(periods_per_year)
+        streaming.extend(df)
+        return streaming
+
+    def extend(self, df):
+        high = df['High'] if 'High' in df else [None] * len(df)
+        low = df['Low'] if 'Low' in df else [None] * len(df)
+        for date, price, bar_high, bar_low in zip(df.index, df['Adj Close'], high, low):
+            self.update(date, price, bar_high, bar_low)
+
+    def update(self, date, adj_close, high=None, low=None):
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date <= self.last_date:
+            if date == self.last_date:
+                return
+            raise ValueError(f'Bar for {date} arrived after {self.last_date}')
+        if not math.isfinite(adj_close):
+            # A missing price drops the bar, as BatchAnalyzer does for a gap in a column; the next
+            # return is taken against the last known price.
+            return
+        previous_price = self.last_price
+        self.last_date, self.last_price = date, adj_close
+        if previous_price is None or previous_price == 0:
+            # Nothing to return against, or an infinite return the moments would never recover from.
+            return
+        daily_return = adj_close / previous_price - 1
+
+        if self.first_price is None:
+            self.first_price = adj_close
+        self.peak = max(self.peak, adj_close)
+        self.max_dd = min(self.max_dd, ((adj_close - self.peak) / self.peak) * 100)
+
+        self.add_moments(daily_return)
+        self.add_to_window(date, daily_return)
+
+        if high is not None and low is not None:
+            day_range = 100 * (high - low) / low
+            if day_range != 0 and not math.isnan(day_range):
+                if daily_return < 0:
+                    self.negative_range_sum += day_range
+                    self.negative_range_count += 1
+                elif daily_return > 0:
+                    self.positive_range_sum += day_range
+                    self.positive_range_count += 1
+
+    def add_moments(self, x):
+        n1 = self.n
+        self.n = n = n1 + 1
+        delta = x - self.mean
+        delta_n = delta / n
+        delta_n2 = delta_n * delta_n
+        term1 = delta * delta_n * n1
+        self.mean += delta_n
+        self.m4 += term1 * delta_n2 * (n * n - 3 * n + 3) + 6 * delta_n2 * self.m2 - 4 * delta_n * self.m3
+        self.m3 += term1 * delta_n * (n - 2) - 3 * delta_n * self.m2
+        self.m2 += term1
+        self.min_return = min(self.min_return, x)
+        self.max_return = max(self.max_return, x)
+        if n > len(self.returns):
+            self.returns = np.concatenate([self.returns, np.empty(len(self.returns))])
+        self.returns[n - 1] = x
+
+    def add_to_window(self, date, x):
+        window = self.window
+        window.append(x)
+        if len(window) > VOL_WINDOW:
+            old = window.popleft()
+            old_mean = self.window_mean
+            self.window_mean += (x - old) / VOL_WINDOW
+            self.window_m2 += (x - old) * (x - self.window_mean + old - old_mean)
+        else:
+            delta = x - self.window_mean
+            self.window_mean += delta / len(window)
+            self.window_m2 += delta * (x - self.window_mean)
+        if len(window) < VOL_WINDOW:
+            return
+
+        vol = math.sqrt(max(self.window_m2, 0.0) / (VOL_WINDOW - 1)) * 100 * (self.periods_per_year ** 0.5)
+        self.vol_14_annualized = vol
+        if vol < self.min_vol[0]:
+            self.min_vol = (vol, date)
+        if vol > self.max_vol[0]:
+            self.max_vol = (vol, date)
+
+        self.vols.append(vol)
+        self.vols_sum += vol
+        if len(self.vols) > VOL_SMA_WINDOW:
+            self.vols_sum -= self.vols.popleft()
+        if len(self.vols) == VOL_SMA_WINDOW:
+            self.vol_sma_126 = self.vols_sum / VOL_SMA_WINDOW
+
+    def summary(self):
+        n = self.n
+        std = math.sqrt(self.m2 / (n - 1)) if n > 1 else math.nan
+        sigma = math.sqrt(self.m2 / n) if n else math.nan
+        if n > 3 and self.m2 > 0:
+            skewness = (n * (n - 1)) ** 0.5 / (n - 2) * (self.m3 / n) / (self.m2 / n) ** 1.5
+            kurtosis = ((n * (n + 1) * (n - 1) * self.m4) / ((n - 2) * (n - 3) * self.m2 ** 2)
+                        - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+        else:
+            skewness = kurtosis = math.nan
+        historic = np.percentile(self.returns[:n], [5, 1, .3]) * 100 if n else [math.nan] * 3
+        dn = self.negative_range_sum / self.negative_range_count if self.negative_range_count else math.nan
+        dp = self.positive_range_sum / self.positive_range_count if self.positive_range_count else math.nan
+        min_vol, min_vol_date = self.min_vol
+        max_vol, max_vol_date = self.max_vol
+        return {
+            'cagr': ((self.last_price / self.first_price) ** (self.periods_per_year / n) - 1) * 100 if n else math.nan,
+            'buy_and_hold_return': ((self.last_price - self.first_price) / self.first_price) * 100 if n else math.nan,
+            'max_dd': self.max_dd if n else math.nan,
+            'mean_daily_return': self.mean * 100,
+            'std_daily_return': std * 100,
+            'min_return': self.min_return * 100,
+            'max_return': self.max_return * 100,
+            'trading_days': n,
+            'skewness': skewness,
+            'kurtosis': kurtosis,
+            'mu': self.mean,
+            'sigma': sigma,
+            'var_gauss_95': norm.ppf(0.05, self.mean, sigma) * 100,
+            'var_gauss_99': norm.ppf(0.01, self.mean, sigma) * 100,
+            'var_gauss_99_7': norm.ppf(0.003, self.mean, sigma) * 100,
+            'var_historic_95': historic[0],
+            'var_historic_99': historic[1],
+            'var_historic_99_7': historic[2],
+            'vam': std * 100 * (self.periods_per_year ** 0.5),
+            'min_vol': min_vol if min_vol_date is not None else math.nan,
+            'min_vol_date': min_vol_date.strftime('%Y-%m-%d') if min_vol_date is not None else None,
+            'max_vol': max_vol if max_vol_date is not None else math.nan,
+            'max_vol_date': max_vol_date.strftime('%Y-%m-%d') if max_vol_date is not None else None,
+            'dn': dn,
+            'dp': dp,
+            'pos_neg_days_ratio': dn / dp
+        }
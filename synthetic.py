@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+
+def generate_ohlcv(bars, seed=0, end='2020-12-31', freq='B', annual_drift=0.07, annual_vol=0.2,
+                   periods_per_year=252, duplicate_rate=0.001):
+    # Seeded geometric Brownian motion in the Yahoo column layout. Open gaps away from the previous
+    # close, High/Low extend past the open-close body by half-normal excursions, and a fraction of
+    # bars is repeated right after the original the way Yahoo sometimes duplicates a session.
+    rng = np.random.default_rng(seed)
+    step_vol = annual_vol / periods_per_year ** 0.5
+    step_drift = (annual_drift - annual_vol ** 2 / 2) / periods_per_year
+    close = 100 * np.exp(np.cumsum(rng.normal(step_drift, step_vol, bars)))
+    previous_close = np.concatenate([[100.0], close[:-1]])
+    open_ = previous_close * np.exp(rng.normal(0, step_vol * 0.2, bars))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, step_vol * 0.5, bars)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, step_vol * 0.5, bars)))
+    volume = np.round(rng.lognormal(13, 0.5, bars))
+
+    df = pd.DataFrame(
+        {'High': high, 'Low': low, 'Open': open_, 'Close': close, 'Volume': volume, 'Adj Close': close},
+        index=pd.date_range(end=end, periods=bars, freq=freq, name='Date')
+    )
+    duplicates = int(bars * duplicate_rate)
+    if duplicates:
+        repeated = np.sort(rng.choice(bars, size=duplicates, replace=False))
+        positions = np.sort(np.concatenate([np.arange(bars), repeated]), kind='stable')
+        df = df.iloc[positions]
+    return df
+
+
+class SyntheticDataSource:
+    # Serves generated frames through the data source interface; tickers map to seeds.
+
+    def __init__(self, bars, freq='B', **options):
+        self.bars = bars
+        self.freq = freq
+        self.options = options
+        self.frames = {}
+
+    def frame(self, ticker_symbol):
+        key = ticker_symbol.upper()
+        if key not in self.frames:
+            seed = sum(ord(c) for c in key)
+            self.frames[key] = generate_ohlcv(self.bars, seed=seed, freq=self.freq, **self.options)
+        return self.frames[key]
+
+    def get_prices(self, ticker_symbol, from_date, to_date):
+        df = self.frame(ticker_symbol)
+        return df.loc[pd.Timestamp(from_date):pd.Timestamp(to_date)].copy()
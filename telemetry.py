@@ -0,0 +1,279 @@
+import os
+import sys
+import threading
+import time
+
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(8))
+PROFILE_INTERVAL = 0.005
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    # Cumulative-bucket histogram per label combination, rendered in the Prometheus text format.
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.label_names = tuple(label_names)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            child = self.children.get(label_values)
+            if child is None:
+                child = self.children[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    child[0][i] += 1
+                    break
+            child[1] += value
+            child[2] += 1
+
+    def samples(self):
+        with self.lock:
+            children = [(labels, list(counts), total, count)
+                        for labels, (counts, total, count) in self.children.items()]
+        for labels, counts, total, count in sorted(children):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = format_labels(self.label_names, labels, [('le', format_value(bound))])
+                yield f'{self.name}_bucket{le} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.label_names, labels)} {format_value(total)}'
+            yield f'{self.name}_count{format_labels(self.label_names, labels)} {count}'
+
+
+class Gauge:
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def add(self, amount, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield f'{self.name}{format_labels(self.label_names, labels)} {format_value(value)}'
+
+
+class Counter(Gauge):
+
+    kind = 'counter'
+
+
+class CallbackMetric:
+    # Values read at scrape time, e.g. counters kept by another component.
+
+    def __init__(self, name, documentation, kind, read):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.read = read
+
+    def samples(self):
+        try:
+            value = self.read()
+        except Exception:
+            return
+        if value is not None:
+            yield f'{self.name} {format_value(value)}'
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            samples = list(metric.samples())
+            if not samples:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+stage_seconds = registry.register(Histogram(
+    'tsa_stage_seconds', 'Time spent in each stage of the analysis pipeline.', label_names=('stage',)))
+stage_errors = registry.register(Counter(
+    'tsa_stage_errors_total', 'Stages that raised, superseded requests included.', label_names=('stage',)))
+request_seconds = registry.register(Histogram(
+    'tsa_request_seconds', 'HTTP request latency, Dash serialization included.', label_names=('route',)))
+response_bytes = registry.register(Histogram(
+    'tsa_response_bytes', 'HTTP response body size; Dash callback payloads for /_dash-update-component.',
+    SIZE_BUCKETS, label_names=('route',)))
+in_flight = registry.register(Gauge(
+    'tsa_requests_in_flight', 'Requests currently being handled.', label_names=('route',)))
+
+
+def register_cache(get_cache):
+    # `get_cache` returns the result cache and is called at scrape time, so registering does not
+    # create it. The SQLite backend's counters are shared by every worker, the memory backend's are
+    # per process.
+    for name in ('hits', 'misses', 'evictions'):
+        registry.register(CallbackMetric(
+            f'tsa_cache_{name}_total', f'Result cache {name}.', 'counter',
+            lambda name=name: get_cache().stats().get(name)))
+
+    def hit_ratio():
+        stats = get_cache().stats()
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        return stats.get('hits', 0) / lookups if lookups else None
+
+    registry.register(CallbackMetric('tsa_cache_hit_ratio', 'Result cache hits over lookups.', 'gauge', hit_ratio))
+
+
+def register_jobs(get_queue):
+    # Same contract as register_cache; with the SQLite store the counts cover every worker.
+    for state in ('queued', 'running'):
+        registry.register(CallbackMetric(
+            f'tsa_jobs_{state}', f'Background jobs {state}.', 'gauge',
+            lambda state=state: get_queue().counts().get(state)))
+
+
+def register_range_indexes():
+    # Per process. Reads rangequery only once something imported it, so scraping a fresh worker
+    # does not load the range index stack.
+    def cached_bytes():
+        module = sys.modules.get('rangequery')
+        return None if module is None else module.cached_bytes()
+
+    registry.register(CallbackMetric(
+        'tsa_range_index_bytes', 'Bytes held by the cached range query indexes.', 'gauge', cached_bytes))
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.add(1, stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage)
+
+
+class SamplingProfiler:
+    # Samples one thread's Python stack from a background thread and counts collapsed stacks
+    # ("outer;inner;leaf count" lines, the flame graph input format).
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = StackCounter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def instrument(server, profile_threshold=None, profile_dir=None):
+    # Times every request of a Flask app, tracks in-flight counts and response sizes, serves the
+    # registry at /metrics and, when `profile_threshold` (seconds) is set, writes the sampled stacks
+    # of slower requests to `profile_dir`.
+    import flask
+
+    if profile_threshold is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def route():
+        # The matched rule, not the raw path, keeps label values bounded.
+        rule = flask.request.url_rule
+        return rule.rule if rule is not None else 'unmatched'
+
+    @server.before_request
+    def start_request_timer():
+        flask.g.telemetry_start = time.perf_counter()
+        flask.g.telemetry_route = route()
+        in_flight.add(1, flask.g.telemetry_route)
+        if profile_threshold is not None:
+            flask.g.telemetry_profiler = SamplingProfiler(threading.get_ident()).start()
+
+    @server.after_request
+    def record_response(response):
+        if not response.direct_passthrough:
+            response_bytes.observe(response.calculate_content_length() or 0, route())
+        return response
+
+    @server.teardown_request
+    def stop_request_timer(exc):
+        start = flask.g.pop('telemetry_start', None)
+        if start is None:
+            return
+        name = flask.g.pop('telemetry_route')
+        elapsed = time.perf_counter() - start
+        in_flight.add(-1, name)
+        request_seconds.observe(elapsed, name)
+        profiler = flask.g.pop('telemetry_profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            if elapsed >= profile_threshold:
+                path = flask.request.path.strip('/').replace('/', '_') or 'root'
+                filename = f'{time.strftime("%Y%m%d-%H%M%S")}-{int(elapsed * 1000)}ms-{path}.folded'
+                profiler.dump(os.path.join(profile_dir, filename))
+
+    @server.route('/metrics')
+    def metrics():
+        return flask.Response(registry.render(), mimetype='text/plain; version=0.0.4')
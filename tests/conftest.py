@@ -0,0 +1,18 @@
+import os
+import sys
+
+# The modules live at the repository root and are imported by name, as main.py does.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+
+def assert_summaries_equal(expected, actual, rel=1e-9):
+    # Summaries from two engines: same keys, floats within `rel` (NaN matching NaN), the rest equal.
+    assert expected.keys() == actual.keys()
+    for name, value in expected.items():
+        if isinstance(value, (float, np.floating)):
+            assert actual[name] == pytest.approx(value, rel=rel, abs=1e-12, nan_ok=True), name
+        else:
+            assert actual[name] == value, name
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import rangequery
+
+from analyzer import TimeSeriesAnalyzer, metric
+from conftest import assert_summaries_equal
+from synthetic import SyntheticDataSource
+
+
+@pytest.fixture(scope='module')
+def source():
+    return SyntheticDataSource(600)
+
+
+class CountingAnalyzer(TimeSeriesAnalyzer):
+    calls = 0
+
+    @metric('returns', 'trading_days')
+    def doubled_returns(self):
+        CountingAnalyzer.calls += 1
+        return self.returns * 2
+
+
+def test_requirements_come_dependencies_first():
+    assert TimeSeriesAnalyzer.requirements('cagr') == ['prices', 'returns', 'trading_days', 'cagr']
+    graph = TimeSeriesAnalyzer.metrics()
+    ordered = TimeSeriesAnalyzer.requirements(*graph)
+    assert sorted(ordered) == sorted(graph)
+    for name in ordered:
+        assert all(ordered.index(dependency) < ordered.index(name) for dependency in graph[name].depends_on), name
+
+
+def test_compute_memoizes(source, monkeypatch):
+    monkeypatch.setattr(CountingAnalyzer, 'calls', 0)
+    analysis = CountingAnalyzer('SPY', '2019-01-01', '2020-12-31', source)
+    assert 'doubled_returns' in CountingAnalyzer.metrics()
+    assert not any(analysis.is_computed(name) for name in ('returns', 'trading_days', 'doubled_returns'))
+    first = analysis.compute('doubled_returns')['doubled_returns']
+    assert all(analysis.is_computed(name) for name in ('returns', 'trading_days', 'doubled_returns'))
+    assert not analysis.is_computed('max_dd')
+    assert analysis.compute('doubled_returns')['doubled_returns'] is first
+    assert analysis.doubled_returns is first
+    assert CountingAnalyzer.calls == 1
+
+
+def test_range_shorter_than_the_vol_window_has_no_extremes(source):
+    df = source.get_prices('SPY', rangequery.HISTORY_START, '2020-12-31')
+    from_date, to_date = df.index[100], df.index[109]
+    summary = TimeSeriesAnalyzer('SPY', from_date, to_date, source).summary()
+    assert np.isnan(summary['min_vol']) and np.isnan(summary['max_vol'])
+    assert summary['min_vol_date'] is None and summary['max_vol_date'] is None
+    assert_summaries_equal(summary, rangequery.RangeQueryIndex(df).summary(from_date, to_date))
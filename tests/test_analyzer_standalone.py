@@ -0,0 +1,103 @@
+import json
+import os
+
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+import analyzer_standalone
+
+TICKERS = ['AAA', 'BBB', 'CRASH', 'CCC', 'DDD', 'FAIL', 'EEE']
+
+
+def fake_analyze(ticker_symbol, from_date, to_date):
+    # Stands in for analyze() in the worker processes: CRASH kills its worker the way a segfault
+    # or an out-of-memory kill would, FAIL fails like a ticker without data.
+    if ticker_symbol == 'CRASH' and os.environ.get('TSA_TEST_CRASH'):
+        os._exit(1)
+    if ticker_symbol == 'FAIL' and os.environ.get('TSA_TEST_CRASH'):
+        return analyzer_standalone.error_row(ticker_symbol, 'KeyError: no data')
+    return dict(analyzer_standalone.error_row(ticker_symbol), cagr=float(len(ticker_symbol)), trading_days=10)
+
+
+def read_rows(path, output_format):
+    if output_format == 'csv':
+        return pd.read_csv(path, keep_default_na=False).to_dict('records')
+    if output_format == 'jsonl':
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+    df = pd.read_parquet(path)
+    df['error'] = df['error'].astype(object).where(df['error'].notna(), None)
+    return df.to_dict('records')
+
+
+@pytest.mark.parametrize('output_format', analyzer_standalone.FORMATS)
+def test_dead_worker_fails_in_flight_tickers_and_resume_rewrites_them(tmp_path, monkeypatch, output_format):
+    monkeypatch.setattr(analyzer_standalone, 'analyze', fake_analyze)
+    monkeypatch.setenv('TSA_TEST_CRASH', '1')
+    output = str(tmp_path / f'results.{output_format}')
+
+    counts = analyzer_standalone.run_batch(TICKERS, output, '2020-01-01', '2020-12-31', workers=2)
+    rows = read_rows(output, output_format)
+    assert sorted(row['ticker'] for row in rows) == sorted(TICKERS)
+    failed = {row['ticker'] for row in rows if row['error']}
+    assert {'CRASH', 'FAIL'} <= failed
+    assert any('BrokenProcessPool' in row['error'] for row in rows if row['ticker'] == 'CRASH')
+    assert counts == {'skipped': 0, 'processed': len(TICKERS), 'failed': len(failed)}
+
+    monkeypatch.delenv('TSA_TEST_CRASH')
+    counts = analyzer_standalone.run_batch(TICKERS, output, '2020-01-01', '2020-12-31', workers=2)
+    rows = read_rows(output, output_format)
+    assert sorted(row['ticker'] for row in rows) == sorted(TICKERS)
+    assert not any(row['error'] for row in rows)
+    assert counts == {'skipped': len(TICKERS) - len(failed), 'processed': len(failed), 'failed': 0}
+
+
+def test_resume_drops_partial_last_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(analyzer_standalone, 'analyze', fake_analyze)
+    output = str(tmp_path / 'results.csv')
+    analyzer_standalone.run_batch(TICKERS[:2], output, '2020-01-01', '2020-12-31', workers=1)
+    with open(output, 'a') as f:
+        f.write('CCC,1.0')
+    analyzer_standalone.run_batch(TICKERS[:4], output, '2020-01-01', '2020-12-31', workers=1)
+    assert [row['ticker'] for row in read_rows(output, 'csv')] == ['AAA', 'BBB', 'CRASH', 'CCC']
+
+
+
+class BreakingPool:
+    # Runs tasks inline. The first pool breaks on its second submission, as when a worker dies
+    # between two submissions, and fails the task that was still running.
+    created = 0
+
+    def __init__(self, max_workers=None):
+        BreakingPool.created += 1
+        self.breaks = BreakingPool.created == 1
+        self.futures = []
+
+    def submit(self, fn, *args):
+        if self.breaks and self.futures:
+            self.futures[0].set_exception(BrokenProcessPool('worker died'))
+            raise BrokenProcessPool('worker died')
+        future = Future()
+        if not self.breaks:
+            future.set_result(fn(*args))
+        self.futures.append(future)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def test_pool_breaking_between_submissions_keeps_the_unsent_ticker(tmp_path, monkeypatch):
+    monkeypatch.setattr(analyzer_standalone, 'analyze', fake_analyze)
+    monkeypatch.setattr(analyzer_standalone, 'ProcessPoolExecutor', BreakingPool)
+    monkeypatch.setattr(BreakingPool, 'created', 0)
+    output = str(tmp_path / 'results.jsonl')
+    counts = analyzer_standalone.run_batch(TICKERS[:4], output, '2020-01-01', '2020-12-31', workers=2)
+    rows = {row['ticker']: row['error'] for row in read_rows(output, 'jsonl')}
+    assert sorted(rows) == sorted(TICKERS[:4])
+    assert 'BrokenProcessPool' in rows['AAA']
+    assert not any(rows[ticker] for ticker in TICKERS[1:4])
+    assert counts['failed'] == 1
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from analyzer import TimeSeriesAnalyzer
+from batch import BatchAnalyzer
+from conftest import assert_summaries_equal
+from synthetic import generate_ohlcv
+
+FROM_DATE, TO_DATE = '2010-01-01', '2020-12-31'
+
+
+class FramesSource:
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def get_prices(self, ticker_symbol, from_date, to_date):
+        return self.frames[ticker_symbol].loc[from_date:to_date].copy()
+
+
+@pytest.fixture(scope='module')
+def source():
+    full = generate_ohlcv(2000, seed=1, end=TO_DATE)
+    gapped = generate_ohlcv(2000, seed=2, end=TO_DATE)
+    keep = np.random.default_rng(2).random(len(gapped)) > 0.1
+    keep[:5] = keep[-5:] = True
+    return FramesSource({
+        'FULL': full,
+        'LATE': generate_ohlcv(700, seed=3, end=TO_DATE),
+        'EARLY': generate_ohlcv(900, seed=4, end='2016-06-30'),
+        'GAPPED': gapped[keep],
+        'SHORT': generate_ohlcv(10, seed=5, end='2018-03-30'),
+    })
+
+
+def test_ragged_and_gapped_tickers_match_analyzer(source):
+    batch = BatchAnalyzer.from_source(list(source.frames), FROM_DATE, TO_DATE, source)
+    results = batch.results()
+    for ticker_symbol in source.frames:
+        expected = TimeSeriesAnalyzer(ticker_symbol, FROM_DATE, TO_DATE, source)
+        row = results.loc[ticker_symbol].to_dict()
+        # Missing vol dates read back from the frame as NaN.
+        row.update({key: row[key] if isinstance(row[key], str) else None for key in ('min_vol_date', 'max_vol_date')})
+        assert_summaries_equal(expected.summary(), row)
+
+
+def test_volatility_series_match_analyzer(source):
+    batch = BatchAnalyzer.from_source(list(source.frames), FROM_DATE, TO_DATE, source)
+    for accessor in ('historic_vol_14_days_annualized', 'historic_vol_sma_126'):
+        frame = getattr(batch, accessor)()
+        for ticker_symbol in source.frames:
+            expected = getattr(TimeSeriesAnalyzer(ticker_symbol, FROM_DATE, TO_DATE, source), accessor)().dropna()
+            actual = frame[ticker_symbol].dropna()
+            np.testing.assert_array_equal(actual.index.values, expected.index.values.astype(actual.index.dtype))
+            np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-9)
+
+
+def test_single_column_without_ranges():
+    df = generate_ohlcv(300, seed=6, duplicate_rate=0)
+    results = BatchAnalyzer(df[['Adj Close']]).results()
+    assert results.loc['Adj Close', 'trading_days'] == 299
+    assert np.isnan(results.loc['Adj Close', 'dn'])
+    assert results.loc['Adj Close', 'cagr'] == pytest.approx(
+        ((df['Adj Close'].iloc[-1] / df['Adj Close'].iloc[1]) ** (252 / 299) - 1) * 100)
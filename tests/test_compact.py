@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from analyzer import TimeSeriesAnalyzer
+from compact import CompactAnalyzer
+from conftest import assert_summaries_equal
+from synthetic import SyntheticDataSource
+
+FROM_DATE, TO_DATE = '2000-01-01', '2020-12-31'
+
+
+@pytest.fixture(scope='module')
+def source():
+    return SyntheticDataSource(6000)
+
+
+def test_accessors_match_analyzer(source):
+    expected = TimeSeriesAnalyzer('SPY', FROM_DATE, TO_DATE, source)
+    compact = CompactAnalyzer('SPY', FROM_DATE, TO_DATE, source)
+    assert_summaries_equal(expected.summary(), compact.summary())
+    for accessor in ('adj_close', 'daily_return', 'historic_vol_14_days_annualized', 'historic_vol_sma_126'):
+        np.testing.assert_allclose(getattr(compact, accessor)().to_numpy(), getattr(expected, accessor)().to_numpy(),
+                                   rtol=1e-9, equal_nan=True, err_msg=accessor)
+    for accessor in ('rolling_historic_var', 'rolling_metrics'):
+        actual = getattr(compact, accessor)()
+        reference = getattr(expected, accessor)()[actual.columns]
+        np.testing.assert_allclose(actual.to_numpy(), reference.to_numpy(), rtol=1e-8, atol=1e-10, equal_nan=True,
+                                   err_msg=accessor)
+
+
+def test_holds_less_than_the_price_frame(source):
+    frame = source.get_prices('SPY', FROM_DATE, TO_DATE)
+    compact = CompactAnalyzer('SPY', FROM_DATE, TO_DATE, source, chart_dtype='f4')
+    footprint = compact.memory_footprint()
+    assert footprint['total'] < frame.memory_usage(deep=True).sum()
+    assert footprint['dates'] == compact.dates.nbytes
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from datasource import ColumnarStore, LocalFileDataSource
+from synthetic import generate_ohlcv
+
+
+class FrameSource:
+
+    def __init__(self, df):
+        self.df = df
+
+    def get_prices(self, ticker_symbol, from_date, to_date):
+        return self.df.loc[from_date:pd.Timestamp(to_date) + pd.Timedelta('1D') - pd.Timedelta('1ns')].copy()
+
+
+def frame():
+    return generate_ohlcv(300, seed=3, end='2020-12-31', duplicate_rate=0)
+
+
+def test_extends_stored_history(tmp_path):
+    df = frame()
+    source = FrameSource(df)
+    store = ColumnarStore(str(tmp_path), source)
+    store.get_prices('SPY', '2020-03-02', '2020-06-30')
+    store.get_prices('SPY', '2020-01-02', '2020-12-31')
+    stored = store.get_prices('SPY', '2020-01-02', '2020-12-31')
+    pd.testing.assert_frame_equal(stored, df.loc['2020-01-02':'2020-12-31'], check_freq=False, check_index_type=False)
+
+
+def test_rewrites_history_after_split(tmp_path):
+    df = frame()
+    # Before a 2:1 split on July 1st the source quotes the pre-split price level...
+    before = df.copy()
+    before['Adj Close'] *= 2
+    source = FrameSource(before)
+    store = ColumnarStore(str(tmp_path), source)
+    store.get_prices('SPY', '2020-01-02', '2020-06-30')
+
+    # ...and afterwards restates the whole history at the post-split level.
+    source.df = df
+    stored = store.get_prices('SPY', '2020-01-02', '2020-12-31')
+
+    pd.testing.assert_series_equal(stored['Adj Close'], df.loc['2020-01-02':'2020-12-31', 'Adj Close'],
+                                   check_freq=False, check_index_type=False)
+    assert np.abs(stored['Adj Close'].pct_change().dropna()).max() < 0.2
+
+
+def test_rewrites_history_when_extending_backwards_after_dividend(tmp_path):
+    df = frame()
+    source = FrameSource(df)
+    store = ColumnarStore(str(tmp_path), source)
+    store.get_prices('SPY', '2020-06-01', '2020-09-30')
+
+    dividend = df.copy()
+    dividend.loc[:'2020-09-15', 'Adj Close'] *= 0.99
+    source.df = dividend
+    stored = store.get_prices('SPY', '2020-03-02', '2020-09-30')
+
+    pd.testing.assert_series_equal(stored['Adj Close'], dividend.loc['2020-03-02':'2020-09-30', 'Adj Close'],
+                                   check_freq=False, check_index_type=False)
+
+
+def test_fetch_keeps_last_day_intraday_bars(tmp_path):
+    df = generate_ohlcv(400, seed=4, end='2020-06-30 16:00', freq='h', duplicate_rate=0)
+    store = ColumnarStore(str(tmp_path), FrameSource(df))
+    fetched = store.fetch('SPY', pd.Timestamp('2020-06-29'), pd.Timestamp('2020-06-30'))
+    assert fetched.index[0] == pd.Timestamp('2020-06-29 00:00')
+    assert fetched.index[-1] == pd.Timestamp('2020-06-30 16:00')
+
+
+def test_local_files_keep_last_day_intraday_bars(tmp_path):
+    df = generate_ohlcv(100, seed=5, end='2020-06-30 16:00', freq='h', duplicate_rate=0)
+    df.to_csv(tmp_path / 'SPY.csv')
+    prices = LocalFileDataSource(str(tmp_path)).get_prices('SPY', '2020-06-30', '2020-06-30')
+    assert len(prices) == 17
+    assert prices.index[-1] == pd.Timestamp('2020-06-30 16:00')
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import downsample
+
+
+def reference_lttb(x, y, threshold):
+    # Textbook LTTB (Steinarsson 2013), one bucket at a time.
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    selected, a = [0], 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        if i == threshold - 3:
+            end, next_start, next_end = n - 1, n - 1, n
+        x_mean, y_mean = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = [abs((x[a] - x_mean) * (y[j] - y[a]) - (x[a] - x[j]) * (y_mean - y[a])) for j in range(start, end)]
+        a = start + int(np.argmax(areas))
+        selected.append(a)
+    return np.array(selected + [n - 1])
+
+
+@pytest.fixture(scope='module')
+def walk():
+    rng = np.random.default_rng(9)
+    return np.arange(5000, dtype='f8'), np.cumsum(rng.normal(size=5000))
+
+
+@pytest.mark.parametrize('threshold', [3, 10, 333, 1500, 4999])
+def test_lttb_keeps_endpoints_and_the_cap(walk, threshold):
+    x, y = walk
+    selected = downsample.lttb(x, y, threshold)
+    assert len(selected) == threshold
+    assert selected[0] == 0 and selected[-1] == len(x) - 1
+    assert (np.diff(selected) > 0).all()
+    np.testing.assert_array_equal(selected, reference_lttb(x, y, threshold))
+
+
+def test_lttb_leaves_short_series_alone(walk):
+    x, y = walk
+    np.testing.assert_array_equal(downsample.lttb(x[:100], y[:100], 100), np.arange(100))
+    np.testing.assert_array_equal(downsample.lttb(x[:100], y[:100], 2), np.arange(100))
+
+
+def test_series_drop_warm_up_and_cap_points(walk):
+    _, y = walk
+    index = pd.bdate_range('2000-01-03', periods=len(y))
+    values = y.copy()
+    values[:125] = np.nan
+    kept_index, kept = downsample.downsample_series(index, values, max_points=500)
+    assert len(kept) == 500 and np.isfinite(kept).all()
+    assert kept_index[0] == index[125] and kept_index[-1] == index[-1]
+
+
+def test_zoom_window_keeps_one_point_past_each_edge(walk):
+    _, y = walk
+    index = pd.bdate_range('2000-01-03', periods=len(y))
+    window = [str(index[1000] + pd.Timedelta(hours=12)), str(index[1200])]
+    kept_index, kept = downsample.downsample_series(index, y, max_points=1500, window=window)
+    # All 200 bars inside, plus index[1000] before the start and index[1201] after the end.
+    assert list(kept_index) == list(index[1000:1202])
+    np.testing.assert_array_equal(kept, y[1000:1202])
+    assert len(downsample.downsample_series(index, y, max_points=50, window=window)[0]) == 50
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import figures
+
+
+def integral(edges, density):
+    return float(np.sum(density * np.diff(edges)))
+
+
+def test_density_uses_freedman_diaconis_bins():
+    returns = np.random.default_rng(1).normal(0, 0.01, 2000)
+    edges, density = figures.histogram_density(returns)
+    np.testing.assert_array_equal(edges, np.histogram_bin_edges(returns, bins='fd'))
+    assert integral(edges, density) == pytest.approx(1, rel=1e-12)
+
+
+def test_density_caps_bins_and_ignores_nan():
+    # Fat tails and many bars make Freedman-Diaconis ask for thousands of bins.
+    returns = np.random.default_rng(2).standard_t(1.5, 200000) * 0.01
+    returns[:10] = np.nan
+    assert len(np.histogram_bin_edges(returns[10:], bins='fd')) > figures.MAX_HISTOGRAM_BINS + 1
+    edges, density = figures.histogram_density(returns)
+    assert len(density) == figures.MAX_HISTOGRAM_BINS
+    assert edges[0] == np.min(returns[10:]) and edges[-1] == np.max(returns[10:])
+    assert integral(edges, density) == pytest.approx(1, rel=1e-12)
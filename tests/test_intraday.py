@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import intraday
+
+FROM_DATE, TO_DATE = '2021-03-02', '2021-03-03'
+
+
+@pytest.fixture(scope='module')
+def ticks():
+    # Three sessions of irregular ticks stamped to the second, so dozens repeat a timestamp.
+    rng = np.random.default_rng(5)
+    times = []
+    for day in pd.bdate_range('2021-03-01', periods=3):
+        start = day + pd.Timedelta(hours=9, minutes=30)
+        offsets = np.sort(rng.integers(0, int(6.5 * 3600), 1500))
+        times.append(start + pd.to_timedelta(offsets, unit='s'))
+    times = pd.DatetimeIndex(np.concatenate(times))
+    return pd.DataFrame({
+        'Timestamp': times,
+        'Price': 100 + np.cumsum(rng.normal(0, 0.05, len(times))),
+        'Size': rng.integers(1, 500, len(times)).astype('f8'),
+    })
+
+
+def reference_bars(ticks, bar):
+    # The whole file at once: first tick per timestamp, the requested days, pandas resample.
+    df = ticks.drop_duplicates('Timestamp').set_index('Timestamp')
+    df = df[(df.index >= pd.Timestamp(FROM_DATE)) & (df.index < pd.Timestamp(TO_DATE) + pd.Timedelta(days=1))]
+    resampled = df.resample(bar)
+    bars = pd.DataFrame({'Open': resampled['Price'].first(), 'High': resampled['Price'].max(),
+                         'Low': resampled['Price'].min(), 'Close': resampled['Price'].last(),
+                         'Volume': resampled['Size'].sum()})
+    return bars[resampled['Price'].count() > 0]
+
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+@pytest.mark.parametrize('bar, chunk_rows', [('5min', 37), ('1min', 250), ('1h', 1000), ('5min', 10 ** 6)])
+def test_chunked_bars_match_pandas_resample(tmp_path, ticks, extension, bar, chunk_rows):
+    assert ticks['Timestamp'].duplicated().sum() > 100
+    path = str(tmp_path / f'TICKS.{extension}')
+    if extension == 'csv':
+        ticks.to_csv(path, index=False)
+    else:
+        ticks.to_parquet(path, index=False)
+    chunks = list(intraday.iter_bars(path, bar, FROM_DATE, TO_DATE, chunk_rows))
+    actual = pd.concat(chunks)
+    expected = reference_bars(ticks, bar)
+    assert actual.index.is_unique
+    pd.testing.assert_frame_equal(actual, expected, check_freq=False, check_names=False, check_index_type=False)
+
+
+def test_out_of_order_file_is_rejected(tmp_path, ticks):
+    path = str(tmp_path / 'TICKS.csv')
+    ticks.iloc[::-1].to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        list(intraday.iter_bars(path, '5min', FROM_DATE, TO_DATE, 100))
@@ -0,0 +1,96 @@
+import math
+import threading
+import time
+
+import pytest
+
+import cache
+import datasource
+import jobs
+import rangequery
+import ui
+
+from synthetic import SyntheticDataSource
+
+release, finish = threading.Event(), threading.Event()
+
+
+def staged_job(params, report, checkpoint):
+    report(0.5, 'Primera parte', first=params['value'])
+    release.wait(5)
+    checkpoint()
+    report(0.9, 'Segunda parte', second=float('nan'))
+    finish.wait(5)
+    return {'value': params['value']}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def queue(request, tmp_path, monkeypatch):
+    monkeypatch.setitem(jobs.KINDS, 'staged', 'test_jobs:staged_job')
+    monkeypatch.setattr(jobs, 'POLL_SECONDS', 0.01)
+    release.clear()
+    finish.clear()
+    store = jobs.MemoryJobStore() if request.param == 'memory' else jobs.SqliteJobStore(str(tmp_path / 'jobs.db'))
+    yield jobs.JobQueue(store, workers=2, encoder=cache.result_encoder())
+    release.set()
+    finish.set()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_publishes_only_new_parts(queue):
+    job_id = queue.submit('staged', {'value': 1})
+    wait_for(lambda: queue.status(job_id)['revision'] == 1)
+    assert queue.published(job_id) == {'first': 1}
+
+    release.set()
+    wait_for(lambda: queue.status(job_id)['revision'] == 2)
+    new = queue.published(job_id, 1)
+    assert list(new) == ['second'] and math.isnan(new['second'])
+    assert list(queue.published(job_id)) == ['first', 'second']
+
+    finish.set()
+    wait_for(lambda: queue.status(job_id)['state'] == jobs.DONE)
+    assert queue.status(job_id)['result'] == {'value': 1}
+    # Parts live only while the job runs; the result is all that remains.
+    assert queue.published(job_id) == {}
+
+
+def test_new_submission_cancels_channel_job(queue):
+    first = queue.submit('staged', {'value': 1}, channel='tab')
+    wait_for(lambda: queue.status(first)['revision'] == 1)
+    assert queue.submit('staged', {'value': 1}, channel='tab') == first
+    other = queue.submit('staged', {'value': 1}, channel='other tab')
+
+    second = queue.submit('staged', {'value': 2}, channel='tab')
+    assert queue.status(first)['state'] == jobs.CANCELLED
+    assert queue.published(first) == {}
+    release.set()
+    finish.set()
+    wait_for(lambda: queue.status(second)['state'] == jobs.DONE)
+    wait_for(lambda: queue.status(other)['state'] == jobs.DONE)
+    assert queue.status(first)['state'] == jobs.CANCELLED
+    assert queue.status(first)['result'] is None
+
+
+def test_analysis_job_polls_short_range(monkeypatch):
+    monkeypatch.setenv('TSA_CACHE_BACKEND', 'memory')
+    monkeypatch.setenv('TSA_JOB_BACKEND', 'memory')
+    monkeypatch.setattr(cache, '_default_cache', None)
+    monkeypatch.setattr(jobs, '_default_queue', None)
+    monkeypatch.setattr(datasource, '_default_source', SyntheticDataSource(1500, end='2026-10-16'))
+    monkeypatch.setattr(rangequery, '_indexes', rangequery.OrderedDict())
+
+    job = {'id': ui.submit_analysis('SPY', '2026-10-01', '2026-10-16', channel='tab'), 'revision': 0, 'shown': []}
+    wait_for(lambda: jobs.default_queue().status(job['id'])['state'] == jobs.DONE, timeout=30)
+    outputs = ui.poll_job(job)
+    slots = dict(zip(ui.RESULT_SLOTS, outputs[1:1 + len(ui.RESULT_SLOTS)]))
+    assert 'N/D' in str(slots['summary'])
+    assert all(content is not ui.no_update for content in slots.values())
+    assert outputs[-2] is True
+    assert math.isnan(ui.cached_results('SPY', '2026-10-01', '2026-10-16')['summary']['min_vol'])
@@ -0,0 +1,41 @@
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def main():
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('TSA_JOB_BACKEND', 'sync')
+        patch.setenv('TSA_CACHE_BACKEND', 'memory')
+        patch.setenv('TSA_WARM_UP', '0')
+        yield importlib.import_module('main')
+
+
+def tab_id(layout):
+    return next(child.data for child in layout.children if getattr(child, 'id', None) == 'tab-id')
+
+
+def test_every_page_load_is_its_own_channel(main):
+    assert tab_id(main.app.layout()) != tab_id(main.app.layout())
+
+
+def test_responses_set_no_cookies(main):
+    client = main.server.test_client()
+    for path in ('/', '/metrics'):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert 'Set-Cookie' not in response.headers
+
+
+def test_import_stays_off_the_numeric_stack(tmp_path):
+    # Cold start: a worker serves cached pages before anything loads pandas, numpy or scipy.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, TSA_WARM_UP='0', TSA_CACHE_DIR=str(tmp_path))
+    code = "import sys, main; print(' '.join(m for m in ('pandas', 'numpy', 'scipy') if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, env=env, capture_output=True, text=True,
+                            check=True)
+    assert result.stdout.strip() == ''
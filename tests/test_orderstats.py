@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from orderstats import OrderStatistics
+
+PERCENTILES = (0, 1, 5, 37.5, 50, 95, 99.7, 100)
+
+
+@pytest.fixture(scope='module')
+def values():
+    # Rounded so that many values tie, as daily returns quoted in cents do.
+    return np.round(np.random.default_rng(3).standard_t(3, 3000), 1)
+
+
+def test_percentile_matches_numpy(values):
+    statistics = OrderStatistics(values)
+    rng = np.random.default_rng(4)
+    for lo, hi in [(0, len(values)), (0, 1), (5, 7), (2999, 3000)] + [tuple(sorted(rng.choice(3001, 2, replace=False)))
+                                                                    for _ in range(50)]:
+        for q in PERCENTILES:
+            assert statistics.percentile(lo, hi, q) == pytest.approx(np.percentile(values[lo:hi], q), rel=1e-12,
+                                                                     abs=1e-12), (lo, hi, q)
+
+
+@pytest.mark.parametrize('window', [1, 2, 21, 252])
+def test_rolling_percentiles_match_pandas(values, window):
+    start = 10
+    result = OrderStatistics(values).rolling_percentiles(window, PERCENTILES, start=start)
+    series = pd.Series(values)
+    for column, q in enumerate(PERCENTILES):
+        expected = series.rolling(window).quantile(q / 100).to_numpy().copy()
+        expected[:start + window - 1] = np.nan
+        np.testing.assert_allclose(result[:, column], expected, rtol=1e-12, atol=1e-12, equal_nan=True,
+                                   err_msg=str(q))
+
+
+def test_window_longer_than_series_is_all_nan(values):
+    assert np.isnan(OrderStatistics(values[:10]).rolling_percentiles(20, PERCENTILES)).all()
+
+
+def test_leading_nan_is_kept_out_with_start(values):
+    # Returns start with a NaN (the first bar has none); it ranks last and start=1 skips it.
+    with_nan = np.concatenate([[np.nan], values[:500]])
+    statistics = OrderStatistics(with_nan)
+    assert statistics.percentile(1, 501, 5) == pytest.approx(np.percentile(values[:500], 5), rel=1e-12)
+    result = statistics.rolling_percentiles(21, [5], start=1)[:, 0]
+    expected = pd.Series(with_nan).rolling(21).quantile(0.05).to_numpy()
+    np.testing.assert_allclose(result, expected, rtol=1e-12, equal_nan=True)
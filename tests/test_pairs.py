@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pairs
+
+HEDGE_RATIO = 1.5
+
+
+@pytest.fixture(scope='module')
+def adj_close():
+    # Five independent random walks, a sixth cointegrated with the first (log A = 0.3 + 1.5 log B
+    # + AR(1) noise), and one listed for the last 100 bars only.
+    rng = np.random.default_rng(7)
+    n = 1500
+    log_prices = np.cumsum(rng.normal(0, 0.01, (n, 5)), axis=0) + 4
+    noise = np.zeros(n)
+    shocks = rng.normal(0, 0.004, n)
+    for i in range(1, n):
+        noise[i] = 0.5 * noise[i - 1] + shocks[i]
+    planted = 0.3 + HEDGE_RATIO * log_prices[:, 0] + noise
+    dates = pd.bdate_range('2015-01-01', periods=n)
+    frame = pd.DataFrame(np.exp(np.column_stack([log_prices, planted])), index=dates,
+                         columns=['BBB', 'CCC', 'DDD', 'EEE', 'FFF', 'AAA'])
+    frame['NEW'] = np.nan
+    frame.iloc[-100:, -1] = np.exp(np.cumsum(rng.normal(0, 0.01, 100)) + 3)
+    return frame
+
+
+def test_recent_listing_is_left_out(adj_close):
+    messages = []
+    screener = pairs.PairsScreener(adj_close, min_observations=50, log=messages.append)
+    assert screener.dropped == ['NEW']
+    assert len(messages) == 1 and messages[0].startswith('NEW: 100 of 1500 bars')
+    assert len(screener.dates) == len(adj_close)
+
+
+def test_planted_pair_ranks_first(adj_close):
+    table = pairs.PairsScreener(adj_close).screen(min_correlation=-1, workers=1)
+    assert len(table) == 15
+    top = table.loc[1]
+    assert {top['first'], top['second']} == {'AAA', 'BBB'}
+    assert top['cadf_p_value'] < 0.001 < table.loc[2, 'cadf_p_value']
+    expected = HEDGE_RATIO if top['first'] == 'AAA' else 1 / HEDGE_RATIO
+    assert top['hedge_ratio'] == pytest.approx(expected, rel=0.02)
+    # dS = -0.5 S + e for the AR(1) noise with coefficient 0.5.
+    assert top['half_life'] == pytest.approx(np.log(2) / 0.5, rel=0.2)
+    assert top['johansen_trace'] > top['johansen_trace_95']
+
+
+def test_process_pool_matches_one_worker(adj_close, monkeypatch):
+    monkeypatch.setattr(pairs, 'PAIR_CHUNK', 4)
+    screener = pairs.PairsScreener(adj_close)
+    progress = []
+    pooled = screener.screen(min_correlation=-1, workers=2, progress=progress.append)
+    assert progress == [0.25, 0.5, 0.75, 1.0]
+    pd.testing.assert_frame_equal(pooled, screener.screen(min_correlation=-1, workers=1))
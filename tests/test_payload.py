@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+from plotly.subplots import make_subplots
+from plotly.utils import PlotlyJSONEncoder
+
+import payload
+
+
+@pytest.fixture(scope='module')
+def figure():
+    rng = np.random.default_rng(6)
+    dates = pd.date_range('2020-01-01 09:30', periods=300, freq='min')
+    figure = make_subplots(rows=3, cols=1)
+    figure.add_trace(go.Scatter(x=dates, y=100 + np.cumsum(rng.normal(size=300))), row=1, col=1)
+    figure.add_trace(go.Scatter(x=[str(date) for date in dates[:50]], y=rng.normal(size=50)), row=2, col=1)
+    figure.add_trace(go.Bar(x=np.linspace(-1, 1, 20), y=rng.random(20), width=np.full(20, 0.1)), row=3, col=1)
+    return figure
+
+
+def round_trip(figure, encoding):
+    # Through JSON, as Dash sends it to the browser.
+    return json.loads(json.dumps(payload.encode_figure(figure, encoding), cls=PlotlyJSONEncoder))
+
+
+def test_json_leaves_the_figure_alone(figure):
+    assert payload.encode_figure(figure, 'json') is figure
+
+
+@pytest.mark.parametrize('encoding, rtol', [('f8', 0), ('f4', 1e-7)])
+def test_typed_arrays_round_trip(figure, encoding, rtol):
+    encoded = round_trip(figure, encoding)
+    for original, trace in zip(figure.data, encoded['data']):
+        original = original.to_plotly_json()
+        for key in ('y', 'width'):
+            if key not in original:
+                continue
+            assert trace[key]['dtype'] == encoding
+            np.testing.assert_allclose(payload.decode_array(trace[key]), np.asarray(original[key]), rtol=rtol)
+    bar = encoded['data'][2]
+    np.testing.assert_allclose(payload.decode_array(bar['x']), figure.data[2].x, rtol=rtol)
+
+
+@pytest.mark.parametrize('encoding', ['f8', 'f4'])
+def test_dates_travel_as_exact_milliseconds_on_date_axes(figure, encoding):
+    encoded = round_trip(figure, encoding)
+    for number, original in ((0, figure.data[0]), (1, figure.data[1])):
+        trace = encoded['data'][number]
+        assert trace['x']['dtype'] == 'f8'
+        times = payload.decode_array(trace['x']).astype('i8').astype('datetime64[ms]')
+        np.testing.assert_array_equal(times, pd.DatetimeIndex(original.x).values.astype('datetime64[ms]'))
+    assert encoded['layout']['xaxis']['type'] == 'date'
+    assert encoded['layout']['xaxis2']['type'] == 'date'
+    assert 'type' not in encoded['layout']['xaxis3']
+
+
+def test_typed_arrays_shrink_the_payload(figure):
+    sizes = {encoding: result['bytes'] for encoding, result in payload.measure(figure, repeat=1).items()}
+    assert sizes['f4'] < sizes['f8'] < sizes['json']
@@ -0,0 +1,124 @@
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import rangequery
+
+from analyzer import TimeSeriesAnalyzer
+from conftest import assert_summaries_equal
+from synthetic import SyntheticDataSource
+
+RANGES = [('2013-01-01', '2020-12-31'), ('2015-03-02', '2015-03-20'), ('2016-07-01', '2019-02-28'),
+          ('2020-12-01', '2020-12-31'), ('2012-06-01', '2014-01-10')]
+
+
+def assert_frames_equal(expected, actual):
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-8, atol=1e-10, equal_nan=True)
+
+
+@pytest.fixture(scope='module')
+def source():
+    return SyntheticDataSource(2200, end='2020-12-31', duplicate_rate=0.002)
+
+
+@pytest.fixture(scope='module')
+def index(source):
+    return rangequery.RangeQueryIndex(source.get_prices('SPY', rangequery.HISTORY_START, '2020-12-31'))
+
+
+@pytest.mark.parametrize('from_date, to_date', RANGES)
+def test_slices_match_fresh_analyzer(source, index, from_date, to_date):
+    expected = TimeSeriesAnalyzer('SPY', from_date, to_date, source)
+    actual = index.analysis(from_date, to_date)
+
+    assert_summaries_equal(expected.summary(), actual.summary())
+    assert actual.count() == len(expected.daily_return())
+    for accessor in ('adj_close', 'daily_return', 'historic_vol_14_days_annualized', 'historic_vol_sma_126'):
+        pd.testing.assert_series_equal(getattr(actual, accessor)(), getattr(expected, accessor)(),
+                                       check_names=False, check_freq=False, check_index_type=False, rtol=1e-9)
+    assert_frames_equal(expected.rolling_historic_var(), actual.rolling_historic_var())
+    rolling_metrics = actual.rolling_metrics()
+    assert_frames_equal(expected.rolling_metrics()[rolling_metrics.columns], rolling_metrics)
+
+
+def test_short_range_is_rejected(index):
+    with pytest.raises(ValueError):
+        index.analysis('2020-12-31', '2020-12-31')
+
+
+class CountingSource(SyntheticDataSource):
+
+    def __init__(self, *args, **options):
+        super().__init__(*args, **options)
+        self.fetches = 0
+
+    def get_prices(self, ticker_symbol, from_date, to_date):
+        self.fetches += 1
+        return super().get_prices(ticker_symbol, from_date, to_date)
+
+
+@pytest.fixture
+def indexes(monkeypatch):
+    monkeypatch.setattr(rangequery, '_indexes', rangequery.OrderedDict())
+    monkeypatch.setattr(rangequery, '_build_locks', {})
+
+
+def test_concurrent_requests_share_one_build(indexes):
+    source = CountingSource(1500)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(rangequery.index_for('SPY', source)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert source.fetches == 1
+    assert all(index is results[0] for index in results)
+
+
+def test_ranges_reaching_today_refresh_the_index(indexes, monkeypatch):
+    source = CountingSource(1500)
+    rangequery.index_for('SPY', source, to_date='2020-12-31')
+    rangequery.index_for('SPY', source, to_date='2020-12-31')
+    rangequery.index_for('SPY', source, to_date=pd.Timestamp.today())
+    assert source.fetches == 1
+
+    monkeypatch.setattr(rangequery, 'LIVE_REFRESH_SECONDS', 0)
+    rangequery.index_for('SPY', source, to_date='2020-12-31')
+    assert source.fetches == 1
+    rangequery.index_for('SPY', source, to_date=pd.Timestamp.today())
+    assert source.fetches == 2
+
+
+def test_sources_and_bar_sizes_get_their_own_index(indexes):
+    daily, hourly = CountingSource(1500), CountingSource(1500, freq='h')
+    hourly.bar = '1h'
+    assert rangequery.index_for('SPY', daily) is not rangequery.index_for('SPY', hourly)
+    assert (daily.fetches, hourly.fetches) == (1, 1)
+
+
+def test_cache_is_bounded_by_bytes(indexes, monkeypatch):
+    source = CountingSource(1500)
+    size = rangequery.index_for('SPY', source).memory_footprint()['total']
+    monkeypatch.setattr(rangequery, 'MAX_INDEX_BYTES', int(size * 2.5))
+    for ticker in ('QQQ', 'IWM', 'DIA'):
+        rangequery.index_for(ticker, source)
+    assert [key[1] for key in rangequery._indexes] == ['IWM', 'DIA']
+    assert rangequery.cached_bytes() <= rangequery.MAX_INDEX_BYTES
+
+    monkeypatch.setattr(rangequery, 'MAX_INDEX_BYTES', 1)
+    newest = rangequery.index_for('SPY', source)
+    assert [entry[2] for entry in rangequery._indexes.values()] == [newest]
+
+
+def test_memory_footprint_adds_up(index):
+    index.rolling_metrics()
+    footprint = index.memory_footprint()
+    assert footprint['total'] == sum(value for name, value in footprint.items() if name != 'total') + sys.getsizeof(index)
+    assert footprint['prices'] == index.prices.nbytes
+    assert footprint['rolling_metrics_frame'] >= index.rolling_metrics_frame.to_numpy().nbytes
+    analysis = index.analysis('2015-03-02', '2015-03-20')
+    assert analysis.memory_footprint()['range_index'] == footprint['total']
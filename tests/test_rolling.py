@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import rolling
+
+from analyzer import TRADING_DAYS
+
+WINDOWS = (2, 5, 21, 63)
+
+
+@pytest.fixture(scope='module')
+def bars():
+    rng = np.random.default_rng(11)
+    returns = rng.standard_t(4, 400) * 0.01
+    prices = 100 * np.cumprod(1 + returns)
+    day_range = np.abs(rng.normal(1, 0.5, 400))
+    day_range[::37] = 0  # flat bars count on neither side
+    return prices, returns, day_range
+
+
+@pytest.fixture(scope='module')
+def results(bars):
+    prices, returns, day_range = bars
+    return rolling.rolling_metrics(prices, returns, day_range, WINDOWS, periods_per_year=TRADING_DAYS)
+
+
+def windows_of(values, window):
+    return [values[end - window + 1:end + 1] for end in range(window - 1, len(values))]
+
+
+def assert_rolling(actual, expected, window, rtol=1e-8):
+    assert np.isnan(actual[:window - 1]).all()
+    np.testing.assert_allclose(actual[window - 1:], expected[window - 1:], rtol=rtol, atol=1e-10)
+
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_moments_match_pandas(bars, results, window):
+    returns = pd.Series(bars[1])
+    mean = returns.rolling(window).mean().to_numpy() * 100
+    std = returns.rolling(window).std().to_numpy() * 100
+    assert_rolling(results['mean', window], mean, window)
+    assert_rolling(results['std', window], std, window)
+    assert_rolling(results['sharpe', window], mean / std * TRADING_DAYS ** 0.5, window)
+    skewness, kurtosis = (getattr(returns.rolling(window), name)().to_numpy() for name in ('skew', 'kurt'))
+    np.testing.assert_allclose(results['skewness', window], skewness, rtol=1e-6, atol=1e-10, equal_nan=True)
+    np.testing.assert_allclose(results['kurtosis', window], kurtosis, rtol=1e-6, atol=1e-10, equal_nan=True)
+
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_drawdown_cagr_and_range_ratio_match_brute_force(bars, results, window):
+    prices, returns, day_range = bars
+    pad = [np.nan] * (window - 1)
+    max_dd = pad + [(np.min(p / np.maximum.accumulate(p)) - 1) * 100 for p in windows_of(prices, window)]
+    cagr = pad + [((p[-1] / p[0]) ** (TRADING_DAYS / window) - 1) * 100 for p in windows_of(prices, window)]
+    ratios = []
+    for r, d in zip(windows_of(returns, window), windows_of(day_range, window)):
+        down, up = d[(r < 0) & (d != 0)], d[(r > 0) & (d != 0)]
+        ratios.append(down.mean() / up.mean() if len(down) and len(up) else np.nan)
+    assert_rolling(results['max_dd', window], np.array(max_dd), window)
+    assert_rolling(results['cagr', window], np.array(cagr), window)
+    np.testing.assert_allclose(results['range_ratio', window][window - 1:], ratios, rtol=1e-8, equal_nan=True)
+
+
+def test_frame_blanks_rows_before_start(bars):
+    prices, returns, day_range = bars
+    frame = rolling.rolling_metrics_frame(prices, returns, day_range, None, WINDOWS, periods_per_year=TRADING_DAYS,
+                                          start=3, metrics=('mean', 'max_dd'))
+    assert list(frame.columns) == [(name, window) for name in ('mean', 'max_dd') for window in WINDOWS]
+    assert np.isnan(frame.to_numpy()[:3]).all()
+    expected = rolling.rolling_metrics(prices[3:], returns[3:], day_range[3:], WINDOWS, periods_per_year=TRADING_DAYS)
+    np.testing.assert_array_equal(frame['mean', 21].to_numpy()[3:], expected['mean', 21])
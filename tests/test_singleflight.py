@@ -0,0 +1,25 @@
+import os
+import time
+
+import singleflight
+
+
+def test_idle_channels_are_swept(tmp_path):
+    superseder = singleflight.Superseder(str(tmp_path), state_ttl=3600, sweep_interval=600)
+    idle = superseder.begin('idle')
+    active = superseder.begin('active')
+    now = time.time()
+    old = now - 7200
+    os.utime(superseder.path('idle'), (old, old))
+    leftover = tmp_path / 'leftover.tmp'
+    leftover.write_text('x')
+    os.utime(leftover, (old, old))
+
+    superseder.sweep(now)  # begin() swept moments ago, so this waits for sweep_interval
+    assert os.path.exists(superseder.path('idle'))
+
+    superseder.sweep(now + 600)
+    assert not os.path.exists(superseder.path('idle'))
+    assert not leftover.exists()
+    assert superseder.latest('active') == active.request_id
+    assert idle.is_stale() and not active.is_stale()
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import stationarity
+
+
+def universe():
+    # Log prices: a random walk, a mean-reverting AR(1) (coefficient 0.9) and a drifting walk.
+    rng = np.random.default_rng(42)
+    n = 500
+    walk = np.cumsum(rng.normal(0, 0.01, n)) + 4
+    shocks = rng.normal(0, 0.01, n)
+    mean_reverting = np.zeros(n)
+    for i in range(1, n):
+        mean_reverting[i] = 0.9 * mean_reverting[i - 1] + shocks[i]
+    drifting = np.cumsum(rng.normal(0.002, 0.01, n)) + 3
+    return np.column_stack([walk, mean_reverting, drifting])
+
+
+# References for universe(): Hurst and variance ratios from direct loops over the definitions,
+# ADF from statsmodels' adfuller(x, autolag='AIC'). One entry per column, variance ratio rows by
+# horizon 2, 4, 8, 16.
+HURST = [0.37628023258454, 0.11172469543603, 0.39350690656679]
+VARIANCE_RATIOS = {
+    'ratio': [[1.10075040113025, 1.02972748380392, 1.04567452225231],
+              [1.12892431686696, 0.93824106722123, 1.14847623565024],
+              [1.02221844758012, 0.82119512665176, 1.17685903908582],
+              [0.88093206578914, 0.65958348998245, 1.03254678726350]],
+    'z': [[2.25059348186776, 0.66406168641386, 1.02029154142599],
+          [1.53939860802166, -0.73742190350829, 1.77285492790424],
+          [0.16778763687553, -1.35028548024088, 1.33559107229607],
+          [-0.60426054221084, -1.72758741708290, 0.16517242404018]],
+    'z_robust': [[2.09858172939736, 0.69711255375838, 1.01015816226776],
+                 [1.47763181026535, -0.72206452484210, 1.76237742348445],
+                 [0.16341368561450, -1.32691770761268, 1.34053503589815],
+                 [-0.59999591584189, -1.73243703362847, 0.16687872556168]]
+}
+ADF_STATISTIC = [-2.70591237061158, -5.09951190930170, -0.35609150303976]
+ADF_P_VALUE = [0.07302074679208, 1.40507107655476e-05, 0.91717584153896]
+ADF_LAGS = [1, 1, 0]
+ADF_NOBS = [498, 498, 499]
+ADF_CRITICAL_VALUES = {'1%': -3.44354945204116, '5%': -2.86736121176113, '10%': -2.56987048305672}
+
+
+@pytest.fixture(scope='module')
+def prices():
+    return universe()
+
+
+def test_hurst_exponent(prices):
+    np.testing.assert_allclose(stationarity.hurst_exponent(prices), HURST, rtol=1e-9)
+    assert stationarity.hurst_exponent(prices[:, 0]) == pytest.approx(HURST[0], rel=1e-9)
+
+
+def test_variance_ratios(prices):
+    universe_result = stationarity.variance_ratios(prices)
+    single = stationarity.variance_ratios(prices[:, 1])
+    for name, expected in VARIANCE_RATIOS.items():
+        np.testing.assert_allclose(universe_result[name], expected, rtol=1e-9, err_msg=name)
+        np.testing.assert_allclose(single[name], np.array(expected)[:, 1], rtol=1e-9, err_msg=name)
+    np.testing.assert_array_equal(universe_result['horizons'], stationarity.VARIANCE_RATIO_HORIZONS)
+
+
+def test_adf_matches_statsmodels(prices):
+    result = stationarity.adf(prices)
+    np.testing.assert_allclose(result['statistic'], ADF_STATISTIC, rtol=1e-9)
+    np.testing.assert_allclose(result['p_value'], ADF_P_VALUE, rtol=1e-9)
+    assert list(result['lags']) == ADF_LAGS and list(result['nobs']) == ADF_NOBS
+    for level, value in ADF_CRITICAL_VALUES.items():
+        assert result['critical_values'][level][0] == pytest.approx(value, rel=1e-9)
+
+    single = stationarity.adf(prices[:, 1])
+    assert single['statistic'] == pytest.approx(ADF_STATISTIC[1], rel=1e-9)
+    assert single['p_value'] == pytest.approx(ADF_P_VALUE[1], rel=1e-9)
+    assert (single['lags'], single['nobs']) == (ADF_LAGS[1], ADF_NOBS[1])
+
+
+def test_short_series_are_rejected():
+    with pytest.raises(ValueError):
+        stationarity.hurst_exponent(np.arange(50.0))
+    with pytest.raises(ValueError):
+        stationarity.variance_ratios(np.arange(10.0))
+    with pytest.raises(ValueError):
+        stationarity.adf(np.arange(3.0))
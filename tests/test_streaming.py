@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from analyzer import TimeSeriesAnalyzer
+from conftest import assert_summaries_equal
+from streaming import StreamingAnalyzer
+from synthetic import SyntheticDataSource
+
+MINUTES_PER_YEAR = 252 * 390
+
+
+class MinuteSource(SyntheticDataSource):
+    periods_per_year = MINUTES_PER_YEAR
+
+
+def test_daily_history_matches_analyzer():
+    source = SyntheticDataSource(3000)
+    df = source.get_prices('SPY', '2000-01-01', '2020-12-31')
+    streaming = StreamingAnalyzer.from_frame(df)
+    assert_summaries_equal(TimeSeriesAnalyzer('SPY', '2000-01-01', '2020-12-31', source).summary(),
+                           streaming.summary(), rel=1e-9)
+
+
+def test_large_minute_history_does_not_drift():
+    # 250k one-minute bars: the running moments and the sliding 14-bar window are updated a quarter
+    # of a million times and must still agree with the two-pass computation.
+    source = MinuteSource(250000, freq='min', end='2020-12-31', periods_per_year=MINUTES_PER_YEAR)
+    df = source.get_prices('SPY', '2000-01-01', '2021-01-01')
+    streaming = StreamingAnalyzer.from_frame(df, MINUTES_PER_YEAR)
+    expected = TimeSeriesAnalyzer('SPY', '2000-01-01', '2021-01-01', source)
+
+    assert_summaries_equal(expected.summary(), streaming.summary(), rel=1e-7)
+    assert streaming.vol_14_annualized == pytest.approx(expected.historic_vol_14_days_annualized().iloc[-1],
+                                                        rel=1e-7)
+    assert streaming.vol_sma_126 == pytest.approx(expected.historic_vol_sma_126().iloc[-1], rel=1e-7)
+
+
+def test_extending_in_pieces_matches_one_pass():
+    df = SyntheticDataSource(2000).get_prices('SPY', '2000-01-01', '2020-12-31')
+    pieces = StreamingAnalyzer()
+    for start in range(0, len(df), 333):
+        # Overlapping pieces: a repeated last bar is ignored.
+        pieces.extend(df.iloc[max(start - 1, 0):start + 333])
+    assert_summaries_equal(StreamingAnalyzer.from_frame(df).summary(), pieces.summary(), rel=1e-12)
+
+
+def test_out_of_order_bar_is_rejected():
+    streaming = StreamingAnalyzer()
+    streaming.update('2020-01-02', 100.0)
+    streaming.update('2020-01-03', 101.0)
+    with pytest.raises(ValueError):
+        streaming.update('2020-01-01', 99.0)
+
+
+def test_missing_price_drops_the_bar():
+    df = SyntheticDataSource(600).get_prices('SPY', '2000-01-01', '2020-12-31')
+    gapped = df.copy()
+    gapped.iloc[300, gapped.columns.get_loc('Adj Close')] = np.nan
+    streaming = StreamingAnalyzer.from_frame(gapped)
+    expected = StreamingAnalyzer.from_frame(df.drop(df.index[300]))
+
+    assert np.isfinite(streaming.mean)
+    assert_summaries_equal(expected.summary(), streaming.summary(), rel=1e-12)
+    assert streaming.vol_14_annualized == pytest.approx(expected.vol_14_annualized, rel=1e-12)
@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+import cache
+import datasource
+import rangequery
+import ui
+
+from synthetic import SyntheticDataSource
+
+
+def statistics(page):
+    return str(page[1].children[1].children[1])
+
+
+@pytest.fixture
+def services(monkeypatch):
+    monkeypatch.setenv('TSA_CACHE_BACKEND', 'memory')
+    monkeypatch.setattr(cache, '_default_cache', None)
+    monkeypatch.setattr(datasource, '_default_source', SyntheticDataSource(1500, end='2026-10-16'))
+    monkeypatch.setattr(rangequery, '_indexes', rangequery.OrderedDict())
+
+
+def test_cache_keeps_nan_statistics(services):
+    # Ten bars: too few for the 14-bar volatility, so min_vol and max_vol are NaN.
+    first = ui.build_results_page('SPY', '2026-10-01', '2026-10-16')
+    results = ui.cached_results('SPY', '2026-10-01', '2026-10-16')
+    assert math.isnan(results['summary']['min_vol'])
+
+    second = ui.build_results_page('SPY', '2026-10-01', '2026-10-16')
+    assert statistics(second) == statistics(first)
+    assert 'N/D' in statistics(second)
+
+
+def test_statistics_render_missing_values():
+    summary = dict.fromkeys(['cagr', 'buy_and_hold_return', 'max_dd', 'mean_daily_return', 'std_daily_return',
+                             'min_return', 'max_return', 'skewness', 'kurtosis', 'var_gauss_95', 'var_gauss_99',
+                             'var_gauss_99_7', 'var_historic_95', 'var_historic_99', 'var_historic_99_7', 'vam',
+                             'min_vol', 'max_vol', 'dn', 'dp', 'pos_neg_days_ratio', 'min_vol_date',
+                             'max_vol_date'], 1.23456)
+    summary.update(trading_days=10, min_vol=None, max_vol=float('nan'))
+    table = str(ui.get_statistic_results(summary))
+    assert table.count('N/D') == 2
+    assert '1.2346 %' in table
+
+
+def test_results_key_depends_on_price_source(monkeypatch):
+    for name in ui.SOURCE_SETTINGS:
+        monkeypatch.delenv(name, raising=False)
+    daily = ui.results_key('spy', '2020-01-01', '2020-12-31')
+    assert daily == ui.results_key('SPY', '2020-01-01 00:00:00', '2020-12-31')
+    monkeypatch.setenv('TSA_INTRADAY_DATA_DIR', '/data/ticks')
+    five_minutes = ui.results_key('SPY', '2020-01-01', '2020-12-31')
+    monkeypatch.setenv('TSA_BAR_SIZE', '1min')
+    assert len({daily, five_minutes, ui.results_key('SPY', '2020-01-01', '2020-12-31')}) == 3
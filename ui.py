@@ -1,12 +1,25 @@
-import numpy as np
-import analyzer as tsa
-import plotly.graph_objects as go
+import importlib
+import os
+import threading
+import uuid
+import cache
+import jobs
+import singleflight
+import telemetry
 import dash_bootstrap_components as dbc
 
 from style import *
 from datetime import datetime as dt
-from dash import dcc, html
-from plotly.subplots import make_subplots
+from dash import dcc, html, no_update
+
+# Figures, analysis and the numerical stack live in `figures` and are imported on first use, so
+# serving the layout needs only Dash; warm_up() loads them in the background after boot.
+flights = singleflight.SingleFlight()
+JOB_POLL_MILLISECONDS = 1000
+# Settings that choose what datasource.default_source() serves (source, directory, bar size).
+SOURCE_SETTINGS = ('TSA_INTRADAY_DATA_DIR', 'TSA_BAR_SIZE', 'TSA_SESSION_LENGTH', 'TSA_LOCAL_DATA_DIR', 'TSA_DATA_DIR')
+# Pieces of a results page, in the order a job publishes them.
+RESULT_SLOTS = ('summary', 'historical_prices', 'distplot_daily_returns', 'vol_price_evolution')
 
 
 def main_title():
@@ -46,178 +59,201 @@ def page_layout():
                 ],
                 style=inputSection
             ),
-            output_analysis_div()
+            output_analysis_div(),
+            dcc.Store(id='tab-id', data=uuid.uuid4().hex)
         ],
         style=pageLayout,
         fluid=True
     )
 
 
-def get_historic_prices_graph(ticker_analysis, ticker_symbol):
-    return {
-        'data': [
-            {
-                'x': ticker_analysis.index(),
-                'y': ticker_analysis.adj_close(),
-                'type': 'line',
-                'name': ticker_symbol.upper()
-            }
-        ],
-        'layout': {
-            'title': f'Histórico del {ticker_symbol.upper()} (precio de cierre ajustado)',
-            'plot_bgcolor': colors['background'],
-            'paper_bgcolor': colors['background'],
-            'font': {'color': colors['blueText']}
-        }
-    }
+def zoom_window(relayout_data):
+    # Returns (changed, window): window is the visible [start, end] after a zoom or pan, and None
+    # when the user reset the axes. Subplots report their shared x axis as xaxis2, xaxis3...
+    if not relayout_data:
+        return False, None
+    for key, value in relayout_data.items():
+        if key.startswith('xaxis') and key.endswith('.autorange') and value:
+            return True, None
+        if key.startswith('xaxis') and key.endswith('.range[0]'):
+            return True, [value, relayout_data[key.replace('[0]', '[1]')]]
+        if key.startswith('xaxis') and key.endswith('.range'):
+            return True, value
+    return False, None
+
 
+def format_value(value, suffix=''):
+    # Statistics a range is too short for are NaN (None if they went through plotly's encoder).
+    if value is None or value != value:
+        return 'N/D'
+    return f'{round(value, 4)}{suffix}'
 
-def get_statistic_results(ticker_analysis):
-    rounding = 4
 
+def get_statistic_results(summary):
     rows = [
         html.Tr([html.Td("Tasa de Crecimiento Anual Compuesto (CAGR)"),
-                html.Td(f"{round(ticker_analysis.cagr, rounding)} %")]),
+                html.Td(format_value(summary['cagr'], ' %'))]),
         html.Tr([html.Td("Retorno de comprar y mantener"), html.Td(
-            f"{round(ticker_analysis.buy_and_hold_return, rounding)} %")]),
+            format_value(summary['buy_and_hold_return'], ' %'))]),
         html.Tr([html.Td("Máximo Drawdown Histórico"), html.Td(
-            f"{round(ticker_analysis.max_dd, rounding)} %")]),
+            format_value(summary['max_dd'], ' %'))]),
         html.Tr([html.Td("Media Diaria"), html.Td(
-            f"{round(ticker_analysis.mean_daily_return, rounding)} %")]),
+            format_value(summary['mean_daily_return'], ' %'))]),
         html.Tr([html.Td("Desviación Típica Diaria"), html.Td(
-            f"{round(ticker_analysis.std_daily_return, rounding)} %")]),
+            format_value(summary['std_daily_return'], ' %'))]),
         html.Tr([html.Td("Máxima Pérdida Diaria"), html.Td(
-            f"{round(ticker_analysis.min_return, rounding)} %")]),
+            format_value(summary['min_return'], ' %'))]),
         html.Tr([html.Td("Máximo Beneficio Diario"), html.Td(
-            f"{round(ticker_analysis.max_return, rounding)} %")]),
+            format_value(summary['max_return'], ' %'))]),
         html.Tr([html.Td("Número de Días Analizados"),
-                html.Td(f"{ticker_analysis.trading_days}")]),
+                html.Td(f"{summary['trading_days']}")]),
         html.Tr([html.Td("Coeficiente de Asimetría"), html.Td(
-            f"{round(ticker_analysis.skewness, rounding)}")]),
+            format_value(summary['skewness']))]),
         html.Tr([html.Td("Curtosis"), html.Td(
-            f"{round(ticker_analysis.kurtosis, rounding)}")]),
+            format_value(summary['kurtosis']))]),
         html.Tr([html.Td("VaR Modelo Gaussiano NC-95%"),
-                html.Td(f"{round(ticker_analysis.var_gauss_95, rounding)} %")]),
+                html.Td(format_value(summary['var_gauss_95'], ' %'))]),
         html.Tr([html.Td("VaR Modelo Gaussiano NC-99%"),
-                html.Td(f"{round(ticker_analysis.var_gauss_99, rounding)} %")]),
+                html.Td(format_value(summary['var_gauss_99'], ' %'))]),
         html.Tr([html.Td("VaR Modelo Gaussiano NC-99.7%"),
-                html.Td(f"{round(ticker_analysis.var_gauss_99_7, rounding)} %")]),
+                html.Td(format_value(summary['var_gauss_99_7'], ' %'))]),
         html.Tr([html.Td("VaR Modelo Histórico NC-95%"),
-                html.Td(f"{round(ticker_analysis.var_historic_95, rounding)} %")]),
+                html.Td(format_value(summary['var_historic_95'], ' %'))]),
         html.Tr([html.Td("VaR Modelo Histórico NC-99%"),
-                html.Td(f"{round(ticker_analysis.var_historic_99, rounding)} %")]),
+                html.Td(format_value(summary['var_historic_99'], ' %'))]),
         html.Tr([html.Td("VaR Modelo Histórico NC-99.7%"),
-                html.Td(f"{round(ticker_analysis.var_historic_99_7, rounding)} %")]),
+                html.Td(format_value(summary['var_historic_99_7'], ' %'))]),
         html.Tr([html.Td("Volatilidad Anualizada"), html.Td(
-            f"{round(ticker_analysis.vam, rounding)} %")]),
-        html.Tr([html.Td(f"Mínima volatilidad anualizada registrada el {ticker_analysis.min_vol_date()}"), html.Td(
-            f"{round(ticker_analysis.historic_vol_14_days_annualized().min(), rounding)} %")]),
-        html.Tr([html.Td(f"Máxima volatilidad anualizada registrada el {ticker_analysis.max_vol_date()}"), html.Td(
-            f"{round(ticker_analysis.historic_vol_14_days_annualized().max(), rounding)} %")]),
+            format_value(summary['vam'], ' %'))]),
+        html.Tr([html.Td(f"Mínima volatilidad anualizada registrada el {summary['min_vol_date'] or 'N/D'}"), html.Td(
+            format_value(summary['min_vol'], ' %'))]),
+        html.Tr([html.Td(f"Máxima volatilidad anualizada registrada el {summary['max_vol_date'] or 'N/D'}"), html.Td(
+            format_value(summary['max_vol'], ' %'))]),
         html.Tr([html.Td("Rango Medio días Negativos"), html.Td(
-            f"{round(ticker_analysis.dn, rounding)} %")]),
+            format_value(summary['dn'], ' %'))]),
         html.Tr([html.Td("Rango Medio días Positivos"), html.Td(
-            f"{round(ticker_analysis.dp, rounding)} %")]),
+            format_value(summary['dp'], ' %'))]),
         html.Tr([html.Td("Ratio RDN/RDP"),
-                html.Td(f"{round(ticker_analysis.pos_neg_days_ratio(), rounding)} %")])
+                html.Td(format_value(summary['pos_neg_days_ratio'], ' %'))])
     ]
 
     return dbc.Table([html.Tbody(rows)], bordered=True, dark=True, hover=True, responsive=True, striped=True)
 
 
-def get_distplot_daily_returns(ticker_analysis):
-    (mu, sigma) = ticker_analysis.mu, ticker_analysis.sigma
-    distplot_daily_returns = go.Figure()
-    distplot_daily_returns.add_trace(
-        go.Histogram(x=ticker_analysis.daily_return(),
-                     histnorm='probability density',
-                     name="Retornos diarios",
-                     xbins=dict(start=-1, end=1, size=0.00025)
-                     )
-    )
-    distplot_daily_returns.add_trace(
-        go.Histogram(x=np.random.normal(mu, sigma, 100000),
-                     histnorm='probability density',
-                     name="Distribución normal (\u03BC={0:.2g}, \u03C3={1:.2f})".format(
-                         mu, sigma),
-                     xbins=dict(start=-1, end=1, size=0.00025),
-                     opacity=0.5
-                     )
-    )
+def no_checkpoint():
+    pass
 
-    distplot_daily_returns.update_xaxes(
-        title_text="Retorno diario", showgrid=False)
-    distplot_daily_returns.update_yaxes(
-        title_text="Frecuencia", showgrid=False)
-    distplot_daily_returns.update_layout(
-        {
-            'title': 'Distribución de los retornos diarios',
-            'plot_bgcolor': colors['background'],
-            'paper_bgcolor': colors['background'],
-            'font': {'color': colors['blueText']},
-            'bargap': 0.02
-        }
-    )
 
-    return distplot_daily_returns
+def warm_up():
+    def load():
+        importlib.import_module('figures')
+        cache.default_cache()
 
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
 
-def get_vol_price_evolution(ticker_analysis):
-    vol_price_evolution = make_subplots(specs=[[{"secondary_y": True}]])
 
-    vol_price_evolution.add_trace(
-        go.Scatter(
-            x=ticker_analysis.index(),
-            y=ticker_analysis.historic_vol_14_days_annualized(),
-            name="Volatilidad anualizada",
-            mode='lines'),
-        secondary_y=False
-    )
+def no_report(progress, message=None, **partial):
+    pass
 
-    vol_price_evolution.add_trace(
-        go.Scatter(
-            x=ticker_analysis.index(),
-            y=ticker_analysis.historic_vol_sma_126(),
-            name="Volatilidad anualizada SMA[126]",
-            mode='lines'),
-        secondary_y=False
-    )
 
-    vol_price_evolution.add_trace(
-        go.Scatter(
-            x=ticker_analysis.index(),
-            y=ticker_analysis.adj_close(),
-            name="Precio de cierre ajustado",
-            mode='lines'),
-        secondary_y=True
-    )
+def compute_results(ticker_symbol, from_date, to_date, checkpoint=no_checkpoint, report=no_report):
+    import figures
+    checkpoint()
+    report(0.0, 'Cargando precios')
+    with telemetry.span('load_analysis'):
+        ticker_analysis = figures.load_analysis(ticker_symbol, from_date, to_date)
+    checkpoint()
+    report(0.2, 'Calculando estadísticos')
+    with telemetry.span('summary'):
+        summary = ticker_analysis.summary()
+    report(0.3, 'Generando gráficos', summary=summary)
+    builders = [
+        ('historical_prices', lambda: figures.get_historic_prices_graph(ticker_analysis, ticker_symbol)),
+        ('distplot_daily_returns', lambda: figures.get_distplot_daily_returns(ticker_analysis)),
+        ('vol_price_evolution', lambda: figures.get_vol_price_evolution(ticker_analysis))
+    ]
+    encoded = {}
+    for position, (name, build) in enumerate(builders, 1):
+        checkpoint()
+        with telemetry.span('figure_' + name):
+            figure = build()
+        with telemetry.span('encode'):
+            encoded[name] = figures.encode_figure(figure)
+        report(0.3 + 0.7 * position / len(builders), 'Generando gráficos', **{name: encoded[name]})
+    return {'summary': summary, 'figures': encoded}
+
+
+def results_key(ticker_symbol, from_date, to_date):
+    # Results from another price source or bar size never share an entry. The settings are read
+    # from the environment rather than from the source, which would import pandas on a cache hit.
+    source = [os.environ.get(name, '') for name in SOURCE_SETTINGS]
+    return cache.make_key(ticker_symbol.upper(), str(from_date)[:10], str(to_date)[:10], *source)
+
+
+def cached_results(ticker_symbol, from_date, to_date):
+    return cache.default_cache().get(results_key(ticker_symbol, from_date, to_date))
+
+
+def build_results_page(ticker_symbol, from_date, to_date, checkpoint=no_checkpoint):
+    key = results_key(ticker_symbol, from_date, to_date)
+    results_cache = cache.default_cache()
+    with telemetry.span('results'):
+        results = flights.do(key, lambda: results_cache.get_or_compute(
+            key, lambda: compute_results(ticker_symbol, from_date, to_date, checkpoint)))
+    return results_page(results['summary'], results['figures'])
+
+
+def analysis_job(params, report, checkpoint):
+    # Background job (jobs.KINDS['analysis']): the same cached, single-flight computation as
+    # build_results_page, publishing the summary and each figure as soon as they are ready. The
+    # finished results stay in the result cache only; the job returns their key.
+    ticker_symbol, from_date, to_date = params['ticker_symbol'], params['from_date'], params['to_date']
+    key = results_key(ticker_symbol, from_date, to_date)
+    results_cache = cache.default_cache()
+    flights.do(key, lambda: results_cache.get_or_compute(
+        key, lambda: compute_results(ticker_symbol, from_date, to_date, checkpoint, report)))
+    return {'results_key': key}
 
-    vol_price_evolution.update_xaxes(title_text="Fecha", showgrid=False)
-    vol_price_evolution.update_yaxes(
-        title_text="Volatilidad anualizada", showgrid=False, secondary_y=False)
-    vol_price_evolution.update_yaxes(
-        title_text="Precio de cierre", showgrid=False, secondary_y=True)
-    vol_price_evolution.update_layout({
-        'title': 'Evolución histórica del precio y la volatilidad',
-        'plot_bgcolor': colors['background'],
-        'paper_bgcolor': colors['background'],
-        'font': {'color': colors['blueText']}
-    })
-
-    return vol_price_evolution
-
-
-def build_results_page(ticker_symbol, from_date, to_date):
-    ticker_analysis = tsa.TimeSeriesAnalyzer(ticker_symbol, from_date, to_date)
-    historical_prices = get_historic_prices_graph(
-        ticker_analysis, ticker_symbol)
-    stats = get_statistic_results(ticker_analysis)
-    distplot_daily_returns = get_distplot_daily_returns(ticker_analysis)
-    vol_price_evolution = get_vol_price_evolution(ticker_analysis)
+
+def submit_analysis(ticker_symbol, from_date, to_date, channel=None):
+    # channel (the browser tab) cancels the analysis it asked for before, if still running.
+    return jobs.default_queue().submit('analysis', {
+        'ticker_symbol': ticker_symbol.upper(), 'from_date': str(from_date)[:10], 'to_date': str(to_date)[:10]
+    }, channel)
+
+
+def pending():
+    return dbc.Spinner(color='info')
+
+
+def rolling_window_picker(figure):
+    # Other windows of the rolling metrics are drawn on demand by the vol_price_evolution callback.
+    meta = figure['layout']['meta']
+    return dcc.RadioItems(id='rolling-window', value=meta['rolling_window'], inline=True,
+                          options=[{'label': f' {window} sesiones ', 'value': window}
+                                   for window in meta['rolling_windows']])
+
+
+def slot_content(name, value):
+    if name == 'summary':
+        return get_statistic_results(value)
+    if name == 'vol_price_evolution':
+        return [dcc.Graph(id=name, figure=value), rolling_window_picker(value)]
+    return dcc.Graph(id=name, figure=value)
+
+
+def result_slot(name, value):
+    # Missing pieces (a job still running) are drawn as spinners until the poll fills the slot.
+    return html.Div(id='slot-' + name, children=pending() if value is None else slot_content(name, value))
+
+
+def results_page(summary, figures):
     return [
         dbc.Row(
             dbc.Col(
-                dcc.Graph(id='historical_prices', figure=historical_prices),
+                result_slot('historical_prices', figures.get('historical_prices')),
                 width=12
             )
         ),
@@ -225,10 +261,8 @@ def build_results_page(ticker_symbol, from_date, to_date):
             [
                 dbc.Col(
                     [
-                        dcc.Graph(id='distplot_daily_returns',
-                                  figure=distplot_daily_returns),
-                        dcc.Graph(id='vol_price_evolution',
-                                  figure=vol_price_evolution)
+                        result_slot('distplot_daily_returns', figures.get('distplot_daily_returns')),
+                        result_slot('vol_price_evolution', figures.get('vol_price_evolution'))
                     ],
                     width=8
                 ),
@@ -236,10 +270,54 @@ def build_results_page(ticker_symbol, from_date, to_date):
                     [
                         html.H5('Estadísticos del análisis',
                                 style=statisticResultsTitles),
-                        html.Div(children=stats)
+                        result_slot('summary', summary)
                     ],
                     width=3
                 )
             ]
         )
     ]
+
+
+def job_page(job_id):
+    return html.Div(
+        [
+            dcc.Store(id='analysis-job', data={'id': job_id, 'revision': 0, 'shown': []}),
+            dcc.Interval(id='job-poll', interval=JOB_POLL_MILLISECONDS),
+            dbc.Progress(id='job-progress', value=0, striped=True, animated=True),
+            html.Small(id='job-message', children='En cola'),
+            html.Div(id='job-alert'),
+            html.Div(children=results_page(None, {}))
+        ]
+    )
+
+
+def poll_job(job):
+    # Outputs of the poll callback: an alert, one per RESULT_SLOTS, progress %, message, whether to
+    # stop polling and the job state to remember. Only pieces not drawn yet are sent: the parts
+    # published since the last poll and, once the job is done, the rest from the result cache.
+    unchanged = (no_update,) * len(RESULT_SLOTS)
+    queue = jobs.default_queue()
+    status = queue.status(job['id'])
+    unavailable = dbc.Alert('El análisis ya no está disponible; vuelva a lanzarlo.', color='warning')
+    if status is None:
+        return (unavailable,) + unchanged + (0, '', True, job)
+    if status['state'] == jobs.FAILED:
+        failed = dbc.Alert(f"Error en el análisis: {status['error']}", color='danger')
+        return (failed,) + unchanged + (100, '', True, job)
+    if status['state'] == jobs.CANCELLED:
+        return (no_update,) + unchanged + (no_update, 'Análisis cancelado', True, job)
+    done = status['state'] == jobs.DONE
+    if done:
+        results = cache.default_cache().get(status['result']['results_key'])
+        if results is None:
+            return (unavailable,) + unchanged + (0, '', True, job)
+        parts = dict(results['figures'], summary=results['summary'])
+    else:
+        parts = queue.published(job['id'], job['revision'])
+    shown = set(job['shown'])
+    contents = tuple(slot_content(name, parts[name]) if name in parts and name not in shown else no_update
+                     for name in RESULT_SLOTS)
+    message = 'Análisis completado' if done else status['message'] or 'En cola'
+    job = dict(job, revision=status['revision'], shown=sorted(shown.union(parts).intersection(RESULT_SLOTS)))
+    return (no_update,) + contents + (round(100 * status['progress']), message, done, job)